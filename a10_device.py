@@ -0,0 +1,911 @@
+#!/usr/bin/env python
+
+import json, urllib2, ssl, re
+import os, sys, time, tempfile, threading, Queue
+from collections import deque
+
+# Default file and time to live (seconds since last use) of the cached sessions
+SESSION_CACHE_FILE = os.path.expanduser('~/.a10_session_cache')
+SESSION_CACHE_TTL = 300
+
+# aXAPI error codes returned when the session ID is not valid (expired or closed)
+INVALID_SESSION_ERROR_CODES = [1009]
+
+# aXAPI error codes (v2.1 and v3) of elements that already exist in the device
+ALREADY_EXISTS_ERROR_CODES = [1405, 1406, 67239937, 67305473, 67371009, 402653200, 
+                              402653201, 402653202, 402653206, 1023460352]
+
+# Cheap method called to check a cached session is still alive in the device
+VALIDATION_METHOD = 'system.information.get'
+
+# Method switching the partition of a session
+PARTITION_METHOD = 'system.partition.active'
+
+# Default file storing the settings learned by AdaptiveTuner for each device model
+TUNING_FILE = os.path.expanduser('~/.a10_tuning.json')
+
+# AdaptiveTuner: a call is congested when it takes more than LATENCY_FACTOR times the
+# fastest call of the same method. Chunks grow CHUNK_SIZE_STEP elements at a time
+LATENCY_FACTOR = 3
+CHUNK_SIZE_STEP = 10
+# AdaptiveTuner: the limit is also halved when more than ERROR_RATE_THRESHOLD of the last
+# ERROR_WINDOW calls got a load error (see load_error())
+ERROR_WINDOW = 20
+ERROR_RATE_THRESHOLD = 0.25
+# AdaptiveTuner: settings of runs where more than this rate of the calls got element
+# errors (Ex: uploading again to a configured device) are not learned
+ELEMENT_ERROR_RATE_LIMIT = 0.5
+
+# Messages of aXAPI errors caused by the load of the device, not by the elements
+LOAD_ERROR_PATTERN = re.compile(r'\bbusy\b|timed? ?out|time-out|try again later', 
+                                re.IGNORECASE)
+
+# Keys of the system information identifying the device model, in preference order
+MODEL_KEYS = ['model', 'platform', 'product_name', 'product', 'hw-platform']
+
+# aXAPI v3: base path and resource with the device version and platform
+V3_PATH = '/axapi/v3/'
+V3_VERSION_PATH = 'version/oper'
+
+
+def response_error_code(content):
+    '''
+    Returns the aXAPI error code of a failed method response, or None if the response
+    is not a failed aXAPI response.
+    '''
+    try:
+        response = json.loads(content)['response']
+        if response['status'] == 'fail':
+            return response['err']['code']
+    except (ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def parse_response(content):
+    '''
+    Classifies a method response as success or fail. Returns a dictionary with 'status'
+    ('success' or 'fail') and, for failures, the aXAPI error 'code' and 'msg'. Responses
+    that are not JSON (Ex: cli.deploy output) fail when they contain CLI error lines.
+    '''
+    try:
+        data = json.loads(content)
+    except ValueError:
+        error_lines = [a_line for a_line in content.splitlines() 
+                       if a_line.startswith(('Error', '%'))]
+        if error_lines:
+            return {'status' : 'fail', 'code' : None, 'msg' : error_lines[0]}
+        return {'status' : 'success'}
+    
+    try:
+        response = data['response']
+        if response['status'] == 'fail':
+            return {'status' : 'fail', 'code' : response['err'].get('code'), 
+                    'msg' : response['err'].get('msg')}
+    except (KeyError, TypeError, AttributeError):
+        # Responses with data (Ex: getAll methods) have no 'response' key
+        pass
+    return {'status' : 'success'}
+
+
+def load_error(content):
+    '''
+    Returns True if a response reports the device is overloaded: HTTP 5xx statuses (see
+    A10DeviceV3.callPath()) or busy and timeout aXAPI errors. Other errors are caused by
+    the elements (Ex: already existing ones) and don't tell anything about the load.
+    '''
+    result = parse_response(content)
+    if result['status'] != 'fail':
+        return False
+    if isinstance(result['code'], int) and 500 <= result['code'] < 600:
+        return True
+    return bool(LOAD_ERROR_PATTERN.search(result['msg'] or ''))
+
+
+class ResultLog(object):
+    '''
+    Keeps the result of each method call in a buffered JSON lines file, one line per
+    call, instead of printing every response. A compact progress indicator is shown in
+    the terminal, while failures are shown as soon as they happen. Thread safe.
+    '''
+    # Minimum seconds between progress indicator refreshes
+    progress_interval = 0.2
+    def __init__(self, file_path, stream=sys.stdout):
+        self.file_path = file_path
+        self.stream = stream
+        self.a_file = open(file_path, 'w', 1024 * 1024)
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_progress = 0
+        self.lock = threading.Lock()
+    def showProgress(self, label):
+        self.stream.write("\r\x1b[K### {} OK, {} FAILED ### Last: {}".format(
+                          self.successes, self.failures, label))
+        self.stream.flush()
+        self.last_progress = time.time()
+    def record(self, label, method, content, elapsed=None, count=1, 
+               skip_existing=False):
+        '''
+        Classifies the response content of a method called for the elements identified
+        by label, stores the result and returns it. count is the number of elements the
+        call uploaded (Ex: the elements of a chunk), added to the totals. Results with
+        count 0 (Ex: chunks whose elements are retried one by one) are only stored in the
+        file. With skip_existing, failures because the element already exists (see
+        ALREADY_EXISTS_ERROR_CODES) are 'skipped'.
+        '''
+        result = parse_response(content)
+        if skip_existing and result['status'] == 'fail' and \
+           result['code'] in ALREADY_EXISTS_ERROR_CODES:
+            result['status'] = 'skipped'
+        result['label'] = label
+        result['method'] = method
+        result['time'] = time.time()
+        if elapsed is not None:
+            result['elapsed'] = round(elapsed, 4)
+        if result['status'] == 'fail':
+            result['response'] = content
+        
+        if count != 1:
+            result['elements'] = count
+        
+        with self.lock:
+            self.a_file.write(json.dumps(result) + '\n')
+            if not count:
+                return result
+            if result['status'] == 'skipped':
+                self.skipped += count
+            elif result['status'] == 'fail':
+                self.failures += count
+                self.stream.write("\r\x1b[K### FAILED {} ({}): code {}, {} ###\n".format(
+                                  label, method, result['code'], result['msg']))
+                self.showProgress(label)
+            else:
+                self.successes += count
+                if time.time() - self.last_progress >= self.progress_interval:
+                    self.showProgress(label)
+        return result
+    def close(self):
+        with self.lock:
+            self.showProgress('-')
+            self.stream.write('\n')
+            self.a_file.close()
+
+
+class SessionCache(object):
+    '''
+    Stores aXAPI session IDs on disk, keyed by device and user, so back-to-back runs can
+    reuse the sessions instead of authenticating again. Sessions not used for more than
+    ttl seconds are discarded.
+    '''
+    def __init__(self, file_path=SESSION_CACHE_FILE, ttl=SESSION_CACHE_TTL):
+        self.file_path = file_path
+        self.ttl = ttl
+    def load(self):
+        try:
+            with open(self.file_path, 'r') as a_file:
+                return json.load(a_file)
+        except (IOError, ValueError):
+            return {}
+    def key(self, ip, username, partition=None):
+        if partition is None:
+            return ip + '|' + username
+        return ip + '|' + username + '|' + partition
+    def get(self, ip, username, partition=None):
+        '''
+        Returns the cached (session ID, last used time) of a device, user and partition
+        that are within the ttl.
+        '''
+        now = time.time()
+        return [(session_id, last_used) for (session_id, last_used) in 
+                self.load().get(self.key(ip, username, partition), []) 
+                if now - last_used < self.ttl]
+    def store(self, ip, username, session_ids, partition=None, unused_sessions=()):
+        '''
+        Stores the session IDs of a device, user and partition, replacing the previous
+        ones. Cached sessions not used by this run, given as (session ID, last used time),
+        are kept with their last used time, so they still expire.
+        '''
+        cache = self.load()
+        now = time.time()
+        cache[self.key(ip, username, partition)] = ([(session_id, now) 
+                                                     for session_id in session_ids] + 
+                                                    list(unused_sessions))
+        # Concurrent runs write their own temporary file, only readable by the user as
+        # session IDs give access to the device
+        (file_descriptor, temp_path) = tempfile.mkstemp(
+                                       dir=os.path.dirname(self.file_path) or '.',
+                                       prefix=os.path.basename(self.file_path) + '.')
+        with os.fdopen(file_descriptor, 'w') as a_file:
+            json.dump(cache, a_file)
+        os.rename(temp_path, self.file_path)
+
+
+class TuningCache(object):
+    '''
+    Stores on disk the upload settings learned by AdaptiveTuner, keyed by device model,
+    so the next runs against the same model start from them.
+    '''
+    def __init__(self, file_path=TUNING_FILE):
+        self.file_path = file_path
+    def load(self):
+        try:
+            with open(self.file_path, 'r') as a_file:
+                return json.load(a_file)
+        except (IOError, ValueError):
+            return {}
+    def get(self, model):
+        '''
+        Returns the settings learned for a device model, or None.
+        '''
+        return self.load().get(model)
+    def store(self, model, settings):
+        '''
+        Stores the settings of a device model, replacing the previous ones.
+        '''
+        tuning = self.load()
+        tuning[model] = settings
+        (file_descriptor, temp_path) = tempfile.mkstemp(
+                                       dir=os.path.dirname(self.file_path) or '.',
+                                       prefix=os.path.basename(self.file_path) + '.')
+        with os.fdopen(file_descriptor, 'w') as a_file:
+            json.dump(tuning, a_file, indent=4, sort_keys=True)
+        os.rename(temp_path, self.file_path)
+
+
+class AdaptiveTuner(object):
+    '''
+    Adjusts the number of aXAPI requests in flight and the cli.deploy chunk size to the
+    latency and errors observed in the device, AIMD-style: the limit grows by one after a
+    window of 'limit' calls without congestion sent while the limit was reached, and is
+    halved (once per window) when a call is congested, that is, when it fails to get a
+    response, takes more than LATENCY_FACTOR times the fastest call of its method, or
+    makes the load error rate of the last ERROR_WINDOW calls exceed ERROR_RATE_THRESHOLD
+    (see load_error(), errors caused by the elements are not congestion). Chunk size
+    grows by CHUNK_SIZE_STEP elements after each fast chunk and is halved after slow
+    ones or ones with load errors.
+    Latency and errors of each method are kept to report them and store them with the
+    learned settings (see settings(), learned() and TuningCache).
+    '''
+    def __init__(self, max_limit, limit=1, chunk_size=100, max_chunk_size=1000):
+        self.max_limit = max(1, max_limit)
+        self.limit = min(max(1, limit), self.max_limit)
+        self.max_chunk_size = max(1, max_chunk_size)
+        self.chunk_size = min(max(1, chunk_size), self.max_chunk_size)
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.window = 0             # Calls without congestion since the last change
+        self.last_decrease = 0      # Time the limit was halved
+        self.recent_errors = deque(maxlen=ERROR_WINDOW)   # Load errors of the last calls
+        self.methods = {}           # Statistics of the calls of each method
+        self.chunk_baseline = None  # Fastest cli.deploy time per element
+        self.changes = []           # (time, limit) of every limit change
+    def acquire(self):
+        '''
+        Waits until a new request can be sent without exceeding the limit. Returns the
+        time the request starts, to give it back to release().
+        '''
+        with self.condition:
+            while self.in_flight >= self.limit:
+                # wait() with timeout, so the main thread can be interrupted
+                self.condition.wait(1)
+            self.in_flight += 1
+        return time.time()
+    def release(self, method, start_time, failed=False, error_code=None, 
+                overloaded=False):
+        '''
+        Records the end of a request started with acquire() and adjusts the limit.
+        failed means no response was received, error_code is the aXAPI error code of
+        a failed response and overloaded tells it's a load error (see load_error()).
+        '''
+        elapsed = time.time() - start_time
+        with self.condition:
+            # The limit only grows when it's really limiting the requests in flight
+            saturated = self.in_flight >= self.limit
+            self.in_flight -= 1
+            stats = self.methods.setdefault(method, {'calls' : 0, 'errors' : 0, 
+                                                     'load_errors' : 0,
+                                                     'latency' : elapsed, 
+                                                     'baseline' : elapsed})
+            stats['calls'] += 1
+            error = failed or overloaded
+            if error:
+                stats['load_errors'] += 1
+            if error or error_code is not None:
+                stats['errors'] += 1
+            if not failed:
+                stats['latency'] = 0.8 * stats['latency'] + 0.2 * elapsed
+                stats['baseline'] = min(stats['baseline'], elapsed)
+            self.recent_errors.append(error)
+            error_rate_exceeded = (len(self.recent_errors) == ERROR_WINDOW and
+                                   sum(self.recent_errors) > 
+                                   ERROR_RATE_THRESHOLD * ERROR_WINDOW)
+            
+            if failed or error_rate_exceeded or \
+               elapsed > LATENCY_FACTOR * stats['baseline']:
+                # Calls started before the last decrease don't decrease it again
+                if start_time > self.last_decrease:
+                    self.setLimit(self.limit // 2)
+                    self.last_decrease = time.time()
+                    self.recent_errors.clear()
+            elif saturated and not error:
+                self.window += 1
+                if self.window >= self.limit:
+                    self.setLimit(self.limit + 1)
+            self.condition.notify_all()
+    def setLimit(self, limit):
+        limit = min(max(1, limit), self.max_limit)
+        self.window = 0
+        if limit != self.limit:
+            self.limit = limit
+            self.changes.append((time.time(), limit))
+    def chunkDone(self, elements, elapsed, failed=False):
+        '''
+        Adjusts the chunk size after a chunk (cli.deploy chunk or aXAPI v3 list) of the
+        given number of elements. failed means the chunk got no response or a load error.
+        Chunks smaller than the chunk size (the last one) only decrease it if failed.
+        '''
+        with self.condition:
+            if elements < self.chunk_size and not failed:
+                return
+            per_element = elapsed / max(1, elements)
+            if self.chunk_baseline is None or per_element < self.chunk_baseline:
+                self.chunk_baseline = per_element
+            if failed or per_element > LATENCY_FACTOR * self.chunk_baseline:
+                self.chunk_size = max(1, self.chunk_size // 2)
+            else:
+                self.chunk_size = min(self.max_chunk_size, 
+                                      self.chunk_size + CHUNK_SIZE_STEP)
+    def learned(self):
+        '''
+        Returns False if most of the calls got element errors, so the settings don't
+        reflect the device (Ex: elements uploaded again to a configured device).
+        '''
+        with self.condition:
+            calls = sum(stats['calls'] for stats in self.methods.values())
+            element_errors = sum(stats['errors'] - stats['load_errors'] 
+                                 for stats in self.methods.values())
+            return element_errors <= ELEMENT_ERROR_RATE_LIMIT * calls
+    def settings(self):
+        '''
+        Returns the learned settings to store them in a TuningCache.
+        '''
+        with self.condition:
+            return {
+                    'sessions'   : self.limit,
+                    'chunk_size' : self.chunk_size,
+                    'methods'    : dict((method, {
+                                    'latency'    : round(stats['latency'], 4),
+                                    'error_rate' : round(float(stats['errors']) / 
+                                                         stats['calls'], 4)})
+                                        for (method, stats) in self.methods.items()),
+                    'updated'    : time.time(),
+                   }
+
+
+class A10Device(object):
+    '''
+    Class to abstract aXAPI session creation and method calling using HTTPs POST Requests
+    and Responses.
+    Several authenticated sessions can be opened per device. Methods called with
+    callMethod() take any free session, so the same object can be shared by several
+    threads with up to one request in flight per session.
+    When 'partition' is set, every session is switched to that partition once opened.
+    When 'tuner' is set (see AdaptiveTuner), it limits the requests in flight.
+    '''
+    username = ""
+    password = ""
+    session = ""
+    method = ""
+    debug = False
+    use_https = False
+    session_cache = None
+    partition = None
+    tuner = None
+    api_version = '2.1'
+    def __init__(self, ip, username, password):
+        self.ip= ip
+        self.username = username
+        self.password = password
+        self.session = ""
+        self.sessions = []                   # All the opened sessions
+        self.free_sessions = Queue.Queue()   # Sessions without a request in flight
+        self.sessions_lock = threading.Lock()
+        self.cached_sessions = None          # Sessions got from session_cache
+    def baseUrl(self):
+        if self.use_https:
+            return "https://" + self.ip + "/services/rest/V2.1/"
+        return "http://" + self.ip + "/services/rest/V2.1/"
+    def methodUrl(self, session_id, method):
+        return self.baseUrl() + "?session_id=" + session_id + "&format=json&method=" + method
+    def postRequest(self, url, postBody):
+        '''
+        Sends a POST request to the given url and returns the response content.
+        '''
+        if self.debug: print "Generated URL: " + url + " - Post Body: " + postBody
+        req = urllib2.Request(url, postBody)
+        if self.use_https:
+            # Devices use self-signed certificates, so they are not verified
+            rsp = urllib2.urlopen(req, context=ssl._create_unverified_context())
+        else:
+            rsp = urllib2.urlopen(req)
+        return rsp.read()
+    def authenticate(self):
+        '''
+        Authenticates against the device and returns the new session ID.
+        '''
+        post_body = json.dumps(
+        {
+           "username": self.username,
+           "password": self.password
+        }
+        )
+        url = self.methodUrl("dummySessionId", "authenticate")
+        content = self.postRequest(url, post_body)
+        if self.debug: print "Result: " + content
+        data = json.loads(content)
+        return data['session_id']
+    def addSession(self, session_id):
+        '''
+        Adds an authenticated session to the sessions available for callMethod().
+        '''
+        with self.sessions_lock:
+            self.sessions.append(session_id)
+        self.free_sessions.put(session_id)
+    def validateSession(self, session_id):
+        '''
+        Checks a session is still alive in the device.
+        '''
+        try:
+            content = self.postRequest(self.methodUrl(session_id, VALIDATION_METHOD), '')
+        except urllib2.URLError:
+            return False
+        return response_error_code(content) not in INVALID_SESSION_ERROR_CODES
+    def newSession(self):
+        '''
+        Returns a session ID, reusing a cached session if still alive in the device or
+        authenticating otherwise.
+        '''
+        if self.session_cache is not None:
+            if self.cached_sessions is None:
+                self.cached_sessions = self.session_cache.get(self.ip, self.username,
+                                                              self.partition)
+            while self.cached_sessions:
+                (session_id, last_used) = self.cached_sessions.pop(0)
+                if self.validateSession(session_id):
+                    print "Session Reused. Session ID: " + session_id
+                    self.activatePartition(session_id)
+                    return session_id
+        session_id = self.authenticate()
+        print "Session Created. Session ID: " + session_id
+        self.activatePartition(session_id)
+        return session_id
+    def activatePartition(self, session_id):
+        '''
+        Switches a session to the device partition set in 'partition', if any. Raises
+        ValueError if the device doesn't switch it.
+        '''
+        if self.partition is None:
+            return
+        content = self.postRequest(self.methodUrl(session_id, PARTITION_METHOD), 
+                                   json.dumps({"name": self.partition}))
+        result = parse_response(content)
+        if result['status'] == 'fail':
+            raise ValueError("Partition {} not activated in session {}: {}".format(
+                             self.partition, session_id, result['msg']))
+        if self.debug: print "Partition {} activated. Session ID: {}".format(
+                                                             self.partition, session_id)
+    def renewSession(self, session_id):
+        '''
+        Replaces a session rejected by the device with a new authenticated one.
+        '''
+        new_session_id = self.authenticate()
+        print "Session Renewed. Session ID: " + new_session_id
+        self.activatePartition(new_session_id)
+        with self.sessions_lock:
+            if session_id in self.sessions:
+                self.sessions[self.sessions.index(session_id)] = new_session_id
+            if self.session == session_id:
+                self.session = new_session_id
+        return new_session_id
+    def getSession(self):
+        session_id = self.newSession()
+        self.session= session_id
+        self.addSession(session_id)
+    def openSessions(self, number):
+        '''
+        Opens authenticated sessions until the device has 'number' sessions opened.
+        '''
+        if not self.sessions:
+            self.getSession()
+        for index in range(len(self.sessions), number):
+            self.addSession(self.newSession())
+    def closeSession(self, session_id=None):
+        '''
+        Closes a session, by default the one got with getSession().
+        '''
+        if session_id is None:
+            session_id = self.session
+        if self.debug: print "Closing Session: " + session_id
+        post_body = json.dumps(
+        {
+            "session_id":session_id
+        }
+        )
+        url = self.methodUrl(session_id, "session.close")
+        content = self.postRequest(url, post_body)
+        print "Result: " + content
+        with self.sessions_lock:
+            if session_id in self.sessions:
+                self.sessions.remove(session_id)
+    def closeAllSessions(self):
+        '''
+        Closes every session opened in the device.
+        '''
+        for session_id in list(self.sessions):
+            self.closeSession(session_id)
+        self.free_sessions = Queue.Queue()
+        self.session = ""
+    def endSessions(self):
+        '''
+        Stores the opened sessions, and the cached ones not reused, in the session cache
+        to reuse them in the next runs, or closes all of them if there's no session cache.
+        '''
+        if self.session_cache is None:
+            self.closeAllSessions()
+        else:
+            # Cached sessions this run didn't need stay in the cache for the next runs
+            self.session_cache.store(self.ip, self.username, self.sessions, 
+                                     self.partition, self.cached_sessions or [])
+            print "Sessions kept in cache: " + ', '.join(self.sessions)
+    def callMethod(self, method, postBody):
+        '''
+        Calls an aXAPI method with the given POST body using any free session, waiting
+        for one if all of them have a request in flight. Returns the response content.
+        If the device rejects the session, it's renewed and the method called again.
+        '''
+        with self.sessions_lock:
+            no_sessions = not self.sessions
+        if no_sessions:
+            self.getSession()
+        tuner = self.tuner
+        if tuner is not None:
+            start_time = tuner.acquire()
+        session_id = self.free_sessions.get()
+        content = None
+        try:
+            content = self.postRequest(self.methodUrl(session_id, method), postBody)
+            if response_error_code(content) in INVALID_SESSION_ERROR_CODES:
+                session_id = self.renewSession(session_id)
+                content = self.postRequest(self.methodUrl(session_id, method), postBody)
+        finally:
+            self.free_sessions.put(session_id)
+            if tuner is not None:
+                tuner.release(method, start_time, content is None, 
+                              None if content is None else response_error_code(content),
+                              content is not None and load_error(content))
+        return content
+    def deviceModel(self):
+        '''
+        Returns the model of the device from its system information, or None if it's
+        not reported.
+        '''
+        try:
+            return find_model(json.loads(self.callMethod(VALIDATION_METHOD, '')))
+        except ValueError:
+            return None
+    def genericPostApi(self,postBody):
+        '''
+        Calls the method set in 'method' attribute. Not thread safe, use callMethod()
+        from concurrent threads.
+        '''
+        content = self.callMethod(self.method, postBody)
+        print (content)
+        return content
+    def cliDeploy(self, commands):
+        '''
+        Runs a batch of CLI configuration commands in the device with cli.deploy method.
+        '''
+        return self.callMethod('cli.deploy', commands)
+
+
+def find_model(data):
+    '''
+    Returns the first value of MODEL_KEYS found in the (nested) dictionaries of a
+    response, or None.
+    '''
+    pending = [data]
+    while pending:
+        a_dict = pending.pop(0)
+        for a_key in MODEL_KEYS:
+            if a_dict.get(a_key):
+                return str(a_dict[a_key])
+        pending.extend(a_value for a_value in a_dict.values() 
+                       if isinstance(a_value, dict))
+    return None
+
+
+class A10DeviceV3(object):
+    '''
+    Counterpart of A10Device for devices supporting aXAPI v3, where resources are
+    addressed by path (Ex: 'slb/server') and whole lists of elements can be created in a
+    single request (see postList()). All the concurrent requests share the signature
+    got when authenticating, re-authenticating once if the device rejects it.
+    '''
+    api_version = '3'
+    debug = False
+    use_https = False
+    partition = None
+    tuner = None
+    def __init__(self, ip, username, password):
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.signature = None
+        self.signature_lock = threading.Lock()
+    def baseUrl(self):
+        if self.use_https:
+            return "https://" + self.ip + V3_PATH
+        return "http://" + self.ip + V3_PATH
+    def request(self, path, body=None, signature=None):
+        '''
+        Sends a request (POST with body, GET without it) to the given path and returns
+        (HTTP status code, response content). Failed requests also have a JSON content.
+        '''
+        if self.debug: print "Generated URL: " + self.baseUrl() + path + \
+                             " - Post Body: " + str(body)
+        req = urllib2.Request(self.baseUrl() + path, body, 
+                              {'Content-Type' : 'application/json'})
+        if signature is not None:
+            req.add_header('Authorization', 'A10 ' + signature)
+        try:
+            if self.use_https:
+                # Devices use self-signed certificates, so they are not verified
+                rsp = urllib2.urlopen(req, context=ssl._create_unverified_context())
+            else:
+                rsp = urllib2.urlopen(req)
+            return (rsp.getcode(), rsp.read())
+        except urllib2.HTTPError as error:
+            return (error.code, error.read())
+    def authenticate(self):
+        '''
+        Authenticates against the device and returns the new signature. Raises
+        ValueError if the device doesn't support aXAPI v3 or rejects the credentials.
+        '''
+        (code, content) = self.request('auth', json.dumps({'credentials' : {
+                                                            'username' : self.username,
+                                                            'password' : self.password}}))
+        if self.debug: print "Result: " + content
+        try:
+            return json.loads(content)['authresponse']['signature']
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("aXAPI v3 authentication failed in {} (HTTP {})".format(
+                             self.ip, code))
+    def activatePartition(self, signature):
+        '''
+        Switches the signature to the device partition set in 'partition', if any.
+        Raises ValueError if the device doesn't switch it.
+        '''
+        if self.partition is None:
+            return
+        (code, content) = self.request('active-partition/' + self.partition, '', 
+                                       signature)
+        result = parse_response(content)
+        if code >= 400 or result['status'] == 'fail':
+            raise ValueError("Partition {} not activated: {}".format(self.partition,
+                                                                    result.get('msg')))
+    def openSessions(self, number=1):
+        '''
+        Authenticates against the device. A single signature is used by any number of
+        concurrent requests, so 'number' is only kept for A10Device compatibility.
+        '''
+        signature = self.authenticate()
+        print "Session Created (aXAPI v3)."
+        self.activatePartition(signature)
+        self.signature = signature
+    def renewSignature(self, signature):
+        '''
+        Replaces a signature rejected by the device, once for all the threads using it.
+        '''
+        with self.signature_lock:
+            if self.signature == signature:
+                new_signature = self.authenticate()
+                print "Session Renewed (aXAPI v3)."
+                self.activatePartition(new_signature)
+                self.signature = new_signature
+            return self.signature
+    def callPath(self, path, body=None):
+        '''
+        Sends a request to the given path and returns the response content. HTTP errors
+        without an aXAPI failure in their content (Ex: HTML error pages) are returned as
+        aXAPI failures with the HTTP status as error code, so parse_response() sees them.
+        '''
+        if self.signature is None:
+            self.openSessions()
+        tuner = self.tuner
+        if tuner is not None:
+            start_time = tuner.acquire()
+        content = None
+        try:
+            signature = self.signature
+            (code, content) = self.request(path, body, signature)
+            if code == 401:
+                (code, content) = self.request(path, body, 
+                                               self.renewSignature(signature))
+            if code >= 400 and parse_response(content)['status'] != 'fail':
+                content = json.dumps({'response' : {'status' : 'fail', 'err' : {
+                                      'code' : code, 
+                                      'msg' : "HTTP {}: {}".format(code, 
+                                              ' '.join(content.split())[:200])}}})
+        finally:
+            if tuner is not None:
+                tuner.release(path, start_time, content is None, 
+                              None if content is None else response_error_code(content),
+                              content is not None and load_error(content))
+        return content
+    def postList(self, path, list_key, objects):
+        '''
+        Creates all the given elements in a single request, posting them as the list
+        list_key of the resource in path (Ex: 'slb/server', 'server-list').
+        '''
+        return self.callPath(path, json.dumps({list_key : objects}))
+    def deviceModel(self):
+        '''
+        Returns the model of the device from its version, or None if it's not reported.
+        '''
+        try:
+            return find_model(json.loads(self.callPath(V3_VERSION_PATH)))
+        except ValueError:
+            return None
+    def endSessions(self):
+        '''
+        Logs off, invalidating the signature.
+        '''
+        if self.signature is not None:
+            (code, content) = self.request('logoff', '', self.signature)
+            print "Result: " + content
+            self.signature = None
+
+
+def run_concurrently(function, items, workers):
+    '''
+    Calls function(item) for every item using up to 'workers' threads and returns the
+    results in the same order of the items. Items are read from the iterable as the
+    workers take them, through a bounded queue like the one of DependencyScheduler, so
+    streamed elements (Ex: ndjson files) aren't loaded in memory at once. If any call (or
+    the iteration) raises an exception, the first one is raised again once all the
+    threads finish.
+    '''
+    workers = max(1, workers)
+    results = []
+    errors = []
+    pending_items = Queue.Queue(2 * workers)
+    threads = []
+
+    def worker():
+        while True:
+            index_and_item = pending_items.get()
+            if index_and_item is None:
+                return
+            (index, item) = index_and_item
+            try:
+                results[index] = function(item)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    def put(index_and_item):
+        while True:
+            try:
+                # put() with timeout, so the main thread can be interrupted
+                pending_items.put(index_and_item, timeout=1)
+                return
+            except Queue.Full:
+                pass
+
+    try:
+        for index_and_item in enumerate(items):
+            results.append(None)
+            if len(threads) < workers:
+                # No more threads than items
+                a_thread = threading.Thread(target=worker)
+                a_thread.daemon = True
+                a_thread.start()
+                threads.append(a_thread)
+            put(index_and_item)
+    except Exception:
+        errors.insert(0, sys.exc_info())
+    for a_thread in threads:
+        put(None)
+    for a_thread in threads:
+        # join() with timeout, so the main thread can be interrupted
+        while a_thread.is_alive():
+            a_thread.join(1)
+
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+    return results
+
+
+class DependencyScheduler(object):
+    '''
+    Calls function(item) for items submitted one by one while the scheduler is running,
+    using up to 'workers' threads. Each item is submitted with the keys it requires and
+    the keys it provides, and it's not called until all the previously submitted items
+    providing the keys it requires have finished (successfully or not). Keys no submitted
+    item provides are considered already available.
+    submit() blocks while max_pending submitted items haven't finished, so the producer
+    can't get too far ahead of the workers. Items must be submitted after the items they
+    depend on, otherwise they would be called without waiting for them.
+    '''
+    def __init__(self, function, workers, max_pending=100):
+        self.function = function
+        self.workers = workers
+        self.max_pending = max(1, max_pending)
+        self.condition = threading.Condition()
+        self.pending = 0            # Submitted items not finished yet
+        self.ready = deque()        # Items ready to be called
+        self.waiting = {}           # Items waiting for each key
+        self.providers = {}         # Number of not finished items providing each key
+        self.closed = False
+        self.errors = []
+        self.threads = []
+    def start(self):
+        for index in range(self.workers):
+            a_thread = threading.Thread(target=self.worker)
+            a_thread.daemon = True
+            a_thread.start()
+            self.threads.append(a_thread)
+    def submit(self, item, requires=(), provides=()):
+        with self.condition:
+            while self.pending >= self.max_pending:
+                # wait() with timeout, so the main thread can be interrupted
+                self.condition.wait(1)
+            self.pending += 1
+            # Entry: [item, provided keys, number of required keys not available yet]
+            entry = [item, list(provides), 0]
+            for key in set(requires):
+                if self.providers.get(key):
+                    self.waiting.setdefault(key, []).append(entry)
+                    entry[2] += 1
+            for key in entry[1]:
+                self.providers[key] = self.providers.get(key, 0) + 1
+            if not entry[2]:
+                self.ready.append(entry)
+                self.condition.notify_all()
+    def worker(self):
+        while True:
+            with self.condition:
+                while not self.ready and not (self.closed and not self.pending):
+                    self.condition.wait()
+                if not self.ready:
+                    return
+                entry = self.ready.popleft()
+            try:
+                self.function(entry[0])
+            except Exception:
+                self.errors.append(sys.exc_info())
+            with self.condition:
+                self.pending -= 1
+                for key in entry[1]:
+                    self.providers[key] -= 1
+                    if not self.providers[key]:
+                        del self.providers[key]
+                        for waiting_entry in self.waiting.pop(key, []):
+                            waiting_entry[2] -= 1
+                            if not waiting_entry[2]:
+                                self.ready.append(waiting_entry)
+                self.condition.notify_all()
+    def join(self):
+        '''
+        Waits until all the submitted items finish and stops the worker threads. If any
+        call raised an exception, the first one is raised again.
+        '''
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for a_thread in self.threads:
+            # join() with timeout, so the main thread can be interrupted
+            while a_thread.is_alive():
+                a_thread.join(1)
+        if self.errors:
+            raise self.errors[0][0], self.errors[0][1], self.errors[0][2]
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+
+import sys, json, random
+from argparse import ArgumentParser
+import os, time, shutil, subprocess, tempfile, tarfile, difflib, glob
+
+# Files that must be byte-identical between the legacy and the optimized conversions
+COMPARED_FILES = ['/json_objects/VIPs.txt', '/json_objects/SGs.txt', '/json_objects/RSs.txt']
+
+# process_script.py arguments of both runs. Verbose and duplicates output print the whole
+# conversion besides the SUMMARY section, so all of it is compared
+DEFAULT_ARGS = '-v -d'
+
+# Number of (real servers, service groups, virtual servers) of the synthetic configs
+SYNTHETIC_SIZES = [(60, 40, 30), (600, 400, 300), (2400, 1600, 1200)]
+
+SYNTHETIC_WORDS = ['web', 'policia', 'portal', 'intranet', 'correo', 'ldap', 'app', 'srv',
+                   'datos', 'movil']
+
+# Lines of the stdout diff shown for each input with different output
+DIFF_LINES = 20
+
+
+def synthetic_config(seed, reals, groups, vips, shared_addresses=False):
+    '''
+    Returns an Alteon configuration with random real servers, groups and virtual servers,
+    covering the cases where the conversion semantics are subtle: element numbers being
+    prefixes of others (Ex: 'virt 1' and 'virt 10', as sections are found by substring),
+    duplicated names, and virtual servers sharing an address (renamed by the conversion).
+    With shared_addresses, virtual server 10 always shares the address of virtual server
+    1. The same seed gives the same configuration.
+    '''
+    a_random = random.Random(seed)
+    lines = ['script start "Alteon Application Switch 4408" 4  /**** DO NOT EDIT THIS '
+             'LINE!', '/c/sys', '\tidle 60', '']
+    for number in xrange(1, reals + 1):
+        lines.append('/c/slb/real {}'.format(number))
+        if a_random.random() < 0.9:
+            lines.append('\tena')
+        lines.append('\tipver v4')
+        # Some real servers share their address with others
+        if a_random.random() < 0.15:
+            lines.append('\trip 10.0.{}.{}'.format(number // 200, a_random.randint(1, 40)))
+        else:
+            lines.append('\trip 10.0.{}.{}'.format(number // 200, number % 200 + 10))
+        if a_random.random() < 0.8:
+            lines.append('\tname "{}{}"'.format(a_random.choice(SYNTHETIC_WORDS),
+                         number if a_random.random() < 0.9 else 1))
+        lines.append('')
+    for number in xrange(1, groups + 1):
+        lines.append('/c/slb/group {}'.format(number))
+        lines.append('\tipver v4')
+        metric = a_random.choice(['roundrobin', 'least-connection',
+                                  'phash 255.255.255.255', None])
+        if metric:
+            lines.append('\tmetric ' + metric)
+        health = a_random.choice(['http', 'imap', 'pop3', 'smtp', 'ldap', None])
+        if health:
+            lines.append('\thealth ' + health)
+            if a_random.random() < 0.5:
+                lines.append('\tcontent "index.html"')
+        members = a_random.sample(xrange(1, reals + 1), a_random.randint(1, 4))
+        for a_member in members:
+            lines.append('\tadd {}'.format(a_member))
+        if a_random.random() < 0.3:
+            lines.append('\tdis {}'.format(members[0]))
+        if a_random.random() < 0.85:
+            name = '{} {}'.format(a_random.choice(SYNTHETIC_WORDS),
+                                  a_random.choice(SYNTHETIC_WORDS))
+            if a_random.random() < 0.3:
+                name += a_random.choice(['_13', '-2', ' 80', ',x'])
+            lines.append('\tname "{}"'.format(name))
+        lines.append('')
+    addresses = ['172.26.{}.{}'.format(index // 250, index % 250 + 1)
+                 for index in xrange(vips)]
+    used_addresses = {}
+    for number in xrange(1, vips + 1):
+        if shared_addresses or number < 10 or a_random.random() < 0.7:
+            address = addresses[number - 1]
+        else:
+            address = addresses[a_random.randint(0, 8)]
+        # Prefix numbers sharing an address are left to shared_addresses configs
+        if not shared_addresses and any(str(other).startswith(str(number)) or
+                                        str(number).startswith(str(other))
+                                        for other in used_addresses.get(address, [])):
+            address = addresses[number - 1]
+        if shared_addresses and number == 10:
+            address = addresses[0]
+        used_addresses.setdefault(address, []).append(number)
+        lines.append('/c/slb/virt {}'.format(number))
+        lines.append('\tena' if a_random.random() < 0.9 else '\tdis')
+        lines.append('\tipver v4')
+        lines.append('\tvip ' + address)
+        if a_random.random() < 0.8:
+            lines.append('\tdname "{} {}"'.format(a_random.choice(SYNTHETIC_WORDS),
+                                                  a_random.choice(SYNTHETIC_WORDS)))
+        services = a_random.sample(['http', 'https', '8080', '8443', 'smtp', '12063',
+                                    '443', '80', '4383'], a_random.randint(1, 4))
+        ports = set()
+        for a_service in services:
+            port = {'http' : '80', 'https' : '443', 'smtp' : '25'}.get(a_service,
+                                                                       a_service)
+            if port in ports:
+                continue
+            ports.add(port)
+            lines.append('/c/slb/virt {}/service {}'.format(number, a_service))
+            lines.append('\tgroup {}'.format(a_random.randint(1, groups)))
+            lines.append('\trport ' + port)
+            if a_random.random() < 0.7:
+                lines.append('\tdbind ena')
+            pbind = a_random.choice([None, 'cookie insert', 'cookie passive JSESSIONID',
+                                     'clientip', 'sslid'])
+            if pbind:
+                lines.append('/c/slb/virt {}/service {}/pbind {}'.format(number,
+                             a_service, pbind))
+        lines.append('')
+    lines.append('/')
+    lines.append('script end')
+    # Same line endings as the configurations dumped by the Alteon boxes
+    return '\r\r\n'.join(lines) + '\r\r\n'
+
+
+def extract_revision(repo_dir, revision, target_dir):
+    '''
+    Extracts the files of a git revision of repo_dir into target_dir. Raises ValueError
+    if git fails to archive the revision.
+    '''
+    archive = subprocess.Popen(['git', 'archive', revision], cwd=repo_dir,
+                               stdout=subprocess.PIPE)
+    try:
+        tar = tarfile.open(fileobj=archive.stdout, mode='r|')
+        tar.extractall(target_dir)
+        tar.close()
+    except tarfile.ReadError:
+        pass                                        # Reported below with git status
+    archive.stdout.close()
+    if archive.wait():
+        raise ValueError("git archive {} failed in {}".format(revision, repo_dir))
+
+
+def run_process_script(tree_dir, config_path, args, work_dir):
+    '''
+    Runs process_script.py of tree_dir over config_path in a copy of its scripts in
+    work_dir (json_objects files are stored next to the script), answering yes to store
+    them. Returns (exit status, elapsed seconds, peak RSS in KB of the process).
+    '''
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
+    os.makedirs(work_dir)
+    for a_script in glob.glob(tree_dir + '/*.py'):
+        shutil.copy(a_script, work_dir)
+
+    with open(work_dir + '/stdout.txt', 'w') as stdout_file:
+        start_time = time.time()
+        process = subprocess.Popen([sys.executable, 'process_script.py', config_path] +
+                                   args, cwd=work_dir, stdin=subprocess.PIPE,
+                                   stdout=stdout_file, stderr=subprocess.STDOUT)
+        try:
+            process.stdin.write('yes\n')
+            process.stdin.close()
+        except IOError:
+            pass                                    # Finished without asking
+        # wait4 gets the resource usage of this process (and its workers) only, not of
+        # the previous runs
+        (pid, status, usage) = os.wait4(process.pid, 0)
+        elapsed = time.time() - start_time
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    return (process.returncode, elapsed, usage.ru_maxrss)
+
+
+def compare_runs(legacy_dir, optimized_dir):
+    '''
+    Returns the differences between two runs of process_script.py: the COMPARED_FILES not
+    byte-identical and the unified diff of the terminal output, where the run directories
+    are replaced by '<dir>' as they are printed when storing the files.
+    '''
+    different_files = []
+    for file_to_compare in COMPARED_FILES:
+        contents = []
+        for run_dir in [legacy_dir, optimized_dir]:
+            if os.path.exists(run_dir + file_to_compare):
+                with open(run_dir + file_to_compare, 'rb') as a_file:
+                    contents.append(a_file.read())
+            else:
+                contents.append(None)
+        if contents[0] != contents[1]:
+            different_files.append(file_to_compare.lstrip('/'))
+
+    outputs = []
+    for run_dir in [legacy_dir, optimized_dir]:
+        with open(run_dir + '/stdout.txt') as a_file:
+            outputs.append(a_file.read().replace(run_dir, '<dir>').splitlines())
+    output_diff = list(difflib.unified_diff(outputs[0], outputs[1], 'legacy', 'optimized',
+                                            lineterm=''))
+    return (different_files, output_diff)
+
+
+def bench_input(legacy_tree, optimized_tree, config_path, args, optimized_args,
+                work_dir, repeat=1):
+    '''
+    Converts config_path with the legacy and the optimized trees, repeat times each, and
+    compares the results of the last runs. Returns a dictionary with the best elapsed
+    time, the highest peak RSS (in MB) and the exit status of each tree, and the
+    differences found.
+    '''
+    result = {'input' : config_path}
+    for (side, tree_dir, side_args) in [('legacy', legacy_tree, args),
+                                        ('optimized', optimized_tree,
+                                         args + optimized_args)]:
+        runs = [run_process_script(tree_dir, config_path, side_args,
+                                   work_dir + '/' + side) for index in xrange(repeat)]
+        result[side] = {'status' : runs[-1][0],
+                        'time' : round(min(elapsed for (status, elapsed, rss) in runs), 4),
+                        'rss_mb' : round(max(rss for (status, elapsed, rss) in runs) /
+                                         1024.0, 1)}
+    (different_files, output_diff) = compare_runs(work_dir + '/legacy',
+                                                  work_dir + '/optimized')
+    if result['legacy']['status'] != result['optimized']['status']:
+        different_files.append('exit status')
+    result['different_files'] = different_files
+    result['output_diff'] = output_diff
+    result['same'] = not different_files and not output_diff
+    result['speedup'] = round(result['legacy']['time'] /
+                              max(result['optimized']['time'], 0.0001), 2)
+    result['rss_delta_mb'] = round(result['optimized']['rss_mb'] -
+                                   result['legacy']['rss_mb'], 1)
+    return result
+
+
+def main():
+    '''
+    Runs process_script.py of a legacy tree (by default the last commit) and of the
+    optimized one (by default the working tree) side by side over synthetic and real
+    Alteon configurations. Checks VIPs.txt, SGs.txt, RSs.txt and the terminal output,
+    SUMMARY included, are byte-identical, and records the speedup and the peak memory
+    delta of each input. Exits with status 1 if any input gives a different result, so
+    fast paths can be checked before they are committed.
+    '''
+    # Argument parsing
+    parser = ArgumentParser(description=("Script to check an optimized process_script.py "
+                            "converts the Alteon configurations exactly like the legacy "
+                            "one, and to measure its speedup and memory use"),
+                            prog='python bench_script.py')
+    parser.add_argument('config_files', action='store', nargs='*', help=('real Alteon '
+                        'configuration files, converted besides the synthetic ones'))
+    parser.add_argument('--legacy-rev', action='store', default='HEAD', help=('git '
+                        'revision of the legacy tree. Defaults to HEAD'),
+                        dest='legacy_rev')
+    parser.add_argument('--legacy-dir', action='store', default=None, help=('directory '
+                        'of the legacy tree, instead of a git revision'),
+                        dest='legacy_dir')
+    parser.add_argument('--optimized-dir', action='store', default=None, help=('directory '
+                        'of the optimized tree. Defaults to the script directory'),
+                        dest='optimized_dir')
+    parser.add_argument('-a', '--args', action='store', default=DEFAULT_ARGS,
+                        help=('process_script.py arguments of both trees. Defaults to '
+                        "'{}'").format(DEFAULT_ARGS), dest='args')
+    parser.add_argument('--optimized-args', action='store', default='', help=('extra '
+                        "process_script.py arguments of the optimized tree only (Ex: "
+                        "'-j 4' to check the parallel conversion against the serial one)"),
+                        dest='optimized_args')
+    parser.add_argument('-g', '--synthetic', action='store', type=int,
+                        default=len(SYNTHETIC_SIZES), help=('number of synthetic '
+                        'configurations, of increasing size. Defaults to {}').format(
+                        len(SYNTHETIC_SIZES)), dest='synthetic')
+    parser.add_argument('--seed', action='store', type=int, default=1, help=('seed of '
+                        'the first synthetic configuration. Defaults to 1'), dest='seed')
+    parser.add_argument('-r', '--repeat', action='store', type=int, default=1,
+                        help=('runs of each tree per input, keeping the best time. '
+                        'Defaults to 1'), dest='repeat')
+    parser.add_argument('-k', '--keep', action='store_true', help=('keep the work '
+                        'directory with the configurations and the results of the runs'),
+                        dest='keep')
+    parser.add_argument('--report-json', action='store', default=None, help=('also '
+                        'store the results of every input as JSON in the given file'),
+                        dest='report_json')
+    parsed_args = parser.parse_args()
+
+    if not parsed_args.config_files and parsed_args.synthetic < 1:
+        parser.error('no configurations to convert')
+
+    # Get the script directory
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    optimized_tree = os.path.realpath(parsed_args.optimized_dir or script_dir)
+    bench_dir = tempfile.mkdtemp(prefix='bench-')
+
+    try:
+        if parsed_args.legacy_dir:
+            legacy_tree = os.path.realpath(parsed_args.legacy_dir)
+            legacy_name = legacy_tree
+        else:
+            legacy_tree = bench_dir + '/legacy-tree'
+            legacy_name = parsed_args.legacy_rev
+            try:
+                extract_revision(optimized_tree, parsed_args.legacy_rev, legacy_tree)
+            except ValueError as error:
+                parser.error(str(error))
+
+        inputs = []
+        for index in xrange(parsed_args.synthetic):
+            (reals, groups, vips) = SYNTHETIC_SIZES[index % len(SYNTHETIC_SIZES)]
+            seed = parsed_args.seed + index
+            config_path = bench_dir + '/synthetic-{}.txt'.format(index + 1)
+            with open(config_path, 'wb') as config_file:
+                config_file.write(synthetic_config(seed, reals, groups, vips,
+                                                   index % 2 == 1))
+            inputs.append(("synthetic-{} ({}/{}/{})".format(index + 1, reals, groups,
+                                                            vips), config_path))
+        for config_path in parsed_args.config_files:
+            inputs.append((os.path.basename(config_path), os.path.realpath(config_path)))
+
+        args = parsed_args.args.split()
+        optimized_args = parsed_args.optimized_args.split()
+        print "### Legacy: {} {} - Optimized: {} {} ###".format(legacy_name,
+               ' '.join(args), optimized_tree, ' '.join(args + optimized_args))
+        print
+        print "{:<32} {:>10} {:>10} {:>8} {:>10} {:>10} {:>9}  {}".format('INPUT',
+               'LEGACY s', 'OPTIM s', 'SPEEDUP', 'LEGACY MB', 'OPTIM MB', 'DELTA MB',
+               'RESULT')
+
+        results = []
+        for (index, (name, config_path)) in enumerate(inputs):
+            result = bench_input(legacy_tree, optimized_tree, config_path, args,
+                                 optimized_args, bench_dir + '/run-{}'.format(index + 1),
+                                 max(1, parsed_args.repeat))
+            result['name'] = name
+            results.append(result)
+            print "{:<32} {:>10.3f} {:>10.3f} {:>7.2f}x {:>10.1f} {:>10.1f} {:>+9.1f}  {}"\
+                  .format(name[:32], result['legacy']['time'],
+                          result['optimized']['time'], result['speedup'],
+                          result['legacy']['rss_mb'], result['optimized']['rss_mb'],
+                          result['rss_delta_mb'], 'SAME' if result['same'] else 'DIFF')
+            for different_file in result['different_files']:
+                print "    DIFFERENT: " + different_file
+            for a_line in result['output_diff'][:DIFF_LINES]:
+                print "    " + a_line
+            if len(result['output_diff']) > DIFF_LINES:
+                print "    ... {} more diff lines".format(len(result['output_diff']) -
+                                                         DIFF_LINES)
+            sys.stdout.flush()
+    finally:
+        if parsed_args.keep:
+            print
+            print "Work directory kept in " + bench_dir
+        else:
+            shutil.rmtree(bench_dir, ignore_errors=True)
+
+    differences = len([result for result in results if not result['same']])
+    print
+    print "### {} inputs: {} SAME, {} DIFF ###".format(len(results),
+           len(results) - differences, differences)
+    print
+
+    if parsed_args.report_json:
+        with open(parsed_args.report_json, 'w') as report_file:
+            json.dump(results, report_file, indent=4)
+
+    if differences:
+        sys.exit(1)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+
+import json
+from argparse import ArgumentParser
+import os, sys, time, signal, threading, Queue, urlparse
+from collections import deque
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from object_files import encode_request, diff_objects, LIST_GETALL_METHOD_MAP
+from object_files import LIST_DELETE_METHOD_MAP
+from process_script import read_config, convert_config, conversion_summary
+from delete_script import DELETE_METHOD_MAP
+from upload_script import FILE_MAP, TEMPLATE_MAPS, upload_objects
+from a10_device import A10Device, ResultLog, DependencyScheduler, run_concurrently
+from a10_device import parse_response
+
+# Lists of converted elements, in upload order
+CONVERTED_LISTS = [
+                   ('real_server_map'   , 'server_list'),
+                   ('service_group_map' , 'service_group_list'),
+                   ('vip_map'           , 'virtual_server_list'),
+                  ]
+
+JOB_TYPES = ['convert', 'diff', 'upload', 'delete']
+# Finished jobs kept to be returned by the API, older ones are forgotten
+KEPT_JOBS = 100
+
+
+class MigrationDaemon(object):
+    '''
+    Keeps the converted Alteon configurations and the authenticated A10Device sessions
+    in memory between jobs. Jobs are queued and run by 'workers' threads:
+        - convert : converts an Alteon configuration, reusing the previous conversion
+                    while the file is not modified
+        - diff    : compares a converted configuration with the A10 box elements
+        - upload  : uploads the persistence templates stored in the json_objects files
+                    of template_dir and then a converted configuration to the A10 box
+        - delete  : deletes the elements of a converted configuration from the A10 box,
+                    or all of them (like delete_script.py) if no configuration is given
+    Devices are pooled by IP address, user, password, protocol and partition, each one
+    with up to 'sessions' sessions. Only the last 'kept_jobs' finished jobs are kept, and
+    the password of a job request is dropped when the job finishes.
+    '''
+    def __init__(self, workers=2, sessions=4, result_dir='.', template_dir='.',
+                 kept_jobs=KEPT_JOBS):
+        self.sessions = sessions
+        self.result_dir = result_dir
+        self.template_dir = template_dir
+        self.configs = {}                  # Converted configurations by file path
+        self.devices = {}                  # Pooled devices by device key
+        self.jobs = {}                     # Queued, running and kept jobs by ID
+        self.job_events = {}               # Events set when each job finishes
+        self.finished_jobs = deque()       # IDs of the kept finished jobs, oldest first
+        self.kept_jobs = kept_jobs
+        self.job_queue = Queue.Queue()
+        self.last_job_id = 0
+        self.lock = threading.Lock()
+        # Conversions share the name caches of process_script, so they run one by one
+        self.convert_lock = threading.Lock()
+        # Sessions are opened by one job at a time, so they are not opened twice
+        self.sessions_lock = threading.Lock()
+        self.threads = []
+        for index in range(workers):
+            a_thread = threading.Thread(target=self.worker)
+            a_thread.daemon = True
+            a_thread.start()
+            self.threads.append(a_thread)
+    def submit(self, request):
+        '''
+        Queues a job and returns it. Raises ValueError for invalid requests.
+        '''
+        if request.get('type') not in JOB_TYPES:
+            raise ValueError("Job 'type' must be one of: " + ', '.join(JOB_TYPES))
+        if request['type'] in ['convert', 'diff', 'upload'] and not request.get('config'):
+            raise ValueError("'config' is required for {} jobs".format(request['type']))
+        if request['type'] != 'convert' and not (request.get('device') or
+                                                 {}).get('ip'):
+            raise ValueError("'device' with 'ip' is required for {} jobs".format(
+                             request['type']))
+        with self.lock:
+            self.last_job_id += 1
+            job = {
+                   'id'       : self.last_job_id,
+                   'type'     : request['type'],
+                   'config'   : request.get('config'),
+                   'status'   : 'queued',
+                   'created'  : time.time(),
+                   'result'   : None,
+                   'error'    : None,
+                  }
+            self.jobs[job['id']] = job
+            self.job_events[job['id']] = threading.Event()
+        self.job_queue.put((job, request))
+        return job
+    def wait(self, job_id, timeout):
+        '''
+        Waits up to timeout seconds for a job to finish and returns it, or None if there's
+        no job with that ID.
+        '''
+        with self.lock:
+            job = self.jobs.get(job_id)
+            job_event = self.job_events.get(job_id)
+        if job is None:
+            return None
+        job_event.wait(timeout)
+        return job
+    def worker(self):
+        while True:
+            (job, request) = self.job_queue.get()
+            job['status'] = 'running'
+            job['started'] = time.time()
+            try:
+                job['result'] = getattr(self, request['type'] + 'Job')(job, request)
+                job['status'] = 'done'
+            except Exception as error:
+                job['status'] = 'failed'
+                job['error'] = "{}: {}".format(type(error).__name__, error)
+            job['finished'] = time.time()
+            # The request is not kept, but drop its password in case it is referenced
+            (request.get('device') or {}).pop('password', None)
+            with self.lock:
+                self.finished_jobs.append(job['id'])
+                while len(self.finished_jobs) > self.kept_jobs:
+                    old_job_id = self.finished_jobs.popleft()
+                    del self.jobs[old_job_id]
+                    del self.job_events[old_job_id]
+            self.job_events[job['id']].set()
+    def conversion(self, config_path):
+        '''
+        Returns the cached conversion of a configuration file, converting it again if the
+        file was modified, and whether it was cached.
+        '''
+        config_path = os.path.abspath(config_path)
+        file_stat = os.stat(config_path)
+        version = (file_stat.st_mtime, file_stat.st_size)
+        with self.convert_lock:
+            cached = self.configs.get(config_path)
+            if cached is not None and cached['version'] == version:
+                return cached, True
+            (file_content, lines_in_a_file) = read_config(config_path)
+            conversion = convert_config(file_content, lines_in_a_file)
+            # Requests are encoded once, so uploads only send them
+            requests = [encode_request(value, a_object)
+                        for (a_map, value) in CONVERTED_LISTS
+                        for a_object in conversion[a_map][value]]
+            cached = {
+                      'version'    : version,
+                      'converted'  : time.time(),
+                      'conversion' : conversion,
+                      'requests'   : requests,
+                     }
+            self.configs[config_path] = cached
+            return cached, False
+    def device(self, device_spec):
+        '''
+        Returns the pooled device for a device specification like {"ip": ...,
+        "username": ..., "password": ..., "https": false, "partition": null}, opening
+        its sessions the first time.
+        '''
+        key = (device_spec['ip'], device_spec.get('username', 'admin'),
+               device_spec.get('password', 'a10'), bool(device_spec.get('https')),
+               device_spec.get('partition'))
+        with self.lock:
+            thunder = self.devices.get(key)
+            if thunder is None:
+                thunder = A10Device(key[0], key[1], key[2])
+                thunder.use_https = key[3]
+                thunder.partition = key[4]
+                self.devices[key] = thunder
+        with self.sessions_lock:
+            thunder.openSessions(self.sessions)
+        return thunder
+    def resultLog(self, job):
+        # Progress is not shown, failures are added to the job result from the file
+        return ResultLog(os.path.join(self.result_dir, 'job_{}_results.log'.format(
+                         job['id'])), open(os.devnull, 'w'))
+    def closeResultLog(self, result_log):
+        result_log.close()
+        with open(result_log.file_path, 'r') as a_file:
+            results = [json.loads(a_line) for a_line in a_file if '"fail"' in a_line]
+        return {
+                'successes'  : result_log.successes,
+                'failures'   : [a_result for a_result in results
+                                if a_result['status'] == 'fail'],
+                'result_log' : result_log.file_path,
+               }
+    def convertJob(self, job, request):
+        start_time = time.time()
+        (cached, was_cached) = self.conversion(request['config'])
+        return {
+                'cached'  : was_cached,
+                'elapsed' : round(time.time() - start_time, 4),
+                'summary' : conversion_summary(cached['conversion']),
+               }
+    def diffJob(self, job, request):
+        (cached, was_cached) = self.conversion(request['config'])
+        thunder = self.device(request['device'])
+
+        def get_all(a_map_and_value):
+            (a_map, value) = a_map_and_value
+            content = thunder.callMethod(LIST_GETALL_METHOD_MAP[value], '')
+            result = parse_response(content)
+            if result['status'] == 'fail':
+                raise ValueError("{} failed: {}".format(LIST_GETALL_METHOD_MAP[value],
+                                                        result['msg']))
+            return diff_objects(cached['conversion'][a_map][value],
+                                json.loads(content).get(value, []))
+
+        return dict(zip([value for (a_map, value) in CONVERTED_LISTS],
+                        run_concurrently(get_all, CONVERTED_LISTS, len(CONVERTED_LISTS))))
+    def uploadJob(self, job, request):
+        (cached, was_cached) = self.conversion(request['config'])
+        thunder = self.device(request['device'])
+        result_log = self.resultLog(job)
+
+        # Persistence templates are not converted, they are uploaded first
+        upload_objects(thunder, self.template_dir, result_log, self.sessions,
+                       [(a_map, file_to_process) for (a_map, file_to_process) in FILE_MAP
+                        if a_map in TEMPLATE_MAPS and
+                        os.path.exists(self.template_dir + file_to_process)])
+
+        def upload_request(request_to_send):
+            (value, method, name, body, requires, provides) = request_to_send
+            start_time = time.time()
+            content = thunder.callMethod(method, body)
+            result_log.record(name, method, content, time.time() - start_time)
+
+        scheduler = DependencyScheduler(upload_request, self.sessions,
+                                        4 * self.sessions)
+        scheduler.start()
+        try:
+            for request_to_send in cached['requests']:
+                scheduler.submit(request_to_send, request_to_send[4],
+                                 request_to_send[5])
+        finally:
+            scheduler.join()
+        return self.closeResultLog(result_log)
+    def deleteJob(self, job, request):
+        thunder = self.device(request['device'])
+        result_log = self.resultLog(job)
+
+        if request.get('config'):
+            (cached, was_cached) = self.conversion(request['config'])
+            # Elements are deleted before the elements they use
+            for (a_map, value) in reversed(CONVERTED_LISTS):
+                def delete_object(a_object):
+                    start_time = time.time()
+                    content = thunder.callMethod(LIST_DELETE_METHOD_MAP[value],
+                                                 json.dumps({'name' : a_object['name']}))
+                    result_log.record(a_object['name'], LIST_DELETE_METHOD_MAP[value],
+                                      content, time.time() - start_time)
+                run_concurrently(delete_object, cached['conversion'][a_map][value],
+                                 self.sessions)
+        else:
+            for (method, post_data) in DELETE_METHOD_MAP:
+                start_time = time.time()
+                content = thunder.callMethod(method, post_data)
+                result_log.record(method, method, content, time.time() - start_time)
+        return self.closeResultLog(result_log)
+    def status(self):
+        with self.lock:
+            return {
+                    'configs' : dict((config_path, {'converted' : cached['converted'],
+                                      'elements' : len(cached['requests'])})
+                                     for (config_path, cached) in self.configs.items()),
+                    'devices' : [{'ip' : key[0], 'username' : key[1],
+                                  'partition' : key[4],
+                                  'sessions' : len(thunder.sessions)}
+                                 for (key, thunder) in self.devices.items()],
+                    'queued_jobs' : self.job_queue.qsize(),
+                   }
+    def close(self):
+        '''
+        Closes the sessions of all the pooled devices.
+        '''
+        for thunder in self.devices.values():
+            thunder.endSessions()
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    '''
+    JSON API of the daemon:
+        POST /jobs             : queues the job in the JSON body, returns it
+        GET  /jobs             : returns the queued, running and last finished jobs
+        GET  /jobs/<id>[?wait=<seconds>] : returns a job, waiting for it to finish
+        GET  /status           : returns the cached configurations and pooled devices
+    '''
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+    def reply(self, code, data):
+        body = json.dumps(data)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        path_parts = [a_part for a_part in url.path.split('/') if a_part]
+        daemon = self.server.daemon
+        if path_parts == ['status']:
+            self.reply(200, daemon.status())
+        elif path_parts == ['jobs']:
+            with daemon.lock:
+                jobs = daemon.jobs.values()
+            self.reply(200, sorted(jobs, key=lambda job: job['id']))
+        elif len(path_parts) == 2 and path_parts[0] == 'jobs' and path_parts[1].isdigit():
+            query = urlparse.parse_qs(url.query)
+            try:
+                timeout = float(query.get('wait', ['0'])[0])
+            except ValueError:
+                return self.reply(400, {'error' : "'wait' must be a number of seconds"})
+            job = daemon.wait(int(path_parts[1]), timeout)
+            if job is None:
+                self.reply(404, {'error' : 'Job not found'})
+            else:
+                self.reply(200, job)
+        else:
+            self.reply(404, {'error' : 'Not found'})
+    def do_POST(self):
+        if [a_part for a_part in self.path.split('/') if a_part] != ['jobs']:
+            return self.reply(404, {'error' : 'Not found'})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length',
+                                                                      0))))
+            if not isinstance(request, dict):
+                raise ValueError('The job must be a JSON object')
+            job = self.server.daemon.submit(request)
+        except ValueError as error:
+            return self.reply(400, {'error' : str(error)})
+        self.reply(202, job)
+
+
+class DaemonServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def main():
+    '''
+    Runs a local migration service keeping converted Alteon configurations and 
+    authenticated A10 sessions in memory, so repeated convert, diff, upload and delete
+    jobs during a migration window don't read, convert and authenticate again. It only
+    listens on localhost. Example:
+        curl -X POST localhost:8780/jobs -d '{"type": "upload", "config": "/tmp/alteon.txt",
+             "device": {"ip": "10.0.0.1", "username": "admin", "password": "a10"}}'
+        curl localhost:8780/jobs/1?wait=60
+    Configuration paths are relative to the daemon working directory.
+    '''
+    # Argument parsing
+    parser = ArgumentParser(description=("Local service running convert, diff, upload "
+                            "and delete jobs with warm configurations and A10 sessions"),
+                            prog='python daemon_script.py')
+    parser.add_argument('-p', '--port', action='store', type=int, default=8780,
+                        help='localhost TCP port of the HTTP API. Defaults to 8780',
+                        dest='port')
+    parser.add_argument('-w', '--workers', action='store', type=int, default=2,
+                        help='number of jobs running at once. Defaults to 2',
+                        dest='workers')
+    parser.add_argument('-s', '--sessions', action='store', type=int, default=4,
+                        help=('number of authenticated sessions opened in each A10 box. '
+                        'Defaults to 4'), dest='sessions')
+    parser.add_argument('-r', '--result-dir', action='store', default=None,
+                        help=('directory storing the JSON lines results file of each job. '
+                        'Defaults to daemon_results in the script directory'),
+                        dest='result_dir')
+    parser.add_argument('-k', '--kept-jobs', action='store', type=int,
+                        default=KEPT_JOBS, help=('number of finished jobs kept to be '
+                        'returned by the API. '
+                        'Defaults to {}').format(KEPT_JOBS), dest='kept_jobs')
+    parser.add_argument('-v', '--verbose', action='store_true', help=('show the HTTP '
+                        'requests received'), dest='verbose')
+    parsed_args = parser.parse_args()
+
+    # Get the script directory
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    result_dir = parsed_args.result_dir or script_dir + '/daemon_results'
+    if not os.path.exists(result_dir):
+        os.makedirs(result_dir)
+
+    daemon = MigrationDaemon(max(1, parsed_args.workers), max(1, parsed_args.sessions),
+                             result_dir, script_dir, max(1, parsed_args.kept_jobs))
+    server = DaemonServer(('127.0.0.1', parsed_args.port), DaemonRequestHandler)
+    server.daemon = daemon
+    server.verbose = parsed_args.verbose
+
+    # Stopped with Ctrl-C or SIGTERM, closing the sessions in both cases
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(0))
+    print "### Migration daemon listening on 127.0.0.1:{} ###".format(parsed_args.port)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        print
+    finally:
+        server.server_close()
+        daemon.close()                              # Close Sessions
+    print "### Migration daemon stopped ###"
+
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,29 @@
 #!/usr/bin/env python
 
-import sys
-import subprocess, ast
+import sys, json, os, time
 from argparse import ArgumentParser
 from pprint import pprint
+from a10_device import A10Device, SessionCache, SESSION_CACHE_FILE, SESSION_CACHE_TTL
+from snapshot_script import take_snapshot
+from upload_script import FILE_MAP
+
+# Methods deleting all the instances of each element and their POST data, in order so
+# elements are deleted before the elements they use
+DELETE_METHOD_MAP = [
+                     ('slb.virtual_server.deleteAll'               , ''), 
+                     ('slb.service_group.deleteAll'                , ''),
+                     ('slb.server.deleteAll'                       , ''),
+                     ('slb.template.vip.deleteAll'                 , ''),
+                     #('nat.pool.delete'                           , '{"name":"Snat_Pool_ServerSide"}'),
+                     ('slb.template.src_ip_persistence.deleteAll'  , ''),
+                     ('slb.template.ssl_sid_persistence.deleteAll' , ''),
+                     ('slb.template.cookie_persistence.deleteAll'  , ''),
+                    ]
 
 def main():
     '''
     Simple script to delete all the instances of common configuration elements in A10, by 
-    using the methods defined in 'method_to_post_data_mapper' dictionary
+    using the methods defined in 'DELETE_METHOD_MAP' list
     '''
 	# Argument parsing
     parser = ArgumentParser(description="Script to delete A10's slb configuration ", 
@@ -18,36 +33,58 @@ def main():
                         default='admin', nargs='?',) # Optional arg, defaults to 'admin'
     parser.add_argument('a10_admin_pwd', action='store', help='A10 admin user password',
                         default='a10', nargs='?',)   # Optional arg, defaults to 'a10'                
+    parser.add_argument('--session-cache', action='store_true', help=('reuse the '
+                        'sessions of previous runs stored in --session-cache-file and '
+                        'keep the session open at the end for the next runs'), 
+                        dest='session_cache')
+    parser.add_argument('--session-cache-file', action='store', 
+                        default=SESSION_CACHE_FILE, help=('file storing the sessions '
+                        'reused with --session-cache. Defaults to {}').format(
+                        SESSION_CACHE_FILE), dest='session_cache_file')
+    parser.add_argument('--session-ttl', action='store', type=int, 
+                        default=SESSION_CACHE_TTL, help=('seconds a cached session can be '
+                        'reused since its last use. Defaults to {}').format(
+                        SESSION_CACHE_TTL), dest='session_ttl')
+    parser.add_argument('--snapshot', action='store_true', help=('store a snapshot of '
+                        'the configuration before deleting it, in --snapshot-dir. It can '
+                        'be uploaded again with upload_script.py --objects-dir. VIP '
+                        'templates are not stored, as upload_script.py does not upload '
+                        'them'), dest='snapshot')
+    parser.add_argument('--snapshot-dir', action='store', default=None, help=(
+                        'directory storing the snapshot of --snapshot. Defaults to '
+                        'snapshots/<a10_ip_address>-<date>-<time> in the script '
+                        'directory'), dest='snapshot_dir')
     parsed_args = parser.parse_args()
 
     ip_address = parsed_args.a10_ip_address
     username = parsed_args.a10_admin_user
     password = parsed_args.a10_admin_pwd
 
-    method_to_post_data_mapper = {
-                             'slb.virtual_server.deleteAll'               : '', 
-                             'slb.service_group.deleteAll'                : '',
-                             'slb.server.deleteAll'                       : '',
-                             'slb.template.vip.deleteAll'                 : '',
-                             #'nat.pool.delete'                            : '{"name":"Snat_Pool_ServerSide"}',
-                             'slb.template.src_ip_persistence.deleteAll'  : '',
-                             'slb.template.ssl_sid_persistence.deleteAll' : '',
-                             'slb.template.cookie_persistence.deleteAll'  : '',
-                            } 
-
-    url = "https://" + ip_address + ("/services/rest/V2.1/?method=authenticate&"
-          "format=json&username=") + username + "&password=" + password
-    (stdout, stderr) = subprocess.Popen(['curl2', '-v', '-k', '--tlsv1.0', url], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
-    session_id = ast.literal_eval(stdout)['session_id']
-
-    for method, post_data in method_to_post_data_mapper.items():
-        url = "https://192.168.144.35/services/rest/V2.1/?session_id=" + session_id + "&format=json&method=%s" % method
-        (stdout, stderr) = subprocess.Popen(['curl2', '-v', '-k', '--tlsv1.0', '-H', "Content-Type: application/json", '-X', 'POST', '-d', post_data, url], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+    thunder = A10Device(ip_address, username, password)
+    thunder.use_https = True
+    if parsed_args.session_cache:
+        thunder.session_cache = SessionCache(parsed_args.session_cache_file, 
+                                             parsed_args.session_ttl)
+    thunder.getSession()
+
+    if parsed_args.snapshot:
+        script_dir = os.path.dirname(os.path.realpath(__file__))
+        snapshot_dir = parsed_args.snapshot_dir or '{}/snapshots/{}-{}'.format(script_dir,
+                       ip_address.replace(':', '_'), time.strftime('%Y%m%d-%H%M%S'))
+        # One session per file, so all the lists are got concurrently
+        thunder.openSessions(len(FILE_MAP))
+        take_snapshot(thunder, snapshot_dir, sessions=len(FILE_MAP))
+        print "Snapshot stored in " + snapshot_dir
+
+    for method, post_data in DELETE_METHOD_MAP:
+        content = thunder.callMethod(method, post_data)
 
         print
         print "###  Result to method {}  ###".format(method)
-        pprint(ast.literal_eval(stdout))
+        pprint(json.loads(content))
         print
 
+    thunder.endSessions()
+
 if __name__ == '__main__':
 	main()
\ No newline at end of file
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+
+import json, copy
+from argparse import ArgumentParser
+import os, time
+from collections import OrderedDict
+from object_files import read_object_file, write_object_file, OUTPUT_FORMATS
+from object_files import JSON_BACKENDS, COMPRESSIONS, BUNDLE_FILE, PARTITIONS_FILE
+from upload_script import FILE_MAP, TEXT_MAP, TEMPLATE_MAPS
+from snapshot_script import MAP_LIST_KEY_MAP
+
+
+def unique_name(name, used_names):
+    '''
+    Returns the first free name adding '_2', '_3'... to the given name. Service-group
+    names keep ':vport_number' at the end. Ex: 'App_Web:80' gives 'App_Web_2:80'.
+    '''
+    if ':' in name:
+        (base, port) = name.rsplit(':', 1)
+        port = ':' + port
+    else:
+        (base, port) = (name, '')
+    number = 2
+    while "{}_{}{}".format(base, number, port) in used_names:
+        number += 1
+    return "{}_{}{}".format(base, number, port)
+
+
+def same_service_group(a_service_group, other_service_group):
+    '''
+    Checks two service-groups have the same fields and the same members, in any order.
+    '''
+    return dict(a_service_group, member_list=None) == \
+           dict(other_service_group, member_list=None) and \
+           sorted(a_service_group.get('member_list', [])) == \
+           sorted(other_service_group.get('member_list', []))
+
+
+class ObjectSetMerger(object):
+    '''
+    Merges the json_objects sets converted from several Alteon configurations into a
+    single set to upload to one A10 box. Sets are added in order and the elements of the
+    first sets keep their names, so merging is deterministic:
+        - real-servers with the same host are the same real-server (named as the first
+          one) and their ports are joined, like process_real_server_info does within a
+          configuration. If their settings (Ex: status, conn_limit) or the ones of a
+          shared port differ, the first ones are kept and the conflict is reported.
+          Real-servers with the same name and different host are renamed
+        - service-groups with the same name and the same members (once their real-servers
+          are renamed) are the same service-group. Otherwise they are renamed
+        - virtual-servers with the same name are renamed, unless they are identical.
+          Virtual-servers sharing an address are reported, as they must be fixed by hand
+        - persistence templates with the same name are the same template. If they are
+          different the first one is kept and the conflict is reported
+    Renamed elements are also renamed where they are used (service-group members and
+    vport service-groups). Elements are indexed by name and host in dictionaries, so
+    merging takes linear time.
+    '''
+    def __init__(self):
+        self.lists = OrderedDict((MAP_LIST_KEY_MAP[a_map], [])
+                                 for (a_map, file_to_process) in FILE_MAP)
+        self.by_name = dict((value, {}) for value in self.lists)
+        self.real_servers_by_host = {}
+        self.real_server_ports = {}         # Port numbers of each real-server
+        self.vips_by_address = {}
+        self.vips_by_content = {}           # Merged name by (name, JSON without name)
+        # Merge results, as lists of (set name, element name, merged element name)
+        self.merged = dict((value, []) for value in self.lists)
+        self.renamed = dict((value, []) for value in self.lists)
+        self.conflicts = []                 # (set name, description)
+    def addSet(self, set_name, lists):
+        '''
+        Merges a set given as a dictionary of lists by list key (Ex: 'server_list').
+        '''
+        for value in self.lists:
+            if value not in ['server_list', 'service_group_list', 'virtual_server_list']:
+                for a_template in lists.get(value, []):
+                    self.addTemplate(set_name, value, a_template)
+
+        real_server_names = {}
+        for a_real_server in lists.get('server_list', []):
+            real_server_names[a_real_server['name']] = self.addRealServer(set_name,
+                                                                         a_real_server)
+        service_group_names = {}
+        for a_service_group in lists.get('service_group_list', []):
+            service_group_names[a_service_group['name']] = self.addServiceGroup(
+                                                  set_name, a_service_group,
+                                                  real_server_names)
+        for a_vip in lists.get('virtual_server_list', []):
+            self.addVirtualServer(set_name, a_vip, service_group_names)
+    def add(self, value, a_object):
+        self.lists[value].append(a_object)
+        self.by_name[value][a_object['name']] = a_object
+    def addTemplate(self, set_name, value, a_template):
+        existing = self.by_name[value].get(a_template['name'])
+        if existing is None:
+            self.add(value, copy.deepcopy(a_template))
+        elif existing != a_template:
+            self.conflicts.append((set_name, "{} {} differs from the one already merged, "
+                                   "the first one is kept".format(TEXT_MAP[value],
+                                                                  a_template['name'])))
+    def addRealServer(self, set_name, a_real_server):
+        '''
+        Merges a real-server and returns its name in the merged set.
+        '''
+        existing = self.real_servers_by_host.get(a_real_server['host'])
+        if existing is not None:
+            # Same real-server, join the ports not in the merged one yet
+            port_numbers = self.real_server_ports[existing['name']]
+            differences = sorted(key for key in set(existing) | set(a_real_server)
+                                 if key not in ['name', 'port_list'] and
+                                 existing.get(key) != a_real_server.get(key))
+            for a_port in a_real_server.get('port_list', []):
+                if a_port['port_num'] not in port_numbers:
+                    port_numbers.add(a_port['port_num'])
+                    existing['port_list'].append(copy.deepcopy(a_port))
+                elif a_port not in existing['port_list']:
+                    differences.append('port {}'.format(a_port['port_num']))
+            if differences:
+                self.conflicts.append((set_name, "REAL SERVER {} ({}) differs in {} from "
+                                       "{} already merged, the first one is kept".format(
+                                       a_real_server['name'], a_real_server['host'],
+                                       ', '.join(differences), existing['name'])))
+            self.merged['server_list'].append((set_name, a_real_server['name'],
+                                               existing['name']))
+            return existing['name']
+
+        a_real_server = copy.deepcopy(a_real_server)
+        if a_real_server['name'] in self.by_name['server_list']:
+            # Duplicate real_server_name with different address
+            name = unique_name(a_real_server['name'], self.by_name['server_list'])
+            self.renamed['server_list'].append((set_name, a_real_server['name'], name))
+            a_real_server['name'] = name
+        self.add('server_list', a_real_server)
+        self.real_servers_by_host[a_real_server['host']] = a_real_server
+        self.real_server_ports[a_real_server['name']] = set(a_port['port_num'] for a_port
+                                                    in a_real_server.get('port_list', []))
+        return a_real_server['name']
+    def addServiceGroup(self, set_name, a_service_group, real_server_names):
+        '''
+        Merges a service-group, renaming its members with the names their real-servers
+        got in the merged set. Returns its name in the merged set.
+        '''
+        a_service_group = copy.deepcopy(a_service_group)
+        member_list = []
+        members = set()
+        for a_member in a_service_group.get('member_list', []):
+            a_member['server'] = real_server_names.get(a_member['server'],
+                                                       a_member['server'])
+            # Members of different real-servers of the set may be the same now
+            if (a_member['server'], a_member['port']) not in members:
+                members.add((a_member['server'], a_member['port']))
+                member_list.append(a_member)
+        a_service_group['member_list'] = member_list
+
+        existing = self.by_name['service_group_list'].get(a_service_group['name'])
+        if existing is not None:
+            if same_service_group(existing, a_service_group):
+                self.merged['service_group_list'].append((set_name,
+                                                          a_service_group['name'],
+                                                          existing['name']))
+                return existing['name']
+            name = unique_name(a_service_group['name'],
+                               self.by_name['service_group_list'])
+            self.renamed['service_group_list'].append((set_name, a_service_group['name'],
+                                                       name))
+            a_service_group['name'] = name
+        self.add('service_group_list', a_service_group)
+        return a_service_group['name']
+    def addVirtualServer(self, set_name, a_vip, service_group_names):
+        '''
+        Merges a virtual-server, renaming its vport service-groups with the names they
+        got in the merged set.
+        '''
+        a_vip = copy.deepcopy(a_vip)
+        for a_vport in a_vip.get('vport_list', []):
+            if 'service_group' in a_vport:
+                a_vport['service_group'] = service_group_names.get(
+                                           a_vport['service_group'],
+                                           a_vport['service_group'])
+
+        # Identical virtual-servers are found by content, as configurations may have
+        # several virtual-servers with the same name
+        content_key = (a_vip['name'], json.dumps(dict(a_vip, name=None), sort_keys=True))
+        if content_key in self.vips_by_content:
+            self.merged['virtual_server_list'].append((set_name, a_vip['name'],
+                                                       self.vips_by_content[content_key]))
+            return
+
+        if a_vip['name'] in self.by_name['virtual_server_list']:
+            name = unique_name(a_vip['name'], self.by_name['virtual_server_list'])
+            self.renamed['virtual_server_list'].append((set_name, a_vip['name'], name))
+            a_vip['name'] = name
+
+        address_vip = self.vips_by_address.get(a_vip.get('address'))
+        if address_vip is not None:
+            self.conflicts.append((set_name, "VIRTUAL SERVER {} has the same address {} "
+                                   "as {}".format(a_vip['name'], a_vip['address'],
+                                                  address_vip['name'])))
+        else:
+            self.vips_by_address[a_vip.get('address')] = a_vip
+        self.vips_by_content[content_key] = a_vip['name']
+        self.add('virtual_server_list', a_vip)
+
+
+def read_object_set(objects_dir):
+    '''
+    Reads the json_objects files existing in objects_dir. Returns a dictionary of lists
+    by list key.
+    '''
+    lists = {}
+    for (a_map, file_to_process) in FILE_MAP:
+        if os.path.exists(objects_dir + file_to_process):
+            value, a_map_objects = read_object_file(objects_dir + file_to_process)
+            lists[value] = list(a_map_objects)
+    return lists
+
+
+def main():
+    '''
+    Merges the json_objects sets of several Alteon configurations, converted one by one
+    with process_script.py, into a single set ready to upload to one A10 box with
+    upload_script.py. See ObjectSetMerger for the merging rules.
+    '''
+    # Argument parsing
+    parser = ArgumentParser(description=("Script to merge the json objects files of "
+                            "several processed alteon configurations"),
+                            prog='python merge_script.py')
+    parser.add_argument('objects_dirs', action='store', nargs='+', help=('directories '
+                        'holding the json_objects directory of each configuration, in '
+                        'merging order'))
+    parser.add_argument('-o', '--output-dir', action='store', default=None,
+                        help=('directory to store the merged json_objects directory. '
+                        'Defaults to the script directory'), dest='output_dir')
+    parser.add_argument('-f', '--format', action='store', choices=OUTPUT_FORMATS,
+                        default='pretty', help=('format of the stored json objects files'
+                        ". Defaults to 'pretty'"), dest='output_format')
+    parser.add_argument('-b', '--json-backend', action='store',
+                        choices=sorted(JSON_BACKENDS), default='json', help=('serializer '
+                        "used for 'compact' and 'ndjson' formats. Defaults to 'json'"),
+                        dest='json_backend')
+    parser.add_argument('-z', '--compress', action='store', choices=COMPRESSIONS,
+                        default=None, help='compress the stored json objects files',
+                        dest='compression')
+    parser.add_argument('-v', '--verbose', action='store_true', help=('show every '
+                        'merged and renamed element'), dest='verbose')
+    parser.add_argument('--report-json', help=('also export the merged, renamed and '
+                        'conflicting elements to the given JSON file'),
+                        dest='report_json')
+    parsed_args = parser.parse_args()
+
+    # Get the script directory
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    output_dir = parsed_args.output_dir or script_dir
+
+    start_time = time.time()
+    merger = ObjectSetMerger()
+    # All the sets are read before storing the merged one, as it may replace any of them
+    object_sets = [(objects_dir, read_object_set(objects_dir))
+                   for objects_dir in parsed_args.objects_dirs]
+    for (objects_dir, lists) in object_sets:
+        merger.addSet(objects_dir, lists)
+
+    print
+    print "### MERGE ###"
+    for (value, a_map_objects) in merger.lists.items():
+        print "{:<25}: {:>6} read, {:>6} merged, {:>6} renamed, {:>6} stored".format(
+               TEXT_MAP[value], sum(len(lists.get(value, []))
+                                    for (objects_dir, lists) in object_sets),
+               len(merger.merged[value]), len(merger.renamed[value]),
+               len(a_map_objects))
+        if parsed_args.verbose:
+            for (set_name, name, merged_name) in merger.merged[value]:
+                print "    MERGED  : {} {} as {}".format(set_name, name, merged_name)
+        for (set_name, name, merged_name) in merger.renamed[value]:
+            print "    RENAMED : {} {} to {}".format(set_name, name, merged_name)
+    for (set_name, description) in merger.conflicts:
+        print "CONFLICT  : {} {}".format(set_name, description)
+    print
+
+    if not os.path.exists(output_dir + '/json_objects'):
+        os.makedirs(output_dir + '/json_objects')
+    for (a_map, file_to_store) in FILE_MAP:
+        value = MAP_LIST_KEY_MAP[a_map]
+        if a_map in TEMPLATE_MAPS and not merger.lists[value]:
+            # No set has templates (process_script.py doesn't store them), so the ones
+            # in the output directory, referenced by the merged vports, are kept
+            if os.path.exists(output_dir + file_to_store):
+                print "Kept {} file...".format(output_dir + file_to_store)
+            continue
+        write_object_file(output_dir + file_to_store, value, merger.lists[value],
+                          parsed_args.output_format, parsed_args.json_backend,
+                          parsed_args.compression)
+        print "Successfully saved {} file...".format(output_dir + file_to_store)
+    # The bundle and the partitions of a previous process_script.py run in the output
+    # directory don't hold the merged set, upload_script.py would upload them instead
+    for file_to_remove in [BUNDLE_FILE, PARTITIONS_FILE]:
+        if os.path.exists(output_dir + file_to_remove):
+            os.remove(output_dir + file_to_remove)
+            print "Removed stale {} file...".format(output_dir + file_to_remove)
+
+    if parsed_args.report_json:
+        with open(parsed_args.report_json, 'w') as a_file:
+            json.dump(OrderedDict([('merged', merger.merged),
+                                   ('renamed', merger.renamed),
+                                   ('conflicts', merger.conflicts)]), a_file, indent=4)
+
+    print
+    print "### Merge finished in {:.2f} s ###".format(time.time() - start_time)
+    print
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+
+import os, json, mmap, struct, gzip
+
+# Formats available to store the json_objects files:
+#   - pretty  : indented JSON document (indent=4), the original format
+#   - compact : JSON document without indentation nor extra blanks
+#   - ndjson  : newline delimited JSON. The first line is the empty wrapper document
+#               (Ex: {"server_list":[]}) naming the list, followed by one object per line
+OUTPUT_FORMATS = ['pretty', 'compact', 'ndjson']
+
+# Compressions of the json_objects files and the magic bytes their files start with.
+# Files keep their names, read_object_file() detects the compression. lzma needs the
+# lzma module (backports.lzma in python 2)
+COMPRESSION_MAGIC_MAP = {'gzip' : '\x1f\x8b', 'lzma' : '\xfd7zXZ\x00'}
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# Compressions available to store the json_objects files
+COMPRESSIONS = ['gzip'] if lzma is None else ['gzip', 'lzma']
+
+# aXAPI method creating the elements of each list in the A10 box
+LIST_METHOD_MAP = {
+                   'cookie_persistence_template_list' : 
+                                             'slb.template.cookie_persistence.create',
+                   'src_ip_persistence_template_list' : 
+                                             'slb.template.src_ip_persistence.create',
+                   'ssl_sid_persist_template_list'    : 
+                                             'slb.template.ssl_sid_persistence.create',
+                   'server_list'                      : 'slb.server.create',
+                   'server_port_list'                 : 'slb.server.port.create',
+                   'service_group_list'               : 'slb.service_group.create',
+                   'virtual_server_list'              : 'slb.virtual_server.create',
+                  }
+
+# aXAPI methods getting all the elements of each list from the A10 box, and deleting one
+# element by name for the lists generated by process_script.py
+LIST_GETALL_METHOD_MAP = {
+                          'cookie_persistence_template_list' : 
+                                             'slb.template.cookie_persistence.getAll',
+                          'src_ip_persistence_template_list' : 
+                                             'slb.template.src_ip_persistence.getAll',
+                          'ssl_sid_persist_template_list'    : 
+                                             'slb.template.ssl_sid_persistence.getAll',
+                          'server_list'                      : 'slb.server.getAll',
+                          'service_group_list'               : 'slb.service_group.getAll',
+                          'virtual_server_list'              : 'slb.virtual_server.getAll',
+                         }
+
+LIST_DELETE_METHOD_MAP = {
+                          'server_list'         : 'slb.server.delete',
+                          'service_group_list'  : 'slb.service_group.delete',
+                          'virtual_server_list' : 'slb.virtual_server.delete',
+                         }
+
+# Persistence template lists referenced by each vport key
+VPORT_TEMPLATE_MAP = {
+                      'cookie_persistence_template'         : 
+                                                     'cookie_persistence_template_list',
+                      'source_ip_persistence_template'      : 
+                                                     'src_ip_persistence_template_list',
+                      'ssl_session_id_persistence_template' : 
+                                                     'ssl_sid_persist_template_list',
+                     }
+
+# Partitions stored by the last process_script.py run, one name per line, so stale
+# partition subdirectories of previous runs are not uploaded
+PARTITIONS_FILE = '/json_objects/PARTITIONS.txt'
+
+# Bundle of pre-encoded aXAPI requests (see BundleWriter), stored with the json_objects
+BUNDLE_FILE = '/json_objects/OBJECTs.bundle'
+BUNDLE_MAGIC = 'A10BUNDLE1\n'
+BUNDLE_END_MAGIC = 'A10BEND1'
+# Trailer at the end of the bundle: offset of the index and BUNDLE_END_MAGIC
+BUNDLE_TRAILER = struct.Struct('<Q8s')
+
+# Serializers available for 'compact' and 'ndjson' formats. 'pretty' format is always
+# written with the standard json module to keep the original layout.
+JSON_BACKENDS = {'json' : json}
+
+try:
+    import simplejson
+    JSON_BACKENDS['simplejson'] = simplejson
+except ImportError:
+    pass
+
+try:
+    import ujson
+    JSON_BACKENDS['ujson'] = ujson
+except ImportError:
+    pass
+
+
+def compact_dumps(a_object, backend='json'):
+    '''
+    Serializes a object without indentation nor blanks after separators using the given
+    backend in JSON_BACKENDS.
+    '''
+    if backend == 'ujson':
+        # ujson output is already compact and does not accept 'separators'
+        return JSON_BACKENDS[backend].dumps(a_object)
+    return JSON_BACKENDS[backend].dumps(a_object, separators=(',', ':'))
+
+
+def open_object_file(file_path, mode='r', compression=None):
+    '''
+    Opens a json_objects file. When writing, the file is compressed with the given
+    compression of COMPRESSIONS (None for plain text). When reading, the compression is
+    detected from the first bytes of the file and the content decompressed as it's read.
+    '''
+    if 'w' in mode:
+        if compression is None:
+            return open(file_path, 'w')
+        if compression not in COMPRESSIONS:
+            raise ValueError("Compression '{}' not available".format(compression))
+        if compression == 'gzip':
+            return gzip.open(file_path, 'wb')
+        return lzma.LZMAFile(file_path, 'wb')
+
+    with open(file_path, 'rb') as a_file:
+        magic = a_file.read(6)
+    if magic.startswith(COMPRESSION_MAGIC_MAP['gzip']):
+        return gzip.open(file_path, 'rb')
+    if magic.startswith(COMPRESSION_MAGIC_MAP['lzma']):
+        if lzma is None:
+            raise ValueError("{} is lzma compressed and lzma module is not available "
+                             "(pip install backports.lzma)".format(file_path))
+        return lzma.LZMAFile(file_path, 'rb')
+    return open(file_path, 'r')
+
+
+class ObjectWriter(object):
+    '''
+    Writes a json_objects file streaming the objects to disk one by one, instead of
+    building the whole document in memory. The resulting file has the structure
+    {list_key : [object, object, ...]} in the chosen format of OUTPUT_FORMATS, optionally
+    compressed with one of COMPRESSIONS.
+    '''
+    def __init__(self, file_path, list_key, output_format='pretty', backend='json',
+                 compression=None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Unknown output format '{}'".format(output_format))
+        if backend not in JSON_BACKENDS:
+            raise ValueError("JSON backend '{}' not available".format(backend))
+        self.file_path = file_path
+        self.list_key = list_key
+        self.output_format = output_format
+        self.backend = backend
+        self.count = 0
+        self.a_file = open_object_file(file_path, 'w', compression)
+
+    def write(self, a_object):
+        if self.output_format == 'pretty':
+            # Same layout json.dump(..., indent=4) gives to the objects of the list
+            if self.count == 0:
+                self.a_file.write('{\n    ' + json.dumps(self.list_key) + ': [\n')
+            else:
+                self.a_file.write(', \n')
+            self.a_file.write('\n'.join(8 * ' ' + a_line for a_line in
+                                        json.dumps(a_object, indent=4).split('\n')))
+        elif self.output_format == 'compact':
+            if self.count == 0:
+                self.a_file.write('{' + json.dumps(self.list_key) + ':[')
+            else:
+                self.a_file.write(',')
+            self.a_file.write(compact_dumps(a_object, self.backend))
+        else:
+            if self.count == 0:
+                self.a_file.write(compact_dumps({self.list_key : []}) + '\n')
+            self.a_file.write(compact_dumps(a_object, self.backend) + '\n')
+        self.count += 1
+
+    def close(self):
+        if self.output_format == 'pretty':
+            if self.count == 0:
+                self.a_file.write('{\n    ' + json.dumps(self.list_key) + ': []\n}')
+            else:
+                self.a_file.write('\n    ]\n}')
+        elif self.output_format == 'compact':
+            if self.count == 0:
+                self.a_file.write('{' + json.dumps(self.list_key) + ':[')
+            self.a_file.write(']}')
+        elif self.count == 0:
+            self.a_file.write(compact_dumps({self.list_key : []}) + '\n')
+        self.a_file.close()
+
+
+def write_object_file(file_path, list_key, objects, output_format='pretty',
+                      backend='json', compression=None):
+    '''
+    Stores all the objects of a list in a json_objects file. Returns the number of objects
+    written.
+    '''
+    writer = ObjectWriter(file_path, list_key, output_format, backend, compression)
+    for a_object in objects:
+        writer.write(a_object)
+    writer.close()
+    return writer.count
+
+
+def partition_path(file_path, partition=None):
+    '''
+    Returns the path of a json_objects file (Ex: '/json_objects/VIPs.txt') for the given
+    A10 partition. Files of a partition are stored in a subdirectory named after it, 
+    while files of the shared partition (None) keep their path.
+    '''
+    if partition is None:
+        return file_path
+    (directory, file_name) = os.path.split(file_path)
+    return directory + '/' + partition + '/' + file_name
+
+
+def _iterate_ndjson(a_file):
+    '''
+    Yields the objects of a ndjson file, one per line, closing the file at the end.
+    '''
+    try:
+        for a_line in a_file:
+            if a_line.strip():
+                yield json.loads(a_line)
+    finally:
+        a_file.close()
+
+
+def read_object_file(file_path):
+    '''
+    Reads a json_objects file written in any of the OUTPUT_FORMATS (or by hand, like the
+    persistence template files), compressed or not, and returns a tuple
+    (list_key, objects).
+    For 'pretty' and 'compact' files objects is a list. For 'ndjson' files objects is an
+    iterator streaming the objects from disk as they are consumed.
+    '''
+    a_file = open_object_file(file_path)
+    first_line = a_file.readline()
+
+    header = None
+    if first_line.strip() not in ['', '{']:
+        try:
+            header = json.loads(first_line)
+        except ValueError:
+            # First line is just the beginning of a multi-line document
+            header = None
+
+    if isinstance(header, dict) and len(header) == 1 and \
+       isinstance(header.values()[0], list):
+        list_key = header.keys()[0]
+        if header[list_key]:
+            # Compact document, all the objects are in the first line
+            a_file.close()
+            return list_key, header[list_key]
+        # ndjson file (or an empty compact document, the following lines are empty)
+        return list_key, _iterate_ndjson(a_file)
+
+    # Multi-line JSON document
+    a_map = json.loads(first_line + a_file.read())
+    a_file.close()
+    list_key = a_map.keys()[0]
+    return list_key, a_map[list_key]
+
+
+def object_dependencies(value, a_object):
+    '''
+    Returns (requires, provides) keys of an element of the value list (a key of 
+    LIST_METHOD_MAP), so it can be uploaded once the elements it depends on are in the A10
+    box: service-groups require the real-server ports of their members and 
+    virtual-servers the service-groups and persistence templates of their vports.
+    '''
+    requires = []
+    provides = []
+    if value == 'server_list':
+        provides.append(('server', a_object['name']))
+        provides.extend(('server_port', a_object['name'], a_port['port_num']) 
+                        for a_port in a_object.get('port_list', []))
+    elif value == 'server_port_list':
+        requires.append(('server', a_object['name']))
+        provides.append(('server_port', a_object['name'], a_object['port']['port_num']))
+    elif value == 'service_group_list':
+        requires.extend(('server_port', a_member['server'], a_member['port'])
+                        for a_member in a_object.get('member_list', []))
+        provides.append(('service_group', a_object['name']))
+    elif value == 'virtual_server_list':
+        for a_vport in a_object.get('vport_list', []):
+            if 'service_group' in a_vport:
+                requires.append(('service_group', a_vport['service_group']))
+            requires.extend(('template', VPORT_TEMPLATE_MAP[a_key], a_vport[a_key])
+                            for a_key in VPORT_TEMPLATE_MAP if a_key in a_vport)
+    else:
+        provides.append(('template', value, a_object['name']))
+    return requires, provides
+
+
+def object_contains(remote, local):
+    '''
+    Checks an element got from the A10 box (remote) has all the fields of the element
+    generated locally with the same values. The A10 box returns many more fields (with
+    default values) and lists in its own order, so extra fields are ignored and list 
+    items are matched with any item of the remote list.
+    '''
+    if isinstance(local, dict):
+        return isinstance(remote, dict) and all(a_key in remote and 
+                                                object_contains(remote[a_key], a_value)
+                                                for (a_key, a_value) in local.items())
+    if isinstance(local, list):
+        return isinstance(remote, list) and len(remote) == len(local) and \
+               all(any(object_contains(a_remote, a_local) for a_remote in remote)
+                   for a_local in local)
+    return remote == local
+
+
+def object_differences(remote, local, path=''):
+    '''
+    Returns the fields of an element generated locally that the element got from the A10
+    box (remote) doesn't contain with the same values, as a list of descriptions like
+    'vport_list[0].service_group: "SG_1" != "SG_2"' (local value first). Empty when
+    object_contains(remote, local).
+    '''
+    if isinstance(local, dict):
+        if not isinstance(remote, dict):
+            return ["{}: {} != {}".format(path, json.dumps(local), json.dumps(remote))]
+        differences = []
+        for (a_key, a_value) in local.items():
+            key_path = "{}.{}".format(path, a_key) if path else a_key
+            if a_key not in remote:
+                differences.append("{}: missing".format(key_path))
+            else:
+                differences.extend(object_differences(remote[a_key], a_value, key_path))
+        return differences
+    if isinstance(local, list):
+        if not isinstance(remote, list):
+            return ["{}: {} != {}".format(path, json.dumps(local), json.dumps(remote))]
+        if len(remote) != len(local):
+            return ["{}: {} items != {} items".format(path, len(local), len(remote))]
+        differences = []
+        for (index, a_local) in enumerate(local):
+            if not any(object_contains(a_remote, a_local) for a_remote in remote):
+                # Reported against the closest item of the remote list
+                item_path = "{}[{}]".format(path, index)
+                differences.extend(min((object_differences(a_remote, a_local, item_path)
+                                        for a_remote in remote), key=len))
+        return differences
+    if remote != local:
+        return ["{}: {} != {}".format(path, json.dumps(local), json.dumps(remote))]
+    return []
+
+
+def diff_objects(local_objects, remote_objects):
+    '''
+    Compares the elements of a list generated locally with the ones got from the A10 box,
+    by name. Returns a dictionary with the names of the elements 'missing' in the A10
+    box, 'changed' (not containing the local fields, see object_contains) and 'extra' 
+    (only in the A10 box), in the order of each list, and the 'fields' that differ in
+    each changed element (see object_differences).
+    '''
+    remote_by_name = dict((a_object.get('name'), a_object) for a_object in remote_objects)
+    local_names = set()
+    diff = {'missing' : [], 'changed' : [], 'extra' : [], 'fields' : {}}
+    for a_object in local_objects:
+        local_names.add(a_object['name'])
+        if a_object['name'] not in remote_by_name:
+            diff['missing'].append(a_object['name'])
+        elif not object_contains(remote_by_name[a_object['name']], a_object):
+            diff['changed'].append(a_object['name'])
+            diff['fields'][a_object['name']] = object_differences(
+                                               remote_by_name[a_object['name']], a_object)
+    diff['extra'] = [a_object.get('name') for a_object in remote_objects 
+                     if a_object.get('name') not in local_names]
+    return diff
+
+
+def encode_request(value, a_object, backend='json'):
+    '''
+    Returns the aXAPI request creating an element of the value list as a tuple
+    (list_key, method, name, body, requires, provides), the same bundles hold.
+    '''
+    body = compact_dumps(a_object, backend)
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+    (requires, provides) = object_dependencies(value, a_object)
+    return (value, LIST_METHOD_MAP[value], a_object.get('name', ''), body, requires, 
+            provides)
+
+
+class BundleWriter(object):
+    '''
+    Writes a bundle of aXAPI requests ready to be sent, so uploads don't need to parse 
+    and serialize the elements again. The bundle holds:
+        - BUNDLE_MAGIC
+        - the request body of each element, one after another
+        - the index, a JSON list with [list_key, method, name, offset, length, requires,
+          provides] for each body, in upload order (see object_dependencies)
+        - BUNDLE_TRAILER with the offset of the index
+    '''
+    def __init__(self, file_path, backend='json'):
+        if backend not in JSON_BACKENDS:
+            raise ValueError("JSON backend '{}' not available".format(backend))
+        self.file_path = file_path
+        self.backend = backend
+        self.index = []
+        self.a_file = open(file_path, 'wb')
+        self.a_file.write(BUNDLE_MAGIC)
+        self.offset = len(BUNDLE_MAGIC)
+
+    def write(self, value, a_object):
+        (value, method, name, body, requires, provides) = encode_request(value, a_object,
+                                                                         self.backend)
+        self.a_file.write(body)
+        self.index.append([value, method, name, self.offset, len(body), requires, 
+                           provides])
+        self.offset += len(body)
+
+    def close(self):
+        self.a_file.write(compact_dumps(self.index))
+        self.a_file.write(BUNDLE_TRAILER.pack(self.offset, BUNDLE_END_MAGIC))
+        self.a_file.close()
+
+
+def write_bundle(file_path, lists, backend='json'):
+    '''
+    Stores the elements of each (list_key, objects) of lists in a bundle, in the given
+    order. Returns the number of elements written.
+    '''
+    writer = BundleWriter(file_path, backend)
+    for (value, objects) in lists:
+        for a_object in objects:
+            writer.write(value, a_object)
+    writer.close()
+    return len(writer.index)
+
+
+class Bundle(object):
+    '''
+    Bundle written with BundleWriter, memory-mapped so request bodies are read straight
+    from the page cache. Iterating it yields (list_key, method, name, body, requires, 
+    provides) for each element, in upload order.
+    '''
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.a_file = open(file_path, 'rb')
+        try:
+            self.mapping = mmap.mmap(self.a_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file, it can't be mapped
+            self.a_file.close()
+            raise ValueError("'{}' is not a bundle file".format(file_path))
+        
+        trailer_offset = len(self.mapping) - BUNDLE_TRAILER.size
+        if self.mapping[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC or trailer_offset < 0:
+            self.close()
+            raise ValueError("'{}' is not a bundle file".format(file_path))
+        (index_offset, end_magic) = BUNDLE_TRAILER.unpack(self.mapping[trailer_offset:])
+        if end_magic != BUNDLE_END_MAGIC:
+            self.close()
+            raise ValueError("'{}' is an incomplete bundle file".format(file_path))
+        self.index = json.loads(self.mapping[index_offset:trailer_offset])
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for (value, method, name, offset, length, requires, provides) in self.index:
+            # Dependency keys are JSON lists in the index, tuples are needed as keys
+            yield (value, method, name, self.mapping[offset:offset + length], 
+                   [tuple(key) for key in requires], [tuple(key) for key in provides])
+
+    def close(self):
+        if hasattr(self, 'mapping'):
+            self.mapping.close()
+        self.a_file.close()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import json
+from argparse import ArgumentParser
+import os, time
+from object_files import read_object_file, object_dependencies, LIST_METHOD_MAP
+from process_script import read_config, convert_config
+from upload_script import FILE_MAP, TEXT_MAP, TEMPLATE_MAPS
+from a10_device import A10Device, SessionCache, SESSION_CACHE_FILE, SESSION_CACHE_TTL
+from a10_device import ResultLog, DependencyScheduler
+
+def main():
+    '''
+    Converts the Alteon configuration and uploads it to the A10 box in a single run,
+    without storing and loading the json_objects files of the real-servers,
+    service-groups and virtual-servers. Elements are handed from the conversion to the
+    upload as soon as they are final, and uploaded as soon as the elements they depend
+    on are in the A10 box (real-servers before the service-groups using them, and
+    service-groups and persistence templates before the virtual-servers using them).
+    Persistence templates are still loaded from the json_objects files.
+    '''
+    # Argument parsing
+    parser = ArgumentParser(description=("Script to process alteon configuration file and"
+                            " upload it to the A10 box while it's being processed"),
+                            prog='python pipeline_script.py')
+    parser.add_argument('alteon_config_file', action='store', help=('Alteon configuration'
+                        ' file to process'))
+    parser.add_argument('a10_ip_address', action='store', help='A10 management IP')
+    parser.add_argument('a10_admin_user', action='store', help='A10 admin user',
+                        default='admin', nargs='?',) # Optional arg, defaults to 'admin'
+    parser.add_argument('a10_admin_pwd', action='store', help='A10 admin user password',
+                        default='a10', nargs='?',)   # Optional arg, defaults to 'a10'
+    parser.add_argument('-v', '--verbose', action='store_true', help=('increase output '
+                        'verbosity showing HTTPs POST Requests/Responses in detail'),
+                        dest= 'verbose')
+    parser.add_argument('-d', '--duplicate', action='store_true', help=('help to detect '
+                        'duplicate service-groups names and duplicate real-server names')
+                        , dest= 'duplicate')
+    parser.add_argument('-j', '--jobs', action='store', type=int, default=1,
+                        help=('number of worker processes looking up the Alteon '
+                        'configuration sections. Defaults to 1'), dest='jobs')
+    parser.add_argument('-s', '--sessions', action='store', type=int, default=1,
+                        help=('number of authenticated sessions opened in the A10 box to '
+                        'upload elements concurrently. Defaults to 1'), dest='sessions')
+    parser.add_argument('-q', '--queue-size', action='store', type=int, default=100,
+                        help=('maximum number of converted elements waiting to be '
+                        'uploaded. The conversion waits when reached. Defaults to 100'),
+                        dest='queue_size')
+    parser.add_argument('--session-cache', action='store', nargs='?',
+                        const=SESSION_CACHE_FILE, default=None, help=('reuse the sessions '
+                        'of previous runs stored in the given file (defaults to {}) and '
+                        'keep the sessions open at the end for the next runs').format(
+                        SESSION_CACHE_FILE), dest='session_cache')
+    parser.add_argument('--session-ttl', action='store', type=int,
+                        default=SESSION_CACHE_TTL, help=('seconds a cached session can be '
+                        'reused since its last use. Defaults to {}').format(
+                        SESSION_CACHE_TTL), dest='session_ttl')
+    parser.add_argument('-r', '--result-log', action='store', default=None,
+                        help=('JSON lines file storing the result of every aXAPI call. '
+                        'Defaults to upload_results.log in the script directory'),
+                        dest='result_log')
+    parsed_args = parser.parse_args()
+
+    sessions = max(1, parsed_args.sessions)
+
+    # Get the script directory
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+
+    thunder = A10Device(parsed_args.a10_ip_address, parsed_args.a10_admin_user,
+                        parsed_args.a10_admin_pwd)
+    thunder.debug = parsed_args.verbose
+    if parsed_args.session_cache:
+        thunder.session_cache = SessionCache(parsed_args.session_cache,
+                                             parsed_args.session_ttl)
+    thunder.openSessions(sessions)                      # GET authentication sessions
+
+    result_log_path = parsed_args.result_log or script_dir + '/upload_results.log'
+    result_log = ResultLog(result_log_path)
+
+    def upload_object(value_object_and_label):
+        (value, a_object, label) = value_object_and_label
+        method = LIST_METHOD_MAP[value]
+        start_time = time.time()
+        content = thunder.callMethod(method, json.dumps(a_object))
+        result_log.record(label, method, content, time.time() - start_time)
+
+    scheduler = DependencyScheduler(upload_object, sessions, parsed_args.queue_size)
+
+    # Number of elements of each list handed to the upload, to label them
+    counters = dict((value, 0) for value in LIST_METHOD_MAP)
+
+    def emit(value, a_object):
+        counters[value] += 1
+        if value == 'server_port_list':
+            name = "{}:{}".format(a_object['name'], a_object['port']['port_num'])
+        else:
+            name = a_object.get('name', '')
+        label = "{} {} ({})".format(TEXT_MAP[value], str(counters[value]), name)
+        (requires, provides) = object_dependencies(value, a_object)
+        scheduler.submit((value, a_object, label), requires, provides)
+
+    scheduler.start()
+    try:
+        for (a_map, file_to_process) in FILE_MAP:
+            if a_map in TEMPLATE_MAPS and os.path.exists(script_dir + file_to_process):
+                value, a_map_objects = read_object_file(script_dir + file_to_process)
+                for a_object in a_map_objects:
+                    emit(value, a_object)
+
+        (file_content, lines_in_a_file) = read_config(parsed_args.alteon_config_file)
+        conversion = convert_config(file_content, lines_in_a_file, parsed_args.duplicate,
+                                    max(1, parsed_args.jobs), emit=emit)
+    finally:
+        try:
+            scheduler.join()
+        finally:
+            result_log.close()
+
+    print ("### Pipeline finished: {} VIPs, {} SGs and {} RSs converted. "
+           "Upload: {} OK, {} FAILED. Results stored in {} ###").format(
+           len(conversion['vip_map']['virtual_server_list']),
+           len(conversion['service_group_map']['service_group_list']),
+           len(conversion['real_server_map']['server_list']),
+           result_log.successes, result_log.failures, result_log_path)
+    print
+
+    thunder.endSessions()                           # Close (or cache) Sessions
+
+
+
+if __name__ == '__main__':
+    main()
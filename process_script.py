@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 
 from argparse import ArgumentParser
-import os, sys, re, json
-import subprocess, ast
+import os, sys, re, json, time
+import subprocess, ast, multiprocessing, copy, socket, struct, itertools
 from pprint import pprint
+from cStringIO import StringIO
+from collections import OrderedDict
+from object_files import OUTPUT_FORMATS, JSON_BACKENDS, COMPRESSIONS, write_object_file
+from object_files import write_bundle, partition_path, BUNDLE_FILE, PARTITIONS_FILE
 
 MAX_VIPS = 300
 MAX_ALTEON_SGS = 500
@@ -40,25 +44,96 @@ LB_METHOD_MAP = {
                 }
 
 
-def map_protocol_values(lines_in_a_file):
+# Maximum number of normalized names memoized by each NameCache
+NAME_CACHE_SIZE = 4096
+
+# Matches any of the CHAR_MAP keys, to replace all of them in a single pass
+CHAR_PATTERN = re.compile('|'.join(re.escape(a_key) for a_key in 
+                                   sorted(CHAR_MAP, key=len, reverse=True)))
+
+# Matches '_' or '-' before the trailing number of a name. Ex: 'SG_name_13'
+NUMBER_SUFFIX_PATTERN = re.compile('(_|-)(?=(\d+)$)')
+
+
+class NameCache(object):
     '''
-    Modifies all the occurrences of the string 'service xxxx', where xxxx could be any
-    value defined in PROTOCOL_MAP constant dictionary.
+    Bounded memoization of normalized names. When the cache is full the least recently
+    used name is discarded. Hits and misses are counted to report the hit rate in the 
+    PROFILE section.
     '''
-    for index, a_line in enumerate(list(lines_in_a_file)):
-        for a_protocol_name, a_protocol_value in PROTOCOL_MAP.items():
-            if 'service ' + a_protocol_name in a_line:
-                lines_in_a_file[index] = a_line.replace('service ' + a_protocol_name, 
-                                                        'service ' + a_protocol_value)    
+    def __init__(self, maxsize=NAME_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.names = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    def get(self, key, function, *args):
+        '''
+        Returns the memoized name for key, calling function(*args) to compute it if it 
+        was not memoized yet.
+        '''
+        try:
+            name = self.names.pop(key)
+            self.hits += 1
+        except KeyError:
+            name = function(*args)
+            self.misses += 1
+            if len(self.names) >= self.maxsize:
+                self.names.popitem(last=False)
+        self.names[key] = name
+        return name
+    def hit_rate(self):
+        if self.hits + self.misses == 0:
+            return 0.0
+        return 100.0 * self.hits / (self.hits + self.misses)
 
+SERVICE_GROUP_NAME_CACHE = NameCache()
+REAL_SERVER_NAME_CACHE = NameCache()
 
-def find_section(lines_in_a_file, type, item_number, parent_number=''):
+
+class PhaseProfiler(object):
     '''
-	Identifies and returns a configuration section to allow parsing of that section 
-	afterwards.
+    Keeps the elapsed time of each processing phase to print it in the PROFILE section.
+    '''
+    def __init__(self):
+        self.phases = []
+        self.last_mark = time.time()
+    def mark(self, phase):
+        '''
+        Closes the current phase, storing its elapsed time with the given phase name.
+        '''
+        now = time.time()
+        self.phases.append((phase, now - self.last_mark))
+        self.last_mark = now
+
+
+# Matches the protocol name in '/service <name>' header lines of Alteon vports, so it 
+# can be replaced by its value in PROTOCOL_MAP
+PROTOCOL_PATTERN = re.compile(r'^(/c/slb/virt \d+/service )(' + 
+                              '|'.join(sorted(PROTOCOL_MAP, key=len, reverse=True)) + 
+                              r')\b', re.MULTILINE)
+
+
+def tokenize_config(file_content):
+    '''
+    Splits the Alteon configuration in lines. The protocol name of the '/service xxxx'
+    header lines, where xxxx could be any value defined in PROTOCOL_MAP constant
+    dictionary, is replaced by its value in a single substitution over the configuration.
+    '''
+    file_content = PROTOCOL_PATTERN.sub(lambda match: match.group(1) + 
+                                        PROTOCOL_MAP[match.group(2)], file_content)
+    
+    return file_content.splitlines()
+
+
+def find_section_ranges(lines_in_a_file, type, item_number, parent_number='', start=0,
+                        end=None):
+    '''
+    Identifies a configuration section and returns it as a list of [start, end) line
+    index ranges within lines_in_a_file, so the section can be referenced without copying
+    it. Only the lines between start and end are searched.
     '''
     capture = False
-    section = ''
+    section_ranges = []
     
     # Define all the possible sections we will want to identify
     element_map = {
@@ -70,33 +145,73 @@ def find_section(lines_in_a_file, type, item_number, parent_number=''):
     
     # String to match in the configuration
     matching_string = "{} {}".format(element_map[type], item_number)
-        
-    for a_line in lines_in_a_file:
+    
+    if end is None:
+        end = len(lines_in_a_file)
+    
+    for index in xrange(start, end):
+        a_line = lines_in_a_file[index]
         if not capture:
             if matching_string == a_line or (matching_string + '/') in a_line:
-            	capture = True
-            	section += a_line + '\n'
+                capture = True
+                range_start = index
         else:
             if matching_string == a_line or (matching_string + '/') in a_line:
-                section += a_line + '\n'
+                continue
             elif ('/c/' in a_line) and (element_map[type] not in a_line):
                 capture = False
             elif element_map[type] not in a_line:
-                section += a_line + '\n'
+                continue
             elif a_line == '':
                 continue
             else:
                 capture = False
+            
+            if not capture:
+                section_ranges.append((range_start, index))
     
-    # Remove blank lines within the section
-    section_lines = section.splitlines()
-    while '' in section_lines:
-    	section_lines.remove('')
+    if capture:
+        section_ranges.append((range_start, end))
+    
+    return section_ranges
+
+
+def section_from_ranges(lines_in_a_file, section_ranges):
+    '''
+    Returns the configuration section referenced by a list of line index ranges, without
+    the blank lines within the section.
+    '''
+    section_lines = [a_line for (start, end) in section_ranges 
+                     for a_line in lines_in_a_file[start:end] if a_line != '']
     
-    # Return the same original section without the blank lines
     return '\n'.join(section_lines) + '\n'
 
 
+def find_section(lines_in_a_file, type, item_number, parent_number=''):
+    '''
+	Identifies and returns a configuration section to allow parsing of that section 
+	afterwards.
+    '''
+    return section_from_ranges(lines_in_a_file, find_section_ranges(lines_in_a_file, type,
+                               item_number, parent_number))
+
+
+def find_vport_section(lines_in_a_file, a_vip, vport_number):
+    '''
+    Returns the configuration subsection of a vport of an A10 VIP. The vport is searched
+    only within the line ranges of each Alteon VIP merged into the A10 VIP, using the 
+    Alteon vip_number of each one, so no renumbering of the VIP section is required.
+    '''
+    vport_ranges = []
+    for (alteon_vip_number, section_ranges) in a_vip['section']:
+        for (start, end) in section_ranges:
+            vport_ranges.extend(find_section_ranges(lines_in_a_file, 'vport', 
+                                                    vport_number, 
+                                                    str(alteon_vip_number), start, end))
+    
+    return section_from_ranges(lines_in_a_file, vport_ranges)
+
+
 def find_all_occurrences(lines_in_a_file, type):
     '''
     Finds and returns a list of all the existing elements of a particular type in the 
@@ -110,14 +225,14 @@ def find_all_occurrences(lines_in_a_file, type):
                   }
 
     element_list = []
+    found_elements = set()
+    re_pattern = re.compile(element_map[type] + ' (\d+)')
     for a_line in lines_in_a_file:
-		re_pattern = re.search(element_map[type] + ' (\d+)', a_line)
-		try:
-		    #  Try to add the element number in the element_list if there was a match
-			if not str(re_pattern.group(1)) in element_list:
-				element_list.append(re_pattern.group(1))
-		except AttributeError:
-			continue
+        match = re_pattern.search(a_line)
+        #  Add the element number in the element_list if there was a match
+        if match and match.group(1) not in found_elements:
+            found_elements.add(match.group(1))
+            element_list.append(match.group(1))
 
     return element_list
 
@@ -181,10 +296,23 @@ def find_vip_number(dict_list, vip_address):
             return index
 
 
-def process_vip_info(vip_map_list, vip_address, vip_number, section):
+def normalize_vip_name(dname):
+    '''
+    Converts an Alteon VIP 'dname' into a one-word A10 VIP name.
+    '''
+    # Split the VIP name in words
+    dname_in_list = dname.split(' ')
+    # Convert to uppercase the first letter of each word of the VIP name
+    parsed_dname = [substring[0].upper() + substring[1:] 
+                    for substring in dname_in_list]
+    # Get a one-word VIP name by joining all the words with '_'
+    return '_'.join(parsed_dname)
+
+
+def process_vip_info(vip_map_list, vip_address, vip_number, section, section_ranges):
     '''
     Creates the A10 VIP list adding the vports to A10 VIPs, preserving the relationship
-    between Alteon vip_numbers and A10 VIPs and also the section information.
+    between Alteon vip_numbers and A10 VIPs and also the references to the section lines.
     ''' 
     # Search if the VIP is already in the vip dictionary using a auxiliar list
     aux_list = list(vip_map_list)
@@ -203,7 +331,7 @@ def process_vip_info(vip_map_list, vip_address, vip_number, section):
                         'address'         : vip_address,
                         'vport_list'      : [],
                         'alteon_vip_list' : [vip_number],
-                        'section'         : section,
+                        'section'         : [(vip_number, section_ranges)],
                         'conn_limit'      : 8000000,
     	                'conn_limit_log'  : 1,
                        }
@@ -211,20 +339,14 @@ def process_vip_info(vip_map_list, vip_address, vip_number, section):
         # Alteon vip_numbers and the A10 vips, because many alteon vip_numbers will be 
         # the same VIP in A10, due to 8 vports limitation per VIP in Alteon
         
-        # 'section' is an auxiliar key containing the configuration lines of the VIP in 
-        # Alteon configuration file
+        # 'section' is an auxiliar key containing references to the configuration lines
+        # of the VIP in Alteon configuration file, as pairs (vip_number, line ranges)
         
             
         if 'dname' in section:
-        	# Get VIP name from Alteon configuration
-        	dname = process_config_field(section, 'dname')
-        	# Split the VIP name in words
-        	dname_in_list = dname.split(' ')
-        	# Convert to uppercase the first letter of each word of the VIP name
-        	parsed_dname = [substring[0].upper() + substring[1:] 
-            	            for substring in dname_in_list]
-        	# Get a one-word VIP name by joining all the words with '_'
-        	new_vip_dict['name'] =  '_'.join(parsed_dname)
+            # Get VIP name from Alteon configuration
+            new_vip_dict['name'] = normalize_vip_name(process_config_field(section, 
+                                                                           'dname'))
         else:
             new_vip_dict['name'] = '_' + str(vip_address) + '_'
             
@@ -242,10 +364,10 @@ def process_vip_info(vip_map_list, vip_address, vip_number, section):
         
         # Locate the A10 VIP index in vip_map_list
         index = find_vip_number(vip_map_list, vip_address)
-        # Add the Alteon vip_number to and the configuration section to the A10 VIP 
-        # information 
+        # Add the Alteon vip_number and the references to its configuration section to 
+        # the A10 VIP information 
         vip_map_list[index]['alteon_vip_list'].append(vip_number) 	
-        vip_map_list[index]['section'] += section
+        vip_map_list[index]['section'].append((vip_number, section_ranges))
             
     # Regardless of being a new VIP or a new one, vports must be added to it. This is done
     # by locating the the A10 VIP index in vip_map_list and adding the vports.
@@ -253,22 +375,103 @@ def process_vip_info(vip_map_list, vip_address, vip_number, section):
     add_vport_occurrences(section, str(vip_number), vip_map_list[index]['vport_list'])   
 
 
-def renumber_vip_section(vip_map_list):
+# Persistence modes of the Alteon vports ('pbind <mode>'), in the order they are checked
+PBIND_MODES = ['cookie insert', 'cookie passive JSESSIONID', 'clientip', 'sslid']
+
+# Rules classifying the Alteon vports by (dbind enabled, pbind mode, port 443, port 80)
+# into (protocol, persistence template key, persistence template name) of the A10 vport.
+# None matches any value and '' the vports without any of PBIND_MODES. The first rule
+# matching a vport applies. Protocol 11 denotes a VIP type = http, 2 denotes type = tcp
+VPORT_RULES = [
+    ((False, None, None, None), (2, None, None)),
+    ((True, 'cookie insert', True, None), (2, None, None)),
+    ((True, 'cookie insert', False, None),
+     (11, 'cookie_persistence_template', 'Persist_Cookie')),
+    ((True, 'cookie passive JSESSIONID', True, None), (2, None, None)),
+    ((True, 'cookie passive JSESSIONID', False, None),
+     (11, 'cookie_persistence_template', 'Persist_Cookie_JSESSIONID')),
+    ((True, 'clientip', True, None),
+     (2, 'source_ip_persistence_template', 'Persist_Srcip')),
+    ((True, 'clientip', False, True),
+     (11, 'source_ip_persistence_template', 'Persist_Srcip')),
+    ((True, 'clientip', False, False),
+     (2, 'source_ip_persistence_template', 'Persist_Srcip')),
+    ((True, 'sslid', None, None),
+     (2, 'ssl_session_id_persistence_template', 'Persist_SSLID')),
+    ((True, '', None, True), (11, None, None)),
+    ((True, '', None, False), (2, None, None)),
+]
+
+# Health monitors of HM_MAP requiring 'content' configured in the Alteon group. Groups
+# without it get the '(default)' health monitor. Also bypass ldap...
+HM_CONTENT_TYPES = ['http', 'smtp', 'imap', 'pop3', 'ldap']
+
+
+def compile_rules(rules, dimensions):
     '''
-    Renumbers A10's VIP 'section' key content so it will only have 1 vip_number per 
-    vip_address in each section (Alteon has many vip_numbers with the same vip_address, 
-    because they can't have more than 8 vports per vip_adddress with the same vip_number, 
-    so they do it with a new vip_number). The relationship between the Alteon VIP numbers
-    and this new assigned number is kept in 'alteon_vip_list' key within each A10 VIP
+    Expands a list of (pattern, result) rules into a dictionary with the result of every
+    possible key, being dimensions the list of possible values of each item of the keys.
+    A pattern matches a key when its items are equal or None. The first rule matching a
+    key gives its result. Raises ValueError if a key doesn't match any rule.
     '''
-    for index, a_vip in enumerate(vip_map_list):
-        for alteon_vip_number in a_vip['alteon_vip_list']:
-            a_vip['section'] = a_vip['section'].replace('/c/slb/virt ' 
-                                                         + str(alteon_vip_number),
-    	                                                '/c/slb/virt ' + str(index))
+    classifier = {}
+    for a_key in itertools.product(*dimensions):
+        for (pattern, result) in rules:
+            if all(a_pattern is None or a_pattern == a_value 
+                   for (a_pattern, a_value) in zip(pattern, a_key)):
+                classifier[a_key] = result
+                break
+        else:
+            raise ValueError("No rule matches {}".format(a_key))
+    
+    return classifier
 
-            
-def process_vport_info(vport, subsection, original_alteon_sgs_list):
+
+# Classifiers compiled once, looked up by vport_record and service_group_record keys
+VPORT_CLASSIFIER = compile_rules(VPORT_RULES, [[True, False], [''] + PBIND_MODES, 
+                                               [True, False], [True, False]])
+
+HEALTH_MONITOR_CLASSIFIER = compile_rules(
+    [((a_type, False), HM_MAP['(default)']) for a_type in HM_CONTENT_TYPES] + 
+    [((a_type, None), a_health_monitor) for (a_type, a_health_monitor) in HM_MAP.items()],
+    [HM_MAP.keys(), [True, False]])
+
+
+def vport_record(subsection):
+    '''
+    Parses the fields of an Alteon vport subsection classifying it, and returns them as
+    the VPORT_CLASSIFIER key (dbind enabled, pbind mode, port 443, port 80).
+    '''
+    pbind = ''
+    for a_mode in PBIND_MODES:
+        if 'pbind ' + a_mode in subsection:
+            pbind = a_mode
+            break
+    
+    return ('dbind ena' in subsection, pbind, ' 443\n' in subsection, 
+            ' 80\n' in subsection)
+
+
+def service_group_record(section_string):
+    '''
+    Parses the fields of an Alteon group section classifying it, and returns them as
+    (health, content configured, metric), with '(default)' health and 'least-connection'
+    metric when they are not configured.
+    '''
+    if 'health' in section_string:
+        hm_type = process_config_field(section_string, 'health')
+    else:
+        hm_type = '(default)'
+    
+    if 'metric' in section_string:
+        lb_method_type = process_config_field(section_string, 'metric')
+    else:
+        lb_method_type = 'least-connection'
+    
+    return (hm_type, 'content' in section_string, lb_method_type)
+
+
+def process_vport_info(vport, subsection, applied_alteon_sgs):
     '''
     Process the vport information from a given particular vport and adds it to the vip_map
     dictionary. Service-group data will be added afterwards in the script, NOT HERE.
@@ -281,101 +484,42 @@ def process_vport_info(vport, subsection, original_alteon_sgs_list):
                                  'connection_limit_log' : 1
                                 }
     
-    # Process vport type and add persistence templates
-    if 'dbind ena' in subsection:
-        # 11 denotes a VIP type = http, 2 denotes VIP type = tcp
-        if 'pbind cookie insert' in subsection:
-            if ' 443\n' in subsection:
-    	    	vport['protocol'] = 2
-    	    else:
-    	        vport['protocol'] = 11
-    	        vport['cookie_persistence_template'] = 'Persist_Cookie'
-        elif 'pbind cookie passive JSESSIONID' in subsection:
-            if ' 443\n' in subsection:
-    	    	vport['protocol'] = 2
-    	    else:
-    	        vport['protocol'] = 11
-    	        vport['cookie_persistence_template'] = 'Persist_Cookie_JSESSIONID'
-    	elif 'pbind clientip' in subsection:
-    	    if ' 443\n' in subsection:
-    	    	vport['protocol'] = 2
-    	    elif ' 80\n' in subsection:
-    	    	vport['protocol'] = 11
-    	    else:
-    	        vport['protocol'] = 2
-    	    vport['source_ip_persistence_template'] = 'Persist_Srcip'
-    	elif 'pbind sslid' in subsection:
-    	    vport['protocol'] = 2
-    	    vport['ssl_session_id_persistence_template'] = 'Persist_SSLID'
-    	else:
-    	    if ' 80\n' in subsection:
-    	    	vport['protocol'] = 11
-    	    else:
-    	        vport['protocol'] = 2
-    else:
-    	# 2 denotes a VIP type = tcp
-    	vport['protocol'] = 2
-    	
-    	# To solve persistence configured in ports with no dbind ena
-    	#if 'cookie_persistence_template' in vport:
-    	#		vport.pop('cookie_persistence_template', None)
+    # Process vport type and add persistence templates, see VPORT_RULES
+    (protocol, template_key, template) = VPORT_CLASSIFIER[vport_record(subsection)]
+    vport['protocol'] = protocol
+    if template_key is not None:
+        vport[template_key] = template
     
     # Store Alteon configuration 'group' to get the service-group information later on.
     if 'group' in subsection:
         vport['alteon_sg_number'] = process_config_field(subsection, 'group') 
         
         # Logic to control unapplied groups in alteon config at the end of the script
-        # Groups found in a VIP within the vport section are removed from the list that
-        # stored all the groups earlier in the script.
-        if vport['alteon_sg_number'] in original_alteon_sgs_list:
-        	original_alteon_sgs_list.remove(vport['alteon_sg_number'])
+        # Groups found in a VIP within the vport section are added to the set of applied
+        # groups, compared with all the groups found earlier in the script.
+        applied_alteon_sgs.add(vport['alteon_sg_number'])
 
-def process_service_group_name(vport, section_string, vip_name):
+def normalize_service_group_name(service_group_name, vport_number):
     '''
-    Generates a service-group name based on Alteon configuration group name if it exists
-    Otherwise it uses the vip name to generate the name. The new SG name will end with
-    ':port_number' where port_number corresponds to the vport_number where it is applied.
-    Conversions applied to get the name:
-    	- replace chars in CHAR_MAP keys with their corresponding values
-    	- uppercase each word in the name
-    	- ensure ':vport_number' will be at the end of the name
-    	- join different words with '_' char instead of backspace
-    This function requires to check no duplicate names exist and port exists in 
-    Alteon configuration.
+    Converts a raw Alteon group name (or VIP name) into the A10 service-group name for
+    the given vport_number. See process_service_group_name for the conversions applied.
     '''
-	# Convert backspace to '_' and upper after '_' before saving the service_group name
-    if 'name' in section_string:
-        service_group_name = process_config_field(section_string, 'name')
-        service_group_name = service_group_name.replace('"','')
-        # Replace '_' temporarily for further processing	
-    else:
-        service_group_name = vip_name
-    
-    #print "original sg_name = {}, vport_number = {}".format([service_group_name], 
-    #                                                        str(vport['port']))
-    
     # Substitute ilegal chars and remove ',' from service_group_name
-    for a_substring_key, a_substring_value in CHAR_MAP.items():
-    	if a_substring_key in service_group_name:
-    		service_group_name = service_group_name.replace(a_substring_key, 
-    		                                                a_substring_value)
+    service_group_name = CHAR_PATTERN.sub(lambda match: CHAR_MAP[match.group(0)], 
+                                          service_group_name)
     
     # Substitute names ending with '_number' or '-number'.Ex: 'SG_name_13' or 'SG_name-13'
     # would be replaced by 'SG_name 13'
-    pattern_match = re.search("(_|-)(?=(\d+)$)", service_group_name)
-    if pattern_match:
-    	service_group_name = re.sub('(_|-)(?=(\d+)$)', ' ', service_group_name)	
+    service_group_name = NUMBER_SUFFIX_PATTERN.sub(' ', service_group_name)
 
     # Remove vport in name temporarily
-    if str(vport['port']) in service_group_name:
-    	service_group_name = service_group_name.replace(str(vport['port']), '')
-    	# Remove extra backspaces
-    	service_group_name = ' '.join(service_group_name.split())
-    	# Remove last char before vport_number (could be ' ', '.', '_' or '-')
-    	if service_group_name[-1] == ' ' or service_group_name[-1] == '.' or \
-    	   service_group_name[-1] == '_' or service_group_name[-1] == '-':
-        	delimiter_char = service_group_name[-1]
-        	service_group_name = service_group_name[:-1]
+    if str(vport_number) in service_group_name:
+        service_group_name = service_group_name.replace(str(vport_number), '')
+        # Remove extra backspaces
+        service_group_name = ' '.join(service_group_name.split())
+        # Remove last char before vport_number (could be ' ', '.', '_' or '-')
+        if service_group_name[-1] in [' ', '.', '_', '-']:
+            service_group_name = service_group_name[:-1]
     
     # Convert to uppercase each word in the service-group name	
     parsed_name = [substring[0].upper() + substring[1:] 
@@ -384,13 +528,35 @@ def process_service_group_name(vport, section_string, vip_name):
     # Add ':vport_number' as a trailing and join words with '_' if more than 1 one word in
     # service_group_name
     if len(parsed_name) > 1:
-    	service_group_name = '_'.join(parsed_name) + ':' + str(vport['port'])
+        service_group_name = '_'.join(parsed_name) + ':' + str(vport_number)
     else:
-    	service_group_name += ':' + str(vport['port'])
-    
-    #print "formatted sg = {}".format([service_group_name])
+        service_group_name += ':' + str(vport_number)
     
     return service_group_name
+
+
+def process_service_group_name(vport, section_string, vip_name):
+    '''
+    Generates a service-group name based on Alteon configuration group name if it exists
+    Otherwise it uses the vip name to generate the name. The new SG name will end with
+    ':port_number' where port_number corresponds to the vport_number where it is applied.
+    Conversions applied to get the name:
+    	- replace chars in CHAR_MAP keys with their corresponding values
+    	- uppercase each word in the name
+    	- ensure ':vport_number' will be at the end of the name
+    	- join different words with '_' char instead of backspace
+    This function requires to check no duplicate names exist and port exists in 
+    Alteon configuration. Names are memoized by (raw name, vport_number) because Alteon
+    groups are heavily reused.
+    '''
+    if 'name' in section_string:
+        service_group_name = process_config_field(section_string, 'name')
+    else:
+        service_group_name = vip_name
+    
+    return SERVICE_GROUP_NAME_CACHE.get((service_group_name, vport['port']),
+                                        normalize_service_group_name, 
+                                        service_group_name, vport['port'])
     
 
 def process_service_group_info(vport, service_group_list, section_string, vip_name, 
@@ -443,32 +609,33 @@ def process_service_group_info(vport, service_group_list, section_string, vip_na
 
         new_service_group_dict['alteon_real_server_list'] = real_server_list
     	
-    	# Assign the health required health check
-    	if 'health' in section_string:
-    		hm_type = process_config_field(section_string, 'health')
-    	else:
-    		hm_type = '(default)'
-    	
-    	# Some hm types require 'content' configured. Also bypass ldap...
-    	if hm_type in ['http', 'smtp', 'imap', 'pop3'] or hm_type == 'ldap':
-    		if 'content' not in section_string:
-    			hm_type = '(default)'
-    	
-    	
-    	new_service_group_dict['health_monitor'] = HM_MAP[hm_type]
-    	
-    	# Assign the correct load balancing method
-    	if 'metric' in section_string:
-    		lb_method_type = process_config_field(section_string, 'metric')
-    	else:
-    		lb_method_type = 'least-connection'
-    	
-    	new_service_group_dict['lb_method'] = LB_METHOD_MAP[lb_method_type]
+        # Assign the required health check (some hm types require 'content' configured,
+        # see HM_CONTENT_TYPES) and the correct load balancing method
+        (hm_type, content, lb_method_type) = service_group_record(section_string)
+        new_service_group_dict['health_monitor'] = HEALTH_MONITOR_CLASSIFIER[(hm_type, 
+                                                                              content)]
+        new_service_group_dict['lb_method'] = LB_METHOD_MAP[lb_method_type]
     	
     	#Add the new service_group to the master service_group dictionary
     	service_group_list.append(new_service_group_dict)
     	
 
+def normalize_real_server_name(real_server_name):
+    '''
+    Converts a raw Alteon real name (or service-group name without ':vport_number') into
+    the A10 real-server name. See process_real_server_name for the conversions applied.
+    '''
+    # Convert to uppercase each word in the real_server name
+    parsed_name = [substring[0].upper() + substring[1:] 
+                   for substring in real_server_name.split(' ')]
+    
+    # Join words with '_' if more than 1 one word in real_server_name
+    if len(parsed_name) > 1:
+        real_server_name = '_'.join(parsed_name)
+
+    return real_server_name
+
+
 def process_real_server_name(service_group, section_string):
     '''
     Generates a real-server name based on Alteon configuration real name if it 
@@ -477,24 +644,21 @@ def process_real_server_name(service_group, section_string):
     Conversions applied to get the name:
     	- uppercase each word in the name
     	- join different words with '_' char instead of backspace
+    Names are memoized by (raw name, service_group name), only one of them being used.
     '''
     if 'name' in section_string:
-    	real_server_name = process_config_field(section_string, 'name')
+        real_server_name = process_config_field(section_string, 'name')
+        cache_key = (real_server_name, None)
     else:
-    	real_server_name = service_group['name'].rsplit(':')[0]
-    
-    # Convert to uppercase each word in the real_server name
-    parsed_name = [substring[0].upper() + substring[1:] 
-                   for substring in real_server_name.split(' ')]
+        real_server_name = service_group['name'].rsplit(':')[0]
+        cache_key = (None, service_group['name'])
     
-    # Join words with '_' if more than 1 one word in real_server_name
-    if len(parsed_name) > 1:
-    	real_server_name = '_'.join(parsed_name)
+    return REAL_SERVER_NAME_CACHE.get(cache_key, normalize_real_server_name, 
+                                      real_server_name)
 
-    return real_server_name
     	
 def process_real_server_info(service_group, alteon_real_server_in_sg, 
-                             real_server_list, section_string, original_alteon_rss_list,
+                             real_server_list, section_string, applied_alteon_rss,
                              duplicate):
     '''
     Generates a real-server name, applies and checks if the new real-server name is
@@ -594,8 +758,7 @@ def process_real_server_info(service_group, alteon_real_server_in_sg,
     	real_server_list.append(new_real_server_dict)
     	
     	# Logic to control unapplied servers in alteon config at the end of the script
-    	if alteon_real_server_in_sg[0] in original_alteon_rss_list:
-    		original_alteon_rss_list.remove(alteon_real_server_in_sg[0])
+    	applied_alteon_rss.add(alteon_real_server_in_sg[0])
     
     elif real_server_exists == [True, True]:
     	# Add port if not exists within the real-server
@@ -619,7 +782,7 @@ def process_real_server_info(service_group, alteon_real_server_in_sg,
     	    #       real_server_name, new_real_port_dict['port_num'])
 
 
-def reuse_computation(lines_in_a_file):
+def reuse_computation(lines_in_a_file, first_sg=0, last_sg=MAX_ALTEON_SGS):
      '''
      Calculates service-group reutilization in Alteon configuration and how many extra
      service-groups will be created due to reutilization in different ports (service-group
@@ -629,6 +792,8 @@ def reuse_computation(lines_in_a_file):
      script is doing exactly what it should do. Specifically, it checks that the number
      of service-groups and real-servers that the script has in it's master structures
      matches what theoretically should be.
+     Only Alteon groups from first_sg to last_sg (not included) are computed, so the
+     computation can be split in several ranges and merged with merge_reuse_dicts.
      '''
      reuse_dict = {
                   'sg_reuse_counter'            : 0,
@@ -637,7 +802,7 @@ def reuse_computation(lines_in_a_file):
                   'master_reuse_different_port' : [],
                   }
     
-     for a_alteon_sg in range(MAX_ALTEON_SGS):
+     for a_alteon_sg in range(first_sg, last_sg):
         string_to_process = 'group '+ str(a_alteon_sg)
         reuse_list_pointers = []
         for line_index, a_line in enumerate(lines_in_a_file):
@@ -676,54 +841,354 @@ def reuse_computation(lines_in_a_file):
      return reuse_dict
 
 
-def main():
+def merge_reuse_dicts(reuse_dict_list):
     '''
-    Alteon migration tool v1.0 to A10 2.7.[1-2] ACOS software (aXapi 2.1). This script
-    migrates persistence templates, real servers, service-groups and virtual-servers.
-    IMPORTANT: to avoid issues, it is required to ensure that no duplicate 
-    names exist in Alteon configuration prior running the script. This entails:
-    	- 'dname' duplicated values within Alteon '/c/slb/virt' elements. This must be
-    	  checked manually.
-    	- 'name' duplicated values within Alteon '/c/slb/group' elements. This must be
-    	  checked manually but there's a optional print statement in function called
-    	  'process_service_group_info' which can be enabled with '-d' argument.
-    	- 'name' duplicated values within Alteon '/c/slb/real' elements. This must be
-    	  checked manually but there's optional print statement in function called
-    	  'process_real_server_info' which can be enabled with '-d' argument.
+    Merges the reuse dictionaries computed for consecutive ranges of Alteon groups, given
+    in the same order of the ranges, into a single reuse dictionary.
     '''
+    reuse_dict = {
+                  'sg_reuse_counter'            : 0,
+                  'sg_extra_counter'            : 0,
+                  'master_reuse_list'           : [],
+                  'master_reuse_different_port' : [],
+                 }
     
-    # Argument parsing, requires alteon config file full path, and allows verbosity
-    parser = ArgumentParser(description=("Script to process alteon configuration file and"
-                            " store the information in json objects formatted like the "
-                            "A10 is expecting"), prog='python process_script.py')
-    parser.add_argument('alteon_config_file', action='store', help=('Alteon configuration'
-                        ' file to process'))
-    parser.add_argument('-d', '--duplicate', action='store_true', help=('help to detect '
-                        'duplicate service-groups names and duplicate real-server names.'
-                        " It's advised to use this option at the beginning to fix names.")
-                        , dest= 'duplicate')
-    parser.add_argument('-v', '--verbose', action='store_true', help=('increase output '
-                        'verbosity (will show VIPs, SERVICE-GROUPs and REAL-SERVERs '
-                        'stored in master dictionaries)'), dest= 'verbose')                    
-    parsed_args = parser.parse_args()
+    for a_reuse_dict in reuse_dict_list:
+        reuse_dict['sg_reuse_counter'] += a_reuse_dict['sg_reuse_counter']
+        reuse_dict['sg_extra_counter'] += a_reuse_dict['sg_extra_counter']
+        reuse_dict['master_reuse_list'].extend(a_reuse_dict['master_reuse_list'])
+        reuse_dict['master_reuse_different_port'].extend(
+                                            a_reuse_dict['master_reuse_different_port'])
+    
+    return reuse_dict
 
-    full_path_to_file = parsed_args.alteon_config_file
-    # This enables duplicate element names printing
-    duplicate = parsed_args.duplicate
-    # verbose option will show the process virtual-server, service-group and real-server
-    # configuration in dictionary structures ready to convert to json.
-    verbose = parsed_args.verbose
+
+def find_cached_section(section_cache, lines_in_a_file, type, item_number):
+    '''
+    Returns a service-group or real-server configuration section, looking for it only
+    the first time it's required (Alteon groups and reals are heavily reused). In 
+    parallel mode the cache is filled in advance by the worker processes.
+    '''
+    if item_number not in section_cache:
+        section_cache[item_number] = find_section(lines_in_a_file, type, item_number)
+    return section_cache[item_number]
+
+
+# Configuration lines of the worker processes in parallel mode
+worker_lines_in_a_file = []
+
+def init_worker(lines_in_a_file):
+    '''
+    Initializes each worker process of the parallel mode with the configuration lines.
+    '''
+    global worker_lines_in_a_file
+    worker_lines_in_a_file = lines_in_a_file
+
+
+def lookup_vip_shard_sections(vip_shard):
+    '''
+    Worker of the parallel mode. Looks up the configuration sections required to process
+    a shard of A10 VIPs, given as (vip_address, vip section references, vport numbers).
+    Returns a partial map of vport subsections, keyed by (vip_address, vport_number), and
+    partial maps of service-group and real-server sections, keyed by Alteon number.
+    '''
+    lines_in_a_file = worker_lines_in_a_file
+    vport_sections = {}
+    service_group_sections = {}
+    real_server_sections = {}
+    
+    for (vip_address, vip_section, vport_numbers) in vip_shard:
+        for a_vport_number in vport_numbers:
+            subsection = find_vport_section(lines_in_a_file, {'section' : vip_section}, 
+                                            a_vport_number)
+            vport_sections[(vip_address, a_vport_number)] = subsection
+            
+            if 'group' not in subsection:
+                continue
+            section = find_cached_section(service_group_sections, lines_in_a_file, 
+                                          'service_group', 
+                                          process_config_field(subsection, 'group'))
+            for match in re.finditer('add (\d+)', section):
+                find_cached_section(real_server_sections, lines_in_a_file, 
+                                    'real_server', match.group(1))
+    
+    return vport_sections, service_group_sections, real_server_sections
+
+
+def compute_reuse_range(sg_range):
+    '''
+    Worker of the parallel mode. Calculates the service-group reutilization of a range
+    of Alteon groups.
+    '''
+    return reuse_computation(worker_lines_in_a_file, sg_range[0], sg_range[1])
+
+
+def lookup_sections_in_parallel(lines_in_a_file, vip_map_list, jobs):
+    '''
+    Shards the A10 VIPs across 'jobs' worker processes that look up all the vport, 
+    service-group and real-server sections the VPORT, SERVICE-GROUP and REAL-SERVER level
+    processing will require, and computes the service-group reuse in parallel too.
+    Partial maps are merged in VIP order, so the processing levels can be run afterwards
+    exactly in the same order (and with the same duplicate rules) as in a serial run.
+    Returns (vport_sections, service_group_sections, real_server_sections, reuse_dict).
+    '''
+    vip_records = [(a_vip['address'], a_vip['section'], 
+                    [str(a_vport['port']) for a_vport in a_vip['vport_list']])
+                   for a_vip in vip_map_list]
+    # Several shards per worker to balance VIPs with different number of vports
+    shard_size = max(1, -(-len(vip_records) // (jobs * 4)))
+    vip_shards = [vip_records[index:index + shard_size] 
+                  for index in range(0, len(vip_records), shard_size)]
+    range_size = -(-MAX_ALTEON_SGS // jobs)
+    sg_ranges = [(first_sg, min(first_sg + range_size, MAX_ALTEON_SGS)) 
+                 for first_sg in range(0, MAX_ALTEON_SGS, range_size)]
+    
+    pool = multiprocessing.Pool(jobs, init_worker, (lines_in_a_file,))
+    try:
+        vip_results = pool.map_async(lookup_vip_shard_sections, vip_shards)
+        reuse_results = pool.map_async(compute_reuse_range, sg_ranges)
+        # Timeout given to get() so the main process can be interrupted
+        vip_results = vip_results.get(sys.maxint)
+        reuse_dict = merge_reuse_dicts(reuse_results.get(sys.maxint))
+    finally:
+        pool.terminate()
+        pool.join()
+    
+    vport_sections = {}
+    service_group_sections = {}
+    real_server_sections = {}
+    for (a_vport_map, a_service_group_map, a_real_server_map) in vip_results:
+        vport_sections.update(a_vport_map)
+        service_group_sections.update(a_service_group_map)
+        real_server_sections.update(a_real_server_map)
+    
+    return vport_sections, service_group_sections, real_server_sections, reuse_dict
+
+
+# Matches the header line of Alteon VIPs, groups and reals, Ex: '/c/slb/real 12'
+ELEMENT_HEADER_PATTERN = re.compile(r'^/c/slb/(virt|group|real) (\d+)$')
+
+ELEMENT_TYPE_MAP = {
+                    'virt'  : 'vip',
+                    'group' : 'service_group',
+                    'real'  : 'real_server',
+                   }
+
+
+def build_config_index(lines_in_a_file):
+    '''
+    Indexes the Alteon VIPs, groups and reals of the configuration in a single pass.
+    Returns a dictionary by element type ('vip', 'service_group' and 'real_server') of
+    ordered dictionaries by Alteon number. Each element keeps the 'line' number of its
+    header and its 'fields' as {field : (value, line number)}, being fields the lines
+    right below the header (Ex: 'name', 'rip', 'vip', 'dname'). Line numbers start at 1.
+    '''
+    config_index = dict((a_type, OrderedDict()) for a_type in ELEMENT_TYPE_MAP.values())
+    fields = None
+    
+    for line_index, a_line in enumerate(lines_in_a_file):
+        if a_line.startswith('/'):
+            fields = None
+            match = ELEMENT_HEADER_PATTERN.match(a_line)
+            if match:
+                elements = config_index[ELEMENT_TYPE_MAP[match.group(1)]]
+                if match.group(2) not in elements:
+                    elements[match.group(2)] = {'line' : line_index + 1, 'fields' : {}}
+                fields = elements[match.group(2)]['fields']
+        elif fields is not None:
+            field_and_value = a_line.strip().split(' ', 1)
+            if field_and_value[0] and field_and_value[0] not in fields:
+                value = field_and_value[1].replace('"', '') if len(field_and_value) > 1 \
+                        else ''
+                fields[field_and_value[0]] = (value, line_index + 1)
+    
+    return config_index
+
+
+def find_duplicates(elements, key_function):
+    '''
+    Groups the Alteon elements of an index by the key returned by key_function(fields),
+    ignoring elements without key. Returns a list of (key, [(number, element), ...]) with
+    the keys shared by more than one element, in configuration order.
+    '''
+    groups = OrderedDict()
+    for (number, an_element) in elements.items():
+        key = key_function(an_element['fields'])
+        if key is not None:
+            groups.setdefault(key, []).append((number, an_element))
     
+    return [(key, group) for (key, group) in groups.items() if len(group) > 1]
+
+
+def lint_config(lines_in_a_file):
+    '''
+    Finds the duplicate names and addresses in the Alteon configuration that the
+    conversion requires to fix (or fixes automatically), using a single pass index:
+    	- 'dname' of VIPs with different 'vip' address getting the same A10 VIP name
+    	- 'name' of groups
+    	- 'name' of reals with different 'rip' (must be fixed manually)
+    	- 'rip' of reals with different 'name' (renamed automatically by the script)
+    Returns a list of (title, [(key, [description of each element, ...]), ...]).
+    '''
+    config_index = build_config_index(lines_in_a_file)
+    
+    def field(fields, name):
+        return fields[name][0] if name in fields else None
+    
+    def describe(element_type, number, an_element, *names):
+        description = "{} {} (line {}".format(element_type, number, an_element['line'])
+        for a_name in names:
+            if a_name in an_element['fields']:
+                description += ", {} {} line {}".format(a_name, 
+                               an_element['fields'][a_name][0], 
+                               an_element['fields'][a_name][1])
+        return description + ')'
+    
+    report = []
+    
+    duplicates = [(key, group) for (key, group) in find_duplicates(
+                  config_index['vip'], lambda fields: normalize_vip_name(field(fields,
+                  'dname')) if field(fields, 'dname') else None)
+                  if len(set(field(an_element['fields'], 'vip') 
+                             for (number, an_element) in group)) > 1]
+    report.append(('DUPLICATE VIP NAMES (dname)', [(key, [describe('virt', number, 
+                   an_element, 'dname', 'vip') for (number, an_element) in group]) 
+                   for (key, group) in duplicates]))
+    
+    duplicates = find_duplicates(config_index['service_group'], 
+                                 lambda fields: field(fields, 'name'))
+    report.append(('DUPLICATE SERVICE-GROUP NAMES (name)', [(key, [describe('group', 
+                   number, an_element, 'name') for (number, an_element) in group]) 
+                   for (key, group) in duplicates]))
+    
+    duplicates = [(key, group) for (key, group) in find_duplicates(
+                  config_index['real_server'], lambda fields: field(fields, 'name'))
+                  if len(set(field(an_element['fields'], 'rip') 
+                             for (number, an_element) in group)) > 1]
+    report.append(('DUPLICATE REAL-SERVER NAMES WITH DIFFERENT ADDRESS (name)', 
+                   [(key, [describe('real', number, an_element, 'name', 'rip') 
+                    for (number, an_element) in group]) for (key, group) in duplicates]))
+    
+    duplicates = [(key, group) for (key, group) in find_duplicates(
+                  config_index['real_server'], lambda fields: field(fields, 'rip'))
+                  if len(set(field(an_element['fields'], 'name') 
+                             for (number, an_element) in group)) > 1]
+    report.append(('DUPLICATE REAL-SERVER ADDRESSES WITH DIFFERENT NAME (rip)', 
+                   [(key, [describe('real', number, an_element, 'rip', 'name') 
+                    for (number, an_element) in group]) for (key, group) in duplicates]))
+    
+    return report
+
+
+def summary_report(original_alteon_figures, unapplied_alteon_sgs, unapplied_alteon_rss,
+                   reuse_dict, list_vips, list_service_groups, list_real_servers):
+    '''
+    Returns the figures and lists shown in the SUMMARY section as a dictionary ready to
+    convert to json.
+    '''
+    return OrderedDict([
+        ('alteon_vips', original_alteon_figures[0]),
+        ('a10_vips', len(list_vips)),
+        ('alteon_sgs', original_alteon_figures[1]),
+        ('applied_alteon_sgs', original_alteon_figures[1] - len(unapplied_alteon_sgs)),
+        ('unapplied_alteon_sgs', unapplied_alteon_sgs),
+        ('sg_reuse_counter', reuse_dict['sg_reuse_counter']),
+        ('sg_extra_counter', reuse_dict['sg_extra_counter']),
+        ('expected_a10_sgs', original_alteon_figures[1] - len(unapplied_alteon_sgs) + 
+                             reuse_dict['sg_extra_counter']),
+        ('a10_sgs', len(list_service_groups)),
+        ('master_reuse_list', reuse_dict['master_reuse_list']),
+        ('master_reuse_different_port', reuse_dict['master_reuse_different_port']),
+        ('alteon_rss', original_alteon_figures[2]),
+        ('unapplied_alteon_rss', unapplied_alteon_rss),
+        ('expected_a10_rss', original_alteon_figures[2] - len(unapplied_alteon_rss)),
+        ('a10_rss', len(list_real_servers)),
+    ])
+
+
+def read_config(full_path_to_file):
+    '''
+    Reads an Alteon configuration file. Returns its content, with normalized line feeds
+    (all lines end with '\n'), and its lines tokenized with tokenize_config.
+    '''
     with open(full_path_to_file, 'r') as a_file:   
         file_content = a_file.read()
-    a_file.close()
     
-    # Normalize line feeds (force all lines to end with '\n') and split file in lines
+    # Normalize line feeds (force all lines to end with '\n') and split file in lines,
+    # replacing 'service' + protocol_name with 'service' + protocol_value in vports
     file_content = file_content.replace('\r\r\n', '\n')
-    lines_in_a_file = file_content.splitlines()
-    
-    # Replace 'service' + protocol_name with 'service' + protocol_value in all the config
-    map_protocol_values(lines_in_a_file)
+    return file_content, tokenize_config(file_content)
+
+
+def remove_auxiliar_keys(a_vip):
+    '''
+    Removes the auxiliar keys of a VIP and its vports with information from Alteon
+    configuration that is no longer required once processed.
+    '''
+    a_vip.pop('alteon_vip_list', None)
+    a_vip.pop('section', None)
+    for a_port in a_vip['vport_list']:
+        a_port.pop('alteon_sg_number', None)
+
+
+def vip_without_auxiliar_keys(a_vip):
+    '''
+    Returns a copy of a processed VIP without auxiliar keys, leaving the VIP untouched.
+    '''
+    vip_copy = copy.deepcopy(a_vip)
+    remove_auxiliar_keys(vip_copy)
+    return vip_copy
+
+
+def emit_service_group(emit, service_group, real_server_list, real_servers_by_name,
+                       emitted_ports):
+    '''
+    Emits a service-group once its members have been processed, preceded by the 
+    real-servers of its members: a copy of each real-server not emitted yet and, for 
+    real-servers already emitted, their ports added afterwards (in 'server_port_list' 
+    elements like {'name' : real_server_name, 'port' : real_port}).
+    real_servers_by_name and emitted_ports (number of ports emitted by real-server name)
+    keep the emitted state between calls.
+    '''
+    for a_real_server in real_server_list[len(real_servers_by_name):]:
+        real_servers_by_name[a_real_server['name']] = a_real_server
+    
+    for a_member in service_group['member_list']:
+        a_real_server = real_servers_by_name.get(a_member['server'])
+        if a_real_server is None:
+            continue
+        port_list = a_real_server['port_list']
+        if a_member['server'] not in emitted_ports:
+            emit('server_list', copy.deepcopy(a_real_server))
+        else:
+            for a_port in port_list[emitted_ports[a_member['server']]:]:
+                emit('server_port_list', {'name' : a_member['server'], 
+                                          'port' : dict(a_port)})
+        emitted_ports[a_member['server']] = len(port_list)
+    
+    service_group_copy = copy.deepcopy(service_group)
+    service_group_copy.pop('alteon_real_server_list', None)
+    emit('service_group_list', service_group_copy)
+
+
+def convert_config(file_content, lines_in_a_file, duplicate=False, jobs=1, 
+                   profiler=None, emit=None):
+    '''
+    Converts the VIPs, groups and reals of the Alteon configuration (read with 
+    read_config) to A10 virtual-servers, service-groups and real-servers, running the
+    VIP, VPORT, SERVICE-GROUP and REAL-SERVER level processing. 'jobs' worker processes
+    look up the sections in advance when greater than 1, and the elapsed time of each
+    phase is marked in profiler if given.
+    If emit is given, emit(list_key, element) is called with a copy of each element
+    as soon as it's final, so it can be uploaded while the rest is being converted. 
+    Elements are emitted after the ones they depend on: real-servers (and real-server
+    ports added afterwards, see emit_service_group) before the service-groups using them,
+    and service-groups before the virtual-servers using them.
+    Returns a dictionary with the 'vip_map', 'service_group_map' and 'real_server_map'
+    master structures, plus the figures and reuse information for the SUMMARY section.
+    '''
+    if profiler is None:
+        profiler = PhaseProfiler()
     
     # Finds configured numbers of each relevant elements in Alteon configuration. This 
     # lists are used to detect unapplied SGs, reused SGs, and others.
@@ -733,6 +1198,10 @@ def main():
     original_alteon_figures = [len(original_alteon_vips_list),
                                len(original_alteon_sgs_list), 
     						   len(original_alteon_rss_list),]
+    # Alteon groups and reals applied in the configuration, filled while processing
+    applied_alteon_sgs = set()
+    applied_alteon_rss = set()
+    profiler.mark('Finding occurrences')
  
     # VIP level processing
     
@@ -743,28 +1212,46 @@ def main():
     for a_vip_number in range(MAX_VIPS):
         if ('/c/slb/virt ' + str(a_vip_number) + '\n') in file_content:
             # Get the configuration subsection and the VIP IP address
-            section = find_section(lines_in_a_file, 'vip', str(a_vip_number))
-    	    vip_address = process_config_field(section, 'vip')
+            section_ranges = find_section_ranges(lines_in_a_file, 'vip', 
+                                                 str(a_vip_number))
+            section = section_from_ranges(lines_in_a_file, section_ranges)
+            vip_address = process_config_field(section, 'vip')
             
             # Process the VIP information and add it to the vip_map dictionary
-            process_vip_info(vip_map_list, vip_address, a_vip_number, section) 
-
-    # Consolidate VIP sections to have only 1 vip_number per vip_address    
-    renumber_vip_section(vip_map_list)
+            process_vip_info(vip_map_list, vip_address, a_vip_number, section, 
+                             section_ranges) 
+    profiler.mark('VIP processing')
+    
+    # Sections already looked up, by (vip_address, vport_number) for vports and by Alteon
+    # number for service-groups and real-servers. In parallel mode they are looked up
+    # by the worker processes in advance, together with the service-group reuse.
+    vport_sections = {}
+    service_group_sections = {}
+    real_server_sections = {}
+    reuse_dict = None
+    if jobs > 1:
+        (vport_sections, service_group_sections, real_server_sections, 
+         reuse_dict) = lookup_sections_in_parallel(lines_in_a_file, vip_map_list, jobs)
+        profiler.mark('Parallel sections lookup')
 
     
     # VPORT level processing (except service-group configuration)
-    for index, a_vip in enumerate(vip_map_list):
+    for a_vip in vip_map_list:
     	vport_map = a_vip['vport_list']
     	for a_vport in vport_map:
-    	    # Get each vport configuration to process it
-    	    subsection = find_section(a_vip['section'].splitlines(), 'vport', 
-    	                              str(a_vport['port']),
-    	                              parent_number=str(index))
+    	    # Get each vport configuration to process it, looking for it within the 
+    	    # sections of all the Alteon VIPs merged in the A10 VIP
+            vport_key = (a_vip['address'], str(a_vport['port']))
+            if vport_key in vport_sections:
+                subsection = vport_sections[vport_key]
+            else:
+                subsection = find_vport_section(lines_in_a_file, a_vip, 
+                                                str(a_vport['port']))
  
             # Process and add the vport information based on the subsection information
             # It requires the mapping between Alteon vip_numbers and A10 VIPs.
-            process_vport_info(a_vport, subsection, original_alteon_sgs_list)
+            process_vport_info(a_vport, subsection, applied_alteon_sgs)
+    profiler.mark('VPORT processing')
     
     
     # SERVICE-GROUP level processing (includes applying it to a vport)
@@ -785,13 +1272,15 @@ def main():
     	vport_map = a_vip['vport_list']
     	for a_vport in vport_map:
             # Get each service-group configuration to process it
-    	    section = find_section(lines_in_a_file, 'service_group', 
-    	                           str(a_vport['alteon_sg_number']))
+    	    section = find_cached_section(service_group_sections, lines_in_a_file,
+    	                                  'service_group', 
+    	                                  str(a_vport['alteon_sg_number']))
     	    
     	    # Process and add the service-group information based on the section
     	    # information. Includes applying the service-group to the particular vport.
             process_service_group_info(a_vport, service_group_map_list, section,
                                        a_vip['name'], duplicate)
+    profiler.mark('SERVICE-GROUP processing')
             
 
     # REAL-SERVER level processing
@@ -807,27 +1296,60 @@ def main():
     	                                                                 10 * '*')
     	print
     
-    for a_service_group in service_group_map_list:
+    # Streaming to emit: VIPs are emitted once the service-groups of all their vports 
+    # (so the index of the last one in service_group_map_list) have been emitted
+    if emit is not None:
+        emitted_ports = {}
+        real_servers_by_name = {}
+        service_group_index = {}
+        for index, a_service_group in enumerate(service_group_map_list):
+            service_group_index.setdefault(a_service_group['name'], index)
+        vip_ready_index = [max([service_group_index.get(a_vport['service_group'], -1)
+                                for a_vport in a_vip['vport_list'] 
+                                if 'service_group' in a_vport] or [-1])
+                           for a_vip in vip_map_list]
+        next_vip = 0
+        while next_vip < len(vip_map_list) and vip_ready_index[next_vip] < 0:
+            emit('virtual_server_list', vip_without_auxiliar_keys(vip_map_list[next_vip]))
+            next_vip += 1
+    
+    for sg_index, a_service_group in enumerate(service_group_map_list):
         # Members information was previously stored in an auxiliar key within each 
         # service-group called 'alteon_real_server_list'.
         for index, a_alteon_real_server_in_sg in enumerate(
             a_service_group['alteon_real_server_list']):
             # Get each real_server configuration of each service-group to process it
-    	    section = find_section(lines_in_a_file, 'real_server', 
-    	                           a_alteon_real_server_in_sg[0])
+    	    section = find_cached_section(real_server_sections, lines_in_a_file,
+    	                                  'real_server', a_alteon_real_server_in_sg[0])
     	    
             # Process and add the real-server information based on the section
     	    # information. Includes adding the members information to each service-group
     	    # in the A10 configuration.
             process_real_server_info(a_service_group, a_alteon_real_server_in_sg, 
                                      real_server_map_list, section, 
-                                     original_alteon_rss_list, duplicate)
+                                     applied_alteon_rss, duplicate)
+        
+        if emit is not None:
+            # The service-group is complete, emit it after its members real-servers
+            emit_service_group(emit, a_service_group, real_server_map_list, 
+                               real_servers_by_name, emitted_ports)
+            while next_vip < len(vip_map_list) and vip_ready_index[next_vip] <= sg_index:
+                emit('virtual_server_list', 
+                     vip_without_auxiliar_keys(vip_map_list[next_vip]))
+                next_vip += 1
+    
+    if emit is not None:
+        for a_vip in vip_map_list[next_vip:]:
+            emit('virtual_server_list', vip_without_auxiliar_keys(a_vip))
+    profiler.mark('REAL-SERVER processing')
     
     
     # SERVICE GROUP REUSE PROCESSING (within Alteon Configuration)
     
     # This computation is required for check everything is correct in the SUMMARY section
-    reuse_dict = reuse_computation(lines_in_a_file)
+    if reuse_dict is None:
+        reuse_dict = reuse_computation(lines_in_a_file)
+        profiler.mark('Reuse computation')
     		      
     
     # AUXILIAR KEYS REMOVAL PROCESSING
@@ -838,107 +1360,390 @@ def main():
     # Remove auxiliar keys with information from Alteon configuration that are no longer 
     # required.
     for a_vip in list_vips:
-        a_vip.pop('alteon_vip_list', None)
-        a_vip.pop('section', None)
-        for a_port in a_vip['vport_list']:
-        	a_port.pop('alteon_sg_number', None)
+        remove_auxiliar_keys(a_vip)
+
+    for a_service_group in list_service_groups:
+        a_service_group.pop('alteon_real_server_list', None)
+    
+    return {
+            'vip_map'                  : vip_map,
+            'service_group_map'        : service_group_map,
+            'real_server_map'          : real_server_map,
+            'original_alteon_figures'  : original_alteon_figures,
+            'original_alteon_sgs_list' : original_alteon_sgs_list,
+            'original_alteon_rss_list' : original_alteon_rss_list,
+            'applied_alteon_sgs'       : applied_alteon_sgs,
+            'applied_alteon_rss'       : applied_alteon_rss,
+            'reuse_dict'               : reuse_dict,
+           }
+
+
+def conversion_summary(conversion):
+    '''
+    Returns the SUMMARY section (see summary_report) of a conversion returned by 
+    convert_config.
+    '''
+    unapplied_alteon_sgs = [number for number in conversion['original_alteon_sgs_list']
+                            if number not in conversion['applied_alteon_sgs']]
+    unapplied_alteon_rss = [number for number in conversion['original_alteon_rss_list']
+                            if number not in conversion['applied_alteon_rss']]
+    return summary_report(conversion['original_alteon_figures'], unapplied_alteon_sgs,
+                          unapplied_alteon_rss, conversion['reuse_dict'],
+                          conversion['vip_map']['virtual_server_list'],
+                          conversion['service_group_map']['service_group_list'],
+                          conversion['real_server_map']['server_list'])
+
+
+# Valid A10 partition names, also used as json_objects subdirectory names
+PARTITION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
 
-	for a_service_group in list_service_groups:
-		a_service_group.pop('alteon_real_server_list', None)
+def ip_address_to_int(address):
+    '''
+    Converts a dotted IPv4 address to an integer.
+    '''
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def read_partition_map(file_path):
+    '''
+    Reads the rules assigning VIPs to A10 partitions, one rule per line:
+    	<partition> subnet <network>/<prefix length>    Ex: tenant_a subnet 10.1.0.0/16
+    	<partition> prefix <A10 VIP name prefix>        Ex: tenant_b prefix Portal_
+    Blank lines and lines starting with '#' are ignored. VIPs get the partition of the 
+    first matching rule, VIPs not matching any rule stay in the shared partition.
+    Returns a list of (partition, rule_type, value), being value (network, netmask) 
+    integers for subnet rules. Raises ValueError for invalid rules.
+    '''
+    rules = []
+    with open(file_path, 'r') as a_file:
+        for line_number, a_line in enumerate(a_file, 1):
+            words = a_line.split()
+            if not words or words[0].startswith('#'):
+                continue
+            if len(words) != 3 or words[1] not in ['subnet', 'prefix'] or \
+               not PARTITION_NAME_PATTERN.match(words[0]):
+                raise ValueError("{} line {}: invalid partition rule '{}'".format(
+                                 file_path, line_number, a_line.strip()))
+            if words[1] == 'subnet':
+                try:
+                    (network, prefix_length) = words[2].split('/')
+                    netmask = (0xffffffff << (32 - int(prefix_length))) & 0xffffffff
+                    value = (ip_address_to_int(network) & netmask, netmask)
+                except (ValueError, socket.error):
+                    raise ValueError("{} line {}: invalid subnet '{}'".format(
+                                     file_path, line_number, words[2]))
+            else:
+                value = words[2]
+            rules.append((words[0], words[1], value))
+    
+    return rules
+
+
+def vip_partition(a_vip, partition_rules):
+    '''
+    Returns the partition of the first rule matching a processed VIP, or None (shared
+    partition) if no rule matches.
+    '''
+    for (partition, rule_type, value) in partition_rules:
+        if rule_type == 'subnet':
+            if ip_address_to_int(a_vip['address']) & value[1] == value[0]:
+                return partition
+        elif a_vip['name'].startswith(value):
+            return partition
+    return None
+
+
+def shard_by_partition(list_vips, list_service_groups, list_real_servers, 
+                       partition_rules):
+    '''
+    Splits the processed elements by A10 partition. Each partition gets its VIPs, the
+    service-groups used by them and the real-servers members of those service-groups,
+    so service-groups and real-servers shared by VIPs of several partitions are repeated
+    in each one. Returns a list of (partition, vips, service_groups, real_servers), 
+    starting with the shared partition (None).
+    '''
+    vips_by_partition = OrderedDict([(None, [])])
+    for a_vip in list_vips:
+        vips_by_partition.setdefault(vip_partition(a_vip, partition_rules), 
+                                     []).append(a_vip)
+    
+    partitions = []
+    for (partition, vips) in vips_by_partition.items():
+        used_service_groups = set(a_vport['service_group'] for a_vip in vips 
+                                  for a_vport in a_vip['vport_list'] 
+                                  if 'service_group' in a_vport)
+        service_groups = [a_service_group for a_service_group in list_service_groups
+                          if a_service_group['name'] in used_service_groups]
+        used_real_servers = set(a_member['server'] for a_service_group in service_groups
+                                for a_member in a_service_group['member_list'])
+        real_servers = [a_real_server for a_real_server in list_real_servers
+                        if a_real_server['name'] in used_real_servers]
+        partitions.append((partition, vips, service_groups, real_servers))
+    
+    return partitions
+
+
+def main():
+    '''
+    Alteon migration tool v1.0 to A10 2.7.[1-2] ACOS software (aXapi 2.1). This script
+    migrates persistence templates, real servers, service-groups and virtual-servers.
+    IMPORTANT: to avoid issues, it is required to ensure that no duplicate 
+    names exist in Alteon configuration prior running the script. This entails:
+    	- 'dname' duplicated values within Alteon '/c/slb/virt' elements. This must be
+    	  checked manually.
+    	- 'name' duplicated values within Alteon '/c/slb/group' elements. This must be
+    	  checked manually but there's a optional print statement in function called
+    	  'process_service_group_info' which can be enabled with '-d' argument.
+    	- 'name' duplicated values within Alteon '/c/slb/real' elements. This must be
+    	  checked manually but there's optional print statement in function called
+    	  'process_real_server_info' which can be enabled with '-d' argument.
+    '''
+    
+    # Argument parsing, requires alteon config file full path, and allows verbosity
+    parser = ArgumentParser(description=("Script to process alteon configuration file and"
+                            " store the information in json objects formatted like the "
+                            "A10 is expecting"), prog='python process_script.py')
+    parser.add_argument('alteon_config_file', action='store', help=('Alteon configuration'
+                        ' file to process'))
+    parser.add_argument('-d', '--duplicate', action='store_true', help=('help to detect '
+                        'duplicate service-groups names and duplicate real-server names.'
+                        " It's advised to use this option at the beginning to fix names.")
+                        , dest= 'duplicate')
+    parser.add_argument('-v', '--verbose', action='store_true', help=('increase output '
+                        'verbosity (will show VIPs, SERVICE-GROUPs and REAL-SERVERs '
+                        'stored in master dictionaries)'), dest= 'verbose')                    
+    parser.add_argument('-f', '--format', action='store', choices=OUTPUT_FORMATS,
+                        default='pretty', help=('format of the stored json objects files'
+                        ": 'pretty' (indented), 'compact' or 'ndjson' (one object per "
+                        "line). Defaults to 'pretty'"), dest='output_format')
+    parser.add_argument('-b', '--json-backend', action='store', 
+                        choices=sorted(JSON_BACKENDS), default='json', help=('serializer '
+                        "used for 'compact' and 'ndjson' formats. Defaults to 'json'"),
+                        dest='json_backend')
+    parser.add_argument('-z', '--compress', action='store', choices=COMPRESSIONS,
+                        default=None, help=('compress the stored json objects files. '
+                        'They keep their names and are read by the other scripts as '
+                        'they are'), dest='compression')
+    parser.add_argument('-p', '--profile', action='store_true', help=('show the elapsed '
+                        'time of each processing phase and the name caches hit rate'),
+                        dest='profile')
+    parser.add_argument('-j', '--jobs', action='store', type=int, default=1, 
+                        help=('number of worker processes used to process the VIPs in '
+                        'parallel. Output is the same as in a serial run. Defaults to 1'),
+                        dest='jobs')
+    parser.add_argument('-l', '--lint', action='store_true', help=('only report the '
+                        'duplicate names and addresses of the Alteon configuration, with '
+                        'their line numbers, without converting it'), dest='lint')
+    parser.add_argument('-B', '--bundle', action='store_true', help=('also store the '
+                        'elements as a bundle of aXAPI requests ready to upload with '
+                        "upload_script.py --bundle (json_objects/OBJECTs.bundle)"), 
+                        dest='bundle')
+    parser.add_argument('--partition-map', action='store', help=('file with the rules '
+                        'assigning VIPs to A10 partitions by VIP subnet or name prefix. '
+                        'The elements of each partition are stored in a json_objects '
+                        'subdirectory named after it'), dest='partition_map')
+    parser.add_argument('--report-json', help=('also export the SUMMARY figures and '
+                        'lists to the given JSON file'), dest='report_json')
+    parsed_args = parser.parse_args()
+
+    full_path_to_file = parsed_args.alteon_config_file
+    # This enables duplicate element names printing
+    duplicate = parsed_args.duplicate
+    # verbose option will show the process virtual-server, service-group and real-server
+    # configuration in dictionary structures ready to convert to json.
+    verbose = parsed_args.verbose
+    # Format, serializer and compression of the stored json objects files
+    output_format = parsed_args.output_format
+    json_backend = parsed_args.json_backend
+    compression = parsed_args.compression
+    # profile option will show the PROFILE section after the SUMMARY section
+    profile = parsed_args.profile
+    profiler = PhaseProfiler()
+    # Rules assigning VIPs to partitions
+    partition_rules = []
+    if parsed_args.partition_map:
+        try:
+            partition_rules = read_partition_map(parsed_args.partition_map)
+        except (IOError, ValueError) as error:
+            parser.error(str(error))
+    # File to export the SUMMARY section as JSON
+    report_json = parsed_args.report_json
+    # Number of worker processes, 1 means serial run
+    jobs = max(1, parsed_args.jobs)
+    
+    (file_content, lines_in_a_file) = read_config(full_path_to_file)
+    profiler.mark('Reading and tokenizing')
+    
+    if parsed_args.lint:
+        # Lint mode, report duplicates and exit with error if there's any
+        report = lint_config(lines_in_a_file)
+        for (a_title, a_duplicate_list) in report:
+            print '#' * 80
+            print "{:>20} {} {}".format(10 * '*', a_title, 10 * '*')
+            print
+            for (key, descriptions) in a_duplicate_list:
+                print "'{}' : {}".format(key, ', '.join(descriptions))
+            print "Total: {}".format(len(a_duplicate_list))
+            print
+        print '#' * 80
+        sys.exit(1 if any(a_duplicate_list for (a_title, a_duplicate_list) in report) 
+                 else 0)
+    
+    conversion = convert_config(file_content, lines_in_a_file, duplicate, jobs, profiler)
+    vip_map = conversion['vip_map']
+    service_group_map = conversion['service_group_map']
+    real_server_map = conversion['real_server_map']
+    list_vips = vip_map['virtual_server_list']
+    list_service_groups = service_group_map['service_group_list']
+    original_alteon_figures = conversion['original_alteon_figures']
+    original_alteon_sgs_list = conversion['original_alteon_sgs_list']
+    original_alteon_rss_list = conversion['original_alteon_rss_list']
+    applied_alteon_sgs = conversion['applied_alteon_sgs']
+    applied_alteon_rss = conversion['applied_alteon_rss']
+    reuse_dict = conversion['reuse_dict']
+    
+    # Alteon groups and reals never applied, in configuration order
+    unapplied_alteon_sgs = [number for number in original_alteon_sgs_list 
+                            if number not in applied_alteon_sgs]
+    unapplied_alteon_rss = [number for number in original_alteon_rss_list 
+                            if number not in applied_alteon_rss]
+    list_real_servers = real_server_map['server_list']
+    
+    # Service-groups by name, to get the service-group of each vport in verbose output
+    service_groups_by_name = {}
+    for a_service_group in list_service_groups:
+        service_groups_by_name.setdefault(a_service_group['name'], 
+                                          []).append(a_service_group)
     
     
     # RESULTS PRINTING
+    
+    # The results are rendered in a memory buffer and written to the terminal at once
+    report = StringIO()
      
-    print
+    print >>report
     if verbose:
-    	print '#' * 80
+    	print >>report, '#' * 80
     
     for a_vip in list_vips:
     	if verbose:    
-            print "{:>20} VIP_CONFIGURATION {}".format(10 * '*', 10 * '*')
-            pprint(a_vip)
-            print
+            print >>report, "{:>20} VIP_CONFIGURATION {}".format(10 * '*', 10 * '*')
+            pprint(a_vip, report)
+            print >>report
         
         for a_port in a_vip['vport_list']:
             if verbose:
-                print "{:>6} SERVICE_GROUP {} CONFIGURATION {}".format(3 * '*',
+                print >>report, "{:>6} SERVICE_GROUP {} CONFIGURATION {}".format(3 * '*',
                        a_port['service_group'], 3 * '*')
             
-                for a_service_group in list_service_groups:
-            	    if a_service_group['name'] == a_port['service_group']:
-                        pprint(a_service_group)
-                        print
+                for a_service_group in service_groups_by_name.get(
+                                       a_port['service_group'], []):
+                    pprint(a_service_group, report)
+                    print >>report
 		
 	if verbose:
-		print '#' * 80
-    
-    list_real_servers = real_server_map['server_list']
+		print >>report, '#' * 80
     
     if verbose:
         for index, a_real_server in enumerate(real_server_map['server_list']):
-    	    print "{:>20} REAL_SERVER_{}_CONFIGURATION {}".format(10 * '*', 
+    	    print >>report, "{:>20} REAL_SERVER_{}_CONFIGURATION {}".format(10 * '*', 
     	                                                          str(index+1),
     	                                                          10 * '*')
-            pprint(a_real_server)
-        print
+            pprint(a_real_server, report)
+        print >>report
     
     
     	# SUMMARY subsection within RESULTS PRINTING
     
-    print '#' * 80
-    print "{:>20} SUMMARY {}".format(10 * '*', 10 * '*')
-    print
-    print "Number of original unmerged VIPs in Alteon  : {}".format(
+    print >>report, '#' * 80
+    print >>report, "{:>20} SUMMARY {}".format(10 * '*', 10 * '*')
+    print >>report
+    print >>report, "Number of original unmerged VIPs in Alteon  : {}".format(
                                                              original_alteon_figures[0])
-    print "Number of VIPs in A10                       : {}".format(str(len(list_vips)))
-    print ("(A10 is not limited to 8 vports/ VIP so it does not require a new VIP with "
-    	   "the same IP address for  VIPs with more than 8 vports like Alteon requires)")
-    print "\n"
-    print ("Applied original Alteon SGs        : {:<3}  "
+    print >>report, "Number of VIPs in A10                       : {}".format(
+                                                             str(len(list_vips)))
+    print >>report, ("(A10 is not limited to 8 vports/ VIP so it does not require a new "
+           "VIP with the same IP address for  VIPs with more than 8 vports like Alteon "
+           "requires)")
+    print >>report, "\n"
+    print >>report, ("Applied original Alteon SGs        : {:<3}  "
            "Original Alteon config SGs : {}").format(
-           original_alteon_figures[1] - len(original_alteon_sgs_list), 
+           original_alteon_figures[1] - len(unapplied_alteon_sgs), 
            original_alteon_figures[1])
-    print "{} Unapplied Alteon SGs       : {:<3}".format(41 * ' ', 
-           len(original_alteon_sgs_list))
-    print "Total Reuse number of Alteon SGs   : {}".format(
+    print >>report, "{} Unapplied Alteon SGs       : {:<3}".format(41 * ' ', 
+           len(unapplied_alteon_sgs))
+    print >>report, "Total Reuse number of Alteon SGs   : {}".format(
                                                     str(reuse_dict['sg_reuse_counter']))
-    print "Total Extra SGs due to Reuse with"
-    print "different port                     : {}".format(
+    print >>report, "Total Extra SGs due to Reuse with"
+    print >>report, "different port                     : {}".format(
                                                     str(reuse_dict['sg_extra_counter']))
-    print
-    print "Expected SGs in A10 config (Applied original + extra_counter) : {}".format(str(
-           original_alteon_figures[1] - len(original_alteon_sgs_list) + 
+    print >>report
+    print >>report, ("Expected SGs in A10 config (Applied original + extra_counter) : "
+           "{}").format(str(original_alteon_figures[1] - len(unapplied_alteon_sgs) + 
            reuse_dict['sg_extra_counter']))
-    print "Service Groups (SGs) ready to apply to A10 config {}: {}".format(12 * ' ',
-                                                            str(len(list_service_groups)))
-    print ("(A10 generates a new SG for each reuse in a specific service-port, so will "
-           " have +extra_SG_number SGs than the applied SGs number in Alteon "
-           " configuration)")
-    print
-    print "List of unapplied Alteon SGs                : {:<50}".format(
-           original_alteon_sgs_list)
-    print "Alteon SGs reuse list (number, reuse times) : {:<50}".format(
+    print >>report, "Service Groups (SGs) ready to apply to A10 config {}: {}".format(
+           12 * ' ', str(len(list_service_groups)))
+    print >>report, ("(A10 generates a new SG for each reuse in a specific service-port, "
+           "so it will have")
+    print >>report, ("+extra_SG_number SGs more than the applied SGs number in Alteon "
+           "configuration)")
+    print >>report
+    print >>report, "List of unapplied Alteon SGs                : {:<50}".format(
+           unapplied_alteon_sgs)
+    print >>report, "Alteon SGs reuse list (number, reuse times) : {:<50}".format(
            reuse_dict['master_reuse_list'])
-    print "Alteon SGs reuse list in different port"
-    print "(number, different ports)                   : {:<50}".format(
+    print >>report, "Alteon SGs reuse list in different port"
+    print >>report, "(number, different ports)                   : {:<50}".format(
            reuse_dict['master_reuse_different_port'])
-    print "\n"
-    print "Number of RSs in original config   {}: {}".format(17 * ' ',
+    print >>report, "\n"
+    print >>report, "Number of RSs in original config   {}: {}".format(17 * ' ',
                                                              original_alteon_figures[2])
-    print "Number of unapplied Alteon RSs   {}: {}".format(19 * ' ',
-                                                           len(original_alteon_rss_list))
-    print
-    print "Expected RSs in A10 config (Total - unapplied)      : {}".format(
-           str(original_alteon_figures[2] - len(original_alteon_rss_list)))
-    print "Real Servers (RSs) ready to apply to A10 config     : {}".format(
+    print >>report, "Number of unapplied Alteon RSs   {}: {}".format(19 * ' ',
+                                                           len(unapplied_alteon_rss))
+    print >>report
+    print >>report, "Expected RSs in A10 config (Total - unapplied)      : {}".format(
+           str(original_alteon_figures[2] - len(unapplied_alteon_rss)))
+    print >>report, "Real Servers (RSs) ready to apply to A10 config     : {}".format(
            str(len(list_real_servers)))
-    print ("(A10 will have the RS configured as long as it is applied in the"
+    print >>report, ("(A10 will have the RS configured as long as it is applied in the"
           " Alteon config)")
-    print
-    print "List of unapplied Alteon RSs       : {}".format(original_alteon_rss_list)
-    print
-    print '#' * 80
-    print
+    print >>report
+    print >>report, "List of unapplied Alteon RSs       : {}".format(unapplied_alteon_rss)
+    print >>report
+    print >>report, '#' * 80
+    print >>report
+    
+    sys.stdout.write(report.getvalue())
+    
+    if report_json:
+        # Export the SUMMARY figures and lists
+        with open(report_json, 'w') as a_file:
+            json.dump(conversion_summary(conversion), a_file, indent=4)
+        print "Successfully saved {} file...".format(report_json)
+        print
+    
+    
+    	# PROFILE subsection within RESULTS PRINTING
+    
+    if profile:
+        profiler.mark('Results printing')
+        print "{:>20} PROFILE {}".format(10 * '*', 10 * '*')
+        print
+        for (a_phase, elapsed_time) in profiler.phases:
+            print "{:<35}: {:.3f} s".format(a_phase, elapsed_time)
+        print "{:<35}: {:.3f} s".format('Total', sum(elapsed_time for (a_phase, 
+                                        elapsed_time) in profiler.phases))
+        print
+        for (a_cache_name, a_cache) in [('Service-group name cache', 
+                                         SERVICE_GROUP_NAME_CACHE),
+                                        ('Real-server name cache', 
+                                         REAL_SERVER_NAME_CACHE)]:
+            print "{:<35}: {} hits, {} misses, hit rate {:.1f}%".format(a_cache_name, 
+                   a_cache.hits, a_cache.misses, a_cache.hit_rate())
+        print
+        print '#' * 80
+        print
     
     
     # JSON CONVERSION AND STORING TO FILES PROCESSING
@@ -950,31 +1755,50 @@ def main():
         # Get the script directory
         script_dir = os.path.dirname(os.path.realpath(__file__))
     
-    	# Create json_objects subdir if it doesn't exist
-    	if not os.path.exists(script_dir + '/json_objects/'):
-    		os.makedirs('./json_objects/')
-    	
-    	# Store VIPs dictionary
-    	with open(script_dir + '/json_objects/VIPs.txt', 'w') as a_file:   
-        	json.dump(vip_map, a_file, indent=4)
-        	print "Successfully saved {} file...".format(
-        	       script_dir + '/json_objects/VIPs.txt')
-    	a_file.close()
-    	
-    	# Store SGs dictionary
-    	with open(script_dir + '/json_objects/SGs.txt', 'w') as a_file:   
-        	json.dump(service_group_map, a_file, indent=4)
-        	print "Successfully saved {} file...".format(
-        	       script_dir + '/json_objects/SGs.txt')
-    	a_file.close()
-    	
-    	# Store RSs dictionary
-    	with open(script_dir + '/json_objects/RSs.txt', 'w') as a_file:   
-        	json.dump(real_server_map, a_file, indent=4)
-        	print "Successfully saved {} file...".format(
-        	       script_dir + '/json_objects/RSs.txt')
-    	a_file.close()
-    	
+        # Elements of each partition, all of them in the shared one without partition map
+        if partition_rules:
+            partitions = shard_by_partition(list_vips, list_service_groups, 
+                                            list_real_servers, partition_rules)
+        else:
+            partitions = [(None, list_vips, list_service_groups, list_real_servers)]
+        
+        for (a_partition, vips, service_groups, real_servers) in partitions:
+            # Create json_objects subdir (or partition subdir) if it doesn't exist
+            partition_dir = script_dir + partition_path('/json_objects/', a_partition)
+            if not os.path.exists(partition_dir):
+                os.makedirs(partition_dir)
+            
+            # Store VIPs, SGs and RSs dictionaries streaming their objects to disk
+            for (file_to_store, list_key, objects) in [
+                                    ('/json_objects/VIPs.txt', 'virtual_server_list', vips),
+                                    ('/json_objects/SGs.txt', 'service_group_list', 
+                                     service_groups),
+                                    ('/json_objects/RSs.txt', 'server_list', real_servers)]:
+                file_to_store = partition_path(file_to_store, a_partition)
+                write_object_file(script_dir + file_to_store, list_key, objects,
+                                  output_format, json_backend, compression)
+                print "Successfully saved {} file...".format(script_dir + file_to_store)
+            
+            if parsed_args.bundle:
+                # Pre-encoded requests in upload order, see object_files.BundleWriter
+                file_to_store = partition_path(BUNDLE_FILE, a_partition)
+                write_bundle(script_dir + file_to_store, 
+                             [('server_list', real_servers),
+                              ('service_group_list', service_groups),
+                              ('virtual_server_list', vips)], json_backend)
+                print "Successfully saved {} file...".format(script_dir + file_to_store)
+            elif os.path.exists(script_dir + partition_path(BUNDLE_FILE, a_partition)):
+                # A bundle of a previous run would upload stale elements with --bundle
+                os.remove(script_dir + partition_path(BUNDLE_FILE, a_partition))
+                print "Removed stale {} file...".format(
+                       script_dir + partition_path(BUNDLE_FILE, a_partition))
+        
+        # Partitions of this run, the only ones uploaded by upload_script.py -P
+        with open(script_dir + PARTITIONS_FILE, 'w') as a_file:
+            for (a_partition, vips, service_groups, real_servers) in partitions:
+                if a_partition is not None:
+                    a_file.write(a_partition + '\n')
+        
     elif store_objects.lower() == 'no':
         print "Data not saved....bye"
     
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+import json
+from argparse import ArgumentParser
+import os, time
+from object_files import ObjectWriter, OUTPUT_FORMATS, JSON_BACKENDS, COMPRESSIONS
+from object_files import LIST_GETALL_METHOD_MAP
+from upload_script import FILE_MAP, TEXT_MAP
+from a10_device import A10Device, SessionCache, SESSION_CACHE_FILE, SESSION_CACHE_TTL
+from a10_device import parse_response, run_concurrently
+
+# List key of the elements stored in each file of FILE_MAP
+MAP_LIST_KEY_MAP = {
+                    'cookie_persistence_map' : 'cookie_persistence_template_list',
+                    'src_ip_persistence_map' : 'src_ip_persistence_template_list',
+                    'ssl_id_persistence_map' : 'ssl_sid_persist_template_list',
+                    'real_server_map'        : 'server_list',
+                    'service_group_map'      : 'service_group_list',
+                    'vip_map'                : 'virtual_server_list',
+                   }
+
+
+def get_objects(thunder, list_key):
+    '''
+    Gets all the elements of a list from the A10 box. Raises ValueError if the A10 box
+    fails to return them.
+    '''
+    method = LIST_GETALL_METHOD_MAP[list_key]
+    content = thunder.callMethod(method, '')
+    result = parse_response(content)
+    if result['status'] == 'fail':
+        raise ValueError("{} failed: code {}, {}".format(method, result['code'],
+                                                         result['msg']))
+    data = json.loads(content)
+    if list_key in data:
+        return data[list_key]
+    # Some lists are returned with a different key than the one in the files
+    return ([a_value for a_value in data.values() if isinstance(a_value, list)] or
+            [[]])[0]
+
+
+def snapshot_list(thunder, list_key, file_path, output_format='pretty',
+                  backend='json', compression=None):
+    '''
+    Gets all the elements of a list from the A10 box and stores them in a json_objects
+    file. Returns the number of elements stored.
+    '''
+    a_map_objects = get_objects(thunder, list_key)
+    writer = ObjectWriter(file_path, list_key, output_format, backend, compression)
+    for a_object in a_map_objects:
+        writer.write(a_object)
+    writer.close()
+    return writer.count
+
+
+def take_snapshot(thunder, snapshot_dir, output_format='pretty', backend='json',
+                  sessions=1, compression=None):
+    '''
+    Stores the persistence templates, real servers, service groups and virtual servers
+    of the A10 box in the json_objects subdirectory of snapshot_dir, in the same files
+    upload_script.py uploads (see its --objects-dir option). All the lists are got
+    concurrently, up to one per session. Returns a list of (file_path, list_key, count).
+    '''
+    if not os.path.exists(snapshot_dir + '/json_objects'):
+        os.makedirs(snapshot_dir + '/json_objects')
+
+    def snapshot_file(a_map_and_file):
+        (a_map, file_to_store) = a_map_and_file
+        list_key = MAP_LIST_KEY_MAP[a_map]
+        count = snapshot_list(thunder, list_key, snapshot_dir + file_to_store,
+                              output_format, backend, compression)
+        return (snapshot_dir + file_to_store, list_key, count)
+
+    return run_concurrently(snapshot_file, FILE_MAP, sessions)
+
+
+def main():
+    '''
+    Takes a snapshot of the SLB configuration of the A10 box before changing it with
+    upload_script.py or delete_script.py. The snapshot is stored as json_objects files,
+    so it can be restored with:
+        python delete_script.py <a10_ip_address>
+        python upload_script.py <a10_ip_address> --objects-dir <snapshot directory>
+    '''
+    # Argument parsing
+    parser = ArgumentParser(description=("Script to store the current A10 slb "
+                            "configuration as json objects files ready to upload again"),
+                            prog='python snapshot_script.py')
+    parser.add_argument('a10_ip_address', action='store', help='A10 management IP')
+    parser.add_argument('a10_admin_user', action='store', help='A10 admin user',
+                        default='admin', nargs='?',) # Optional arg, defaults to 'admin'
+    parser.add_argument('a10_admin_pwd', action='store', help='A10 admin user password',
+                        default='a10', nargs='?',)   # Optional arg, defaults to 'a10'
+    parser.add_argument('-o', '--output-dir', action='store', default=None,
+                        help=('directory to store the snapshot. Defaults to '
+                        'snapshots/<a10_ip_address>-<date>-<time> in the script '
+                        'directory'), dest='output_dir')
+    parser.add_argument('-f', '--format', action='store', choices=OUTPUT_FORMATS,
+                        default='pretty', help=('format of the stored json objects files'
+                        ". Defaults to 'pretty'"), dest='output_format')
+    parser.add_argument('-b', '--json-backend', action='store',
+                        choices=sorted(JSON_BACKENDS), default='json', help=('serializer '
+                        "used for 'compact' and 'ndjson' formats. Defaults to 'json'"),
+                        dest='json_backend')
+    parser.add_argument('-z', '--compress', action='store', choices=COMPRESSIONS,
+                        default=None, help='compress the stored json objects files',
+                        dest='compression')
+    parser.add_argument('-s', '--sessions', action='store', type=int,
+                        default=len(FILE_MAP), help=('number of authenticated sessions '
+                        'opened in the A10 box to get the elements concurrently. '
+                        'Defaults to {}').format(len(FILE_MAP)), dest='sessions')
+    parser.add_argument('--https', action='store_true', help=('use HTTPs to connect '
+                        'to the A10 box'), dest='https')
+    parser.add_argument('--partition', action='store', default=None, help=('take the '
+                        'snapshot of the given partition instead of the shared one'),
+                        dest='partition')
+    parser.add_argument('--session-cache', action='store_true', help=('reuse the '
+                        'sessions of previous runs stored in --session-cache-file and '
+                        'keep the sessions open at the end for the next runs'),
+                        dest='session_cache')
+    parser.add_argument('--session-cache-file', action='store',
+                        default=SESSION_CACHE_FILE, help=('file storing the sessions '
+                        'reused with --session-cache. Defaults to {}').format(
+                        SESSION_CACHE_FILE), dest='session_cache_file')
+    parser.add_argument('--session-ttl', action='store', type=int,
+                        default=SESSION_CACHE_TTL, help=('seconds a cached session can be '
+                        'reused since its last use. Defaults to {}').format(
+                        SESSION_CACHE_TTL), dest='session_ttl')
+    parser.add_argument('-v', '--verbose', action='store_true', help=('increase output '
+                        'verbosity showing HTTPs POST Requests/Responses in detail'),
+                        dest= 'verbose')
+    parsed_args = parser.parse_args()
+
+    sessions = max(1, parsed_args.sessions)
+
+    # Get the script directory
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    snapshot_dir = parsed_args.output_dir or '{}/snapshots/{}-{}'.format(script_dir,
+                   parsed_args.a10_ip_address.replace(':', '_'),
+                   time.strftime('%Y%m%d-%H%M%S'))
+
+    thunder = A10Device(parsed_args.a10_ip_address, parsed_args.a10_admin_user,
+                        parsed_args.a10_admin_pwd)
+    thunder.debug = parsed_args.verbose
+    thunder.use_https = parsed_args.https
+    thunder.partition = parsed_args.partition
+    if parsed_args.session_cache:
+        thunder.session_cache = SessionCache(parsed_args.session_cache_file,
+                                             parsed_args.session_ttl)
+    thunder.openSessions(sessions)                      # GET authentication sessions
+
+    start_time = time.time()
+    stored_files = take_snapshot(thunder, snapshot_dir, parsed_args.output_format,
+                                 parsed_args.json_backend, sessions,
+                                 parsed_args.compression)
+    for (file_path, list_key, count) in stored_files:
+        print "{:<25}: {:>5} elements saved in {}".format(TEXT_MAP[list_key], count,
+                                                         file_path)
+    print
+    print "### Snapshot finished in {:.2f} s. Stored in {} ###".format(
+           time.time() - start_time, snapshot_dir)
+    print
+
+    thunder.endSessions()                           # Close (or cache) Sessions
+
+
+
+if __name__ == '__main__':
+    main()
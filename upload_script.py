@@ -1,8 +1,17 @@
 #!/usr/bin/env python
 
-import json, urllib2
+import json
 from argparse import ArgumentParser
-import os
+import os, time, urllib2
+from itertools import islice
+from object_files import read_object_file, partition_path, Bundle, BUNDLE_FILE
+from object_files import PARTITIONS_FILE
+from a10_device import A10Device, SessionCache, SESSION_CACHE_FILE, SESSION_CACHE_TTL
+from a10_device import ResultLog, run_concurrently, DependencyScheduler, parse_response
+from a10_device import AdaptiveTuner, TuningCache, TUNING_FILE, A10DeviceV3, load_error
+
+# Maximum number of sessions opened with --auto-tune when --sessions is not given
+AUTO_TUNE_SESSIONS = 16
 
 FILE_MAP = [
             ('cookie_persistence_map' ,'/json_objects/PERSISTs-COOKIE.txt'),
@@ -13,15 +22,56 @@ FILE_MAP = [
             ('vip_map'                ,'/json_objects/VIPs.txt'),               
            ]
 
+# Files of FILE_MAP not generated by process_script.py (nor stored in its bundle)
+TEMPLATE_MAPS = ['cookie_persistence_map', 'src_ip_persistence_map', 
+                 'ssl_id_persistence_map']
+
 TEXT_MAP  = {
              'cookie_persistence_template_list' : 'COOKIE PERSISTENCE',
              'src_ip_persistence_template_list' : 'SOURCE IP PERSISTENCE',
              'ssl_sid_persist_template_list'    : 'SSL ID PERSISTENCE',
              'server_list'                      : 'REAL SERVER',
+             'server_port_list'                 : 'REAL SERVER PORT',
              'service_group_list'               : 'SERVICE GROUP',
              'virtual_server_list'              : 'VIRTUAL SERVER',               
             }
 
+# CLI names of the aXAPI protocol and lb_method values used in the files
+CLI_PROTOCOL_MAP = {
+                    2  : 'tcp',
+                    3  : 'udp',
+                    11 : 'http',
+                    12 : 'https',
+                   }
+
+CLI_LB_METHOD_MAP = {
+                     0  : None,                # round-robin, the default method
+                     2  : 'least-connection',
+                     14 : 'src-ip-only-hash',
+                    }
+
+# aXAPI v3 resource path and list key of each list, to create its elements in bulk
+V3_LIST_MAP = {
+               'cookie_persistence_template_list' : ('slb/template/persist/cookie', 
+                                                     'cookie-list'),
+               'src_ip_persistence_template_list' : ('slb/template/persist/source-ip',
+                                                     'source-ip-list'),
+               'ssl_sid_persist_template_list'    : ('slb/template/persist/ssl-sid',
+                                                     'ssl-sid-list'),
+               'server_list'                      : ('slb/server', 'server-list'),
+               'service_group_list'               : ('slb/service-group', 
+                                                     'service-group-list'),
+               'virtual_server_list'              : ('slb/virtual-server', 
+                                                     'virtual-server-list'),
+              }
+
+# aXAPI v3 (key, value) of the lb_method values used in the files
+V3_LB_METHOD_MAP = {
+                    0  : None,                # round-robin, the default method
+                    2  : ('lc-method', 'least-connection'),
+                    14 : ('lb-method', 'src-ip-only-hash'),
+                   }
+
 METHOD_MAP = {
               'cookie_persistence_map' : 'slb.template.cookie_persistence.create',
               'src_ip_persistence_map' : 'slb.template.src_ip_persistence.create',
@@ -31,58 +81,425 @@ METHOD_MAP = {
               'vip_map'                : 'slb.virtual_server.create',               
              }
 
-class A10Device(object):
-    '''
-    Class to abstract aXAPI session creation and method calling using HTTPs POST Requests
-    and Responses.
-    '''
-    username = ""
-    password = ""
-    session = ""
-    method = ""
-    debug = False
-    def __init__(self, ip, username, password):
-        self.ip= ip
-        self.username = username
-        self.password = password
-        self.session = ""
-    def getSession(self):
-        post_body = json.dumps(
-        {
-           "username": self.username,
-           "password": self.password
-        }
-        )        
-        url = "http://" + self.ip + "/services/rest/V2.1/?session_id=dummySessionId&format=json&method=authenticate"
-        if self.debug: print "Generated URL: " + url + " - Post Body: " + post_body
-        req = urllib2.Request(url, post_body)
-        rsp = urllib2.urlopen(req)
-        content = rsp.read()
-        if self.debug: print "Result: " + content
-        data = json.loads(content)
-        session_id = data['session_id']
-        print "Session Created. Session ID: " + session_id
-        self.session= session_id
-    def closeSession(self):
-        if self.debug: print "Closing Session: "+self.session
-        post_body = json.dumps(
-        {
-            "session_id":self.session
-        }
-        )
-        url = "http://" + self.ip + "/services/rest/V2.1/?session_id=" + self.session + "&format=json&method=session.close"
-        if self.debug: print "Generated URL: " + url + " - Post Body: " + post_body
-        req = urllib2.Request(url, post_body)
-        rsp = urllib2.urlopen(req)
-        content = rsp.read()
-        print "Result: " + content
-    def genericPostApi(self,postBody):
-        url = "http://"+self.ip+"/services/rest/V2.1/?session_id=" + self.session +"&format=json&method="+self.method
-        if self.debug: print "Generated URL: " + url + " - Post Body: " + postBody
-        req = urllib2.Request(url, postBody)
-        rsp = urllib2.urlopen(req)
-        content = rsp.read()
-        print (content)
+def render_cookie_persistence(template):
+    '''
+    CLI commands of a cookie persistence template.
+    '''
+    commands = ['slb template persist cookie ' + template['name']]
+    if 'cookie_name' in template:
+        commands.append(' name ' + template['cookie_name'])
+    return commands
+
+def render_src_ip_persistence(template):
+    '''
+    CLI commands of a source IP persistence template.
+    '''
+    return ['slb template persist source-ip ' + template['name']]
+
+def render_ssl_id_persistence(template):
+    '''
+    CLI commands of a SSL session ID persistence template.
+    '''
+    return ['slb template persist ssl-sid ' + template['name']]
+
+def render_real_server(real_server):
+    '''
+    CLI commands of a real server and its ports.
+    '''
+    commands = ['slb server {} {}'.format(real_server['name'], real_server['host'])]
+    if real_server.get('status') == 0:
+        commands.append(' disable')
+    if 'conn_limit' in real_server:
+        commands.append(' conn-limit {}'.format(real_server['conn_limit']))
+    for a_port in real_server['port_list']:
+        commands.append(' port {} {}'.format(a_port['port_num'], 
+                                             CLI_PROTOCOL_MAP[a_port['protocol']]))
+        if a_port.get('status') == 0:
+            commands.append('  disable')
+    return commands
+
+def render_service_group(service_group):
+    '''
+    CLI commands of a service group and its members.
+    '''
+    commands = ['slb service-group {} {}'.format(service_group['name'], 
+                                     CLI_PROTOCOL_MAP[service_group['protocol']])]
+    if CLI_LB_METHOD_MAP.get(service_group.get('lb_method')):
+        commands.append(' method ' + CLI_LB_METHOD_MAP[service_group['lb_method']])
+    if service_group.get('health_monitor'):
+        commands.append(' health-check ' + service_group['health_monitor'])
+    for a_member in service_group['member_list']:
+        a_command = ' member {}:{}'.format(a_member['server'], a_member['port'])
+        if a_member.get('status') == 0:
+            a_command += ' disable'
+        commands.append(a_command)
+    return commands
+
+def render_virtual_server(virtual_server):
+    '''
+    CLI commands of a virtual server, its vports and the templates applied to them.
+    '''
+    commands = ['slb virtual-server {} {}'.format(virtual_server['name'], 
+                                                  virtual_server['address'])]
+    if virtual_server.get('status') == 0:
+        commands.append(' disable')
+    for a_vport in virtual_server['vport_list']:
+        commands.append(' port {} {}'.format(a_vport['port'], 
+                                             CLI_PROTOCOL_MAP[a_vport['protocol']]))
+        if 'service_group' in a_vport:
+            commands.append('  service-group ' + a_vport['service_group'])
+        for (a_key, a_template_type) in [('cookie_persistence_template', 'cookie'),
+                                         ('source_ip_persistence_template', 'source-ip'),
+                                         ('ssl_session_id_persistence_template', 
+                                          'ssl-sid')]:
+            if a_key in a_vport:
+                commands.append('  template persist {} {}'.format(a_template_type,
+                                                                  a_vport[a_key]))
+    return commands
+
+def v3_cookie_persistence(template):
+    '''
+    aXAPI v3 object of a cookie persistence template.
+    '''
+    v3_object = {'name' : template['name']}
+    if 'cookie_name' in template:
+        v3_object['cookie-name'] = template['cookie_name']
+    return v3_object
+
+def v3_persistence(template):
+    '''
+    aXAPI v3 object of a source IP or SSL session ID persistence template.
+    '''
+    return {'name' : template['name']}
+
+def v3_real_server(real_server):
+    '''
+    aXAPI v3 object of a real server and its ports.
+    '''
+    v3_object = {'name' : real_server['name'], 'host' : real_server['host'], 
+                 'port-list' : []}
+    if real_server.get('status') == 0:
+        v3_object['action'] = 'disable'
+    if 'conn_limit' in real_server:
+        v3_object['conn-limit'] = real_server['conn_limit']
+    for a_port in real_server['port_list']:
+        v3_port = {'port-number' : a_port['port_num'], 
+                   'protocol' : CLI_PROTOCOL_MAP[a_port['protocol']]}
+        if a_port.get('status') == 0:
+            v3_port['action'] = 'disable'
+        v3_object['port-list'].append(v3_port)
+    return v3_object
+
+def v3_service_group(service_group):
+    '''
+    aXAPI v3 object of a service group and its members.
+    '''
+    v3_object = {'name' : service_group['name'], 
+                 'protocol' : CLI_PROTOCOL_MAP[service_group['protocol']],
+                 'member-list' : []}
+    if V3_LB_METHOD_MAP.get(service_group.get('lb_method')):
+        (a_key, a_value) = V3_LB_METHOD_MAP[service_group['lb_method']]
+        v3_object[a_key] = a_value
+    if service_group.get('health_monitor'):
+        v3_object['health-check'] = service_group['health_monitor']
+    for a_member in service_group['member_list']:
+        v3_member = {'name' : a_member['server'], 'port' : a_member['port']}
+        if a_member.get('status') == 0:
+            v3_member['member-state'] = 'disable'
+        v3_object['member-list'].append(v3_member)
+    return v3_object
+
+def v3_virtual_server(virtual_server):
+    '''
+    aXAPI v3 object of a virtual server, its vports and the templates applied to them.
+    '''
+    v3_object = {'name' : virtual_server['name'], 
+                 'ip-address' : virtual_server['address'], 'port-list' : []}
+    if virtual_server.get('status') == 0:
+        v3_object['enable-disable-action'] = 'disable'
+    for a_vport in virtual_server['vport_list']:
+        v3_port = {'port-number' : a_vport['port'], 
+                   'protocol' : CLI_PROTOCOL_MAP[a_vport['protocol']]}
+        if 'service_group' in a_vport:
+            v3_port['service-group'] = a_vport['service_group']
+        for (a_key, a_v3_key) in [('cookie_persistence_template', 
+                                   'template-persist-cookie'),
+                                  ('source_ip_persistence_template', 
+                                   'template-persist-source-ip'),
+                                  ('ssl_session_id_persistence_template', 
+                                   'template-persist-ssl-sid')]:
+            if a_key in a_vport:
+                v3_port[a_v3_key] = a_vport[a_key]
+        v3_object['port-list'].append(v3_port)
+    return v3_object
+
+# Functions converting each type of element in the files to aXAPI v3 objects
+V3_CONVERT_MAP = {
+                  'cookie_persistence_template_list' : v3_cookie_persistence,
+                  'src_ip_persistence_template_list' : v3_persistence,
+                  'ssl_sid_persist_template_list'    : v3_persistence,
+                  'server_list'                      : v3_real_server,
+                  'service_group_list'               : v3_service_group,
+                  'virtual_server_list'              : v3_virtual_server,
+                 }
+
+# Functions rendering CLI commands of each type of element in the files
+CLI_RENDER_MAP = {
+                  'cookie_persistence_template_list' : render_cookie_persistence,
+                  'src_ip_persistence_template_list' : render_src_ip_persistence,
+                  'ssl_sid_persist_template_list'    : render_ssl_id_persistence,
+                  'server_list'                      : render_real_server,
+                  'service_group_list'               : render_service_group,
+                  'virtual_server_list'              : render_virtual_server,
+                 }
+
+
+def render_cli_objects(script_dir, file_map=FILE_MAP):
+    '''
+    Loads all the files existing in file_map and yields (label, cli_commands) for each 
+    element, in the same order they are uploaded with aXAPI methods. The label identifies
+    the originating element in error messages.
+    '''
+    for (a_map, file_to_process) in file_map:
+        value, a_map_objects = read_object_file(script_dir + file_to_process)
+        for index, a_object in enumerate(a_map_objects):
+            label = "{} {} ({})".format(TEXT_MAP[value], str(index+1), 
+                                        a_object.get('name', ''))
+            yield label, '\n'.join(CLI_RENDER_MAP[value](a_object))
+
+
+def deploy_cli_chunks(thunder, script_dir, chunk_size, result_log, file_map=FILE_MAP):
+    '''
+    Uploads the configuration sending the CLI commands of chunk_size elements in each
+    cli.deploy call, instead of calling one aXAPI method per element. When a chunk fails,
+    its elements are deployed one by one to attribute the error to the originating ones.
+    Elements before the failing one, already created by the chunk, are then skipped.
+    Results of chunks and of elements deployed one by one are stored in result_log,
+    whose totals count elements, not chunks. When the device has a tuner, chunk_size is
+    taken from it for every chunk.
+    '''
+    chunk_number = 0
+    rendered_objects = render_cli_objects(script_dir, file_map)
+    while True:
+        if thunder.tuner is not None:
+            chunk_size = thunder.tuner.chunk_size
+        chunk = list(islice(rendered_objects, chunk_size))
+        if not chunk:
+            break
+        chunk_number += 1
+        chunk_label = "CLI CHUNK {} ({} to {})".format(str(chunk_number), chunk[0][0], 
+                                                       chunk[-1][0])
+        start_time = time.time()
+        content = thunder.cliDeploy('\n'.join(cli_commands for (label, cli_commands) 
+                                              in chunk) + '\n')
+        # Failed chunks are not counted, their elements are counted when retried
+        failed = parse_response(content)['status'] == 'fail'
+        result_log.record(chunk_label, 'cli.deploy', content, time.time() - start_time, 
+                          0 if failed else len(chunk))
+        if thunder.tuner is not None:
+            thunder.tuner.chunkDone(len(chunk), time.time() - start_time, 
+                                    load_error(content))
+        
+        if failed:
+            # Deploy the elements of the chunk one by one to find the failed ones. The
+            # ones before the first failed element were created by the chunk
+            failing_found = False
+            for (label, cli_commands) in chunk:
+                start_time = time.time()
+                content = thunder.cliDeploy(cli_commands + '\n')
+                result = result_log.record(label, 'cli.deploy', content, 
+                                           time.time() - start_time, 
+                                           skip_existing=not failing_found)
+                failing_found = failing_found or result['status'] == 'fail'
+
+
+def upload_objects(thunder, script_dir, result_log, sessions=1, file_map=FILE_MAP):
+    '''
+    Uploads all the elements in the files of file_map calling one aXAPI method per element.
+    With several sessions, the elements of each file are uploaded concurrently, one 
+    request in flight per session. Files are still uploaded one after another, following
+    file_map order, because elements depend on the ones in previous files.
+    Results are stored in result_log.
+    '''
+    for (a_map, file_to_process) in file_map:
+    
+        method = METHOD_MAP[a_map]                      # SET Method
+        
+        # All the files contain a dictionary with only one key holding the list of the
+        # elements of a particular type, stored in any of the formats supported by
+        # object_files. Value gets the key of the list and a_map_objects its elements.
+        value, a_map_objects = read_object_file(script_dir + file_to_process)
+        
+        def upload_object(index_and_object):
+            (index, a_object) = index_and_object
+            postBody = json.dumps(a_object)   # SET Post Body for the chosen method
+            label = "{} {} ({})".format(TEXT_MAP[value], str(index+1), 
+                                        a_object.get('name', ''))
+            # Call API to execute the method with POST body
+            start_time = time.time()
+            content = thunder.callMethod(method, postBody)
+            result_log.record(label, method, content, time.time() - start_time)
+        
+        run_concurrently(upload_object, enumerate(a_map_objects), sessions)
+
+
+
+def upload_lists(thunder, script_dir, result_log, sessions=1, file_map=FILE_MAP,
+                 list_size=100):
+    '''
+    Uploads all the elements in the files of file_map to an aXAPI v3 device, creating
+    up to list_size elements per request. With several sessions, the lists of each file
+    are uploaded concurrently. When a list fails, its elements are posted one by one to
+    attribute the error to the originating ones, skipping the ones before the failing
+    one (already created by the list). Results are stored in result_log, whose totals
+    count elements, not lists. When the device has a tuner, list_size is taken from it
+    for every list, like the chunk size of deploy_cli_chunks().
+    '''
+    for (a_map, file_to_process) in file_map:
+        value, a_map_objects = read_object_file(script_dir + file_to_process)
+        (path, list_key) = V3_LIST_MAP[value]
+        
+        a_map_objects = iter(a_map_objects)
+        
+        def cut_lists():
+            # Lists are cut as they are uploaded, streaming the elements of the file
+            index = 0
+            while True:
+                if thunder.tuner is not None:
+                    size = thunder.tuner.chunk_size
+                else:
+                    size = list_size
+                chunk = list(islice(a_map_objects, size))
+                if not chunk:
+                    return
+                yield (index, chunk)
+                index += len(chunk)
+        
+        def upload_list(index_and_chunk):
+            (index, chunk) = index_and_chunk
+            labels = ["{} {} ({})".format(TEXT_MAP[value], str(index + offset + 1), 
+                                          a_object.get('name', '')) 
+                      for (offset, a_object) in enumerate(chunk)]
+            v3_objects = [V3_CONVERT_MAP[value](a_object) for a_object in chunk]
+            if len(chunk) == 1:
+                list_label = labels[0]
+            else:
+                list_label = "{} LIST ({} to {})".format(TEXT_MAP[value], labels[0], 
+                                                         labels[-1])
+            start_time = time.time()
+            content = thunder.postList(path, list_key, v3_objects)
+            # Failed lists are not counted, their elements are counted when retried
+            retried = len(chunk) > 1 and parse_response(content)['status'] == 'fail'
+            result_log.record(list_label, 'POST ' + path, content, 
+                              time.time() - start_time, 0 if retried else len(chunk))
+            if thunder.tuner is not None:
+                thunder.tuner.chunkDone(len(chunk), time.time() - start_time, 
+                                        load_error(content))
+            
+            if retried:
+                # Post the elements of the list one by one to find the failed ones. The
+                # ones before the first failed element were created by the list
+                failing_found = False
+                for (label, v3_object) in zip(labels, v3_objects):
+                    start_time = time.time()
+                    content = thunder.postList(path, list_key, [v3_object])
+                    result = result_log.record(label, 'POST ' + path, content, 
+                                               time.time() - start_time, 
+                                               skip_existing=not failing_found)
+                    failing_found = failing_found or result['status'] == 'fail'
+        
+        run_concurrently(upload_list, cut_lists(), sessions)
+
+
+
+def upload_bundle(thunder, bundle_path, result_log, sessions=1):
+    '''
+    Uploads the elements of a bundle stored by process_script.py, sending the request 
+    bodies as stored in the bundle, without parsing nor serializing them again. With 
+    several sessions, elements are uploaded concurrently as soon as the elements they
+    depend on (according to the dependencies stored in the bundle) are uploaded.
+    Results are stored in result_log.
+    '''
+    bundle = Bundle(bundle_path)
+    counters = dict((value, 0) for value in TEXT_MAP)
+    
+    def upload_request(request):
+        (label, method, body) = request
+        start_time = time.time()
+        content = thunder.callMethod(method, body)
+        result_log.record(label, method, content, time.time() - start_time)
+    
+    scheduler = DependencyScheduler(upload_request, sessions, 4 * sessions)
+    scheduler.start()
+    try:
+        for (value, method, name, body, requires, provides) in bundle:
+            counters[value] += 1
+            label = "{} {} ({})".format(TEXT_MAP[value], str(counters[value]), name)
+            scheduler.submit((label, method, body), requires, provides)
+    finally:
+        scheduler.join()
+        bundle.close()
+
+
+
+class PartitionResultLog(object):
+    '''
+    Records the results of a partition in a ResultLog shared by all the partitions,
+    adding the partition name to the labels.
+    '''
+    def __init__(self, result_log, partition):
+        self.result_log = result_log
+        self.partition = partition
+    def record(self, label, method, content, elapsed=None, count=1, 
+               skip_existing=False):
+        return self.result_log.record("[{}] {}".format(self.partition, label), method,
+                                      content, elapsed, count, skip_existing)
+
+
+def find_partitions(script_dir):
+    '''
+    Returns the partitions with elements stored by the last process_script.py run with
+    --partition-map, as listed in PARTITIONS_FILE. Subdirectories of json_objects not
+    listed, like the ones of previous runs, are left out.
+    '''
+    if not os.path.exists(script_dir + PARTITIONS_FILE):
+        return []
+    with open(script_dir + PARTITIONS_FILE, 'r') as a_file:
+        return [a_line.strip() for a_line in a_file if a_line.strip()]
+
+
+def upload_partition(thunder, script_dir, result_log, sessions=1, cli_deploy=False, 
+                     chunk_size=100, bundle=False, partition=None, list_size=100):
+    '''
+    Uploads the elements of a partition (stored in its json_objects subdirectory) with
+    any of the upload modes, using a device whose sessions are in that partition. The
+    shared partition (None) uses the json_objects files. Files not stored for a 
+    partition, like the persistence templates, are skipped. aXAPI v3 devices (see
+    A10DeviceV3) are always uploaded with lists of list_size elements.
+    '''
+    if partition is None:
+        file_map = FILE_MAP
+    else:
+        file_map = [(a_map, partition_path(file_to_process, partition)) 
+                    for (a_map, file_to_process) in FILE_MAP 
+                    if os.path.exists(script_dir + partition_path(file_to_process, 
+                                                                  partition))]
+        result_log = PartitionResultLog(result_log, partition)
+    
+    if thunder.api_version == '3':
+        upload_lists(thunder, script_dir, result_log, sessions, file_map, list_size)
+    elif cli_deploy:
+        deploy_cli_chunks(thunder, script_dir, chunk_size, result_log, file_map)
+    elif bundle:
+        # Persistence templates are not in the bundle, they are uploaded first
+        upload_objects(thunder, script_dir, result_log, sessions, 
+                       [(a_map, file_to_process) for (a_map, file_to_process) 
+                        in file_map if a_map in TEMPLATE_MAPS])
+        upload_bundle(thunder, script_dir + partition_path(BUNDLE_FILE, partition), 
+                      result_log, sessions)
+    else:
+        upload_objects(thunder, script_dir, result_log, sessions, file_map)
+
         
 def main():
     '''
@@ -103,43 +520,182 @@ def main():
     parser.add_argument('-v', '--verbose', action='store_true', help=('increase output '
                         'verbosity showing HTTPs POST Requests/Responses in detail'), 
                         dest= 'verbose')                    
+    parser.add_argument('-c', '--cli-deploy', action='store_true', help=('upload the '
+                        'configuration as chunks of CLI commands with cli.deploy method '
+                        'instead of one aXAPI call per element'), dest='cli_deploy')
+    parser.add_argument('--chunk-size', action='store', type=int, default=100, 
+                        help=('number of elements per cli.deploy chunk. Defaults to 100'),
+                        dest='chunk_size')
+    parser.add_argument('-s', '--sessions', action='store', type=int, default=None, 
+                        help=('number of authenticated sessions opened in the A10 box to '
+                        'upload elements concurrently. Defaults to 1, or {} with '
+                        '--auto-tune').format(AUTO_TUNE_SESSIONS), dest='sessions')
+    parser.add_argument('-a', '--auto-tune', action='store_true', help=('adjust the '
+                        'requests in flight (up to --sessions) and the --cli-deploy chunk '
+                        'size to the latency of the A10 box during the upload, starting '
+                        'from the settings learned for its model in previous runs'), 
+                        dest='auto_tune')
+    parser.add_argument('--tuning-file', action='store', default=TUNING_FILE, 
+                        help=('file storing the settings learned by --auto-tune for each '
+                        'A10 model. Defaults to {}').format(TUNING_FILE), 
+                        dest='tuning_file')
+    parser.add_argument('--session-cache', action='store_true', help=('reuse the '
+                        'sessions of previous runs stored in --session-cache-file and '
+                        'keep the sessions open at the end for the next runs'), 
+                        dest='session_cache')
+    parser.add_argument('--session-cache-file', action='store', 
+                        default=SESSION_CACHE_FILE, help=('file storing the sessions '
+                        'reused with --session-cache. Defaults to {}').format(
+                        SESSION_CACHE_FILE), dest='session_cache_file')
+    parser.add_argument('--session-ttl', action='store', type=int, 
+                        default=SESSION_CACHE_TTL, help=('seconds a cached session can be '
+                        'reused since its last use. Defaults to {}').format(
+                        SESSION_CACHE_TTL), dest='session_ttl')
+    parser.add_argument('-r', '--result-log', action='store', default=None, 
+                        help=('JSON lines file storing the result of every aXAPI call. '
+                        'Defaults to upload_results.log in the script directory'), 
+                        dest='result_log')
+    parser.add_argument('-B', '--bundle', action='store_true', help=('upload the '
+                        'real-servers, service-groups and virtual-servers from the bundle '
+                        '(json_objects/OBJECTs.bundle) stored by process_script.py with '
+                        'its --bundle option, instead of from their json_objects files'),
+                        dest='bundle')
+    parser.add_argument('-P', '--partitions', action='store_true', help=('after the '
+                        'shared partition, also upload the partitions stored by '
+                        'process_script.py --partition-map, all of them concurrently, '
+                        'each one with its own sessions switched to the partition'),
+                        dest='partitions')
+    parser.add_argument('-o', '--objects-dir', action='store', default=None,
+                        help=('directory holding the json_objects directory to upload, '
+                        'like the snapshots stored by snapshot_script.py. Defaults to '
+                        'the script directory'), dest='objects_dir')
+    parser.add_argument('--axapi', action='store', choices=['2.1', '3', 'auto'], 
+                        default='2.1', help=("aXAPI version used to upload. With '3' "
+                        'whole lists of elements are created in each request (see '
+                        "--list-size). 'auto' uses aXAPI v3 when the A10 box supports it "
+                        "and v2.1 otherwise. Defaults to '2.1'"), dest='axapi')
+    parser.add_argument('--list-size', action='store', type=int, default=100, 
+                        help=('number of elements created per aXAPI v3 request. Defaults '
+                        'to 100'), dest='list_size')
     parsed_args = parser.parse_args()
+    
+    if parsed_args.axapi == '3' and (parsed_args.cli_deploy or parsed_args.bundle):
+        parser.error('--cli-deploy and --bundle are only supported with aXAPI v2.1')
 
     ip_address = parsed_args.a10_ip_address
     username = parsed_args.a10_admin_user
     password = parsed_args.a10_admin_pwd
     verbose = parsed_args.verbose
+    cli_deploy = parsed_args.cli_deploy
+    chunk_size = max(1, parsed_args.chunk_size)
+    list_size = max(1, parsed_args.list_size)
+    auto_tune = parsed_args.auto_tune
+    if parsed_args.sessions is None:
+        sessions = AUTO_TUNE_SESSIONS if auto_tune else 1
+    else:
+        sessions = max(1, parsed_args.sessions)
     
     # Get the script directory
     script_dir = os.path.dirname(os.path.realpath(__file__))
+    objects_dir = parsed_args.objects_dir or script_dir
+    partitions = find_partitions(objects_dir) if parsed_args.partitions else []
+    if parsed_args.bundle:
+        for partition in [None] + partitions:
+            if not os.path.exists(objects_dir + partition_path(BUNDLE_FILE, partition)):
+                parser.error("missing '{}', run process_script.py with --bundle".format(
+                             objects_dir + partition_path(BUNDLE_FILE, partition)))
+    
+    api_version = parsed_args.axapi
+    if api_version == 'auto':
+        if cli_deploy or parsed_args.bundle:
+            api_version = '2.1'
+        else:
+            # Probe aXAPI v3 authenticating (and logging off) once
+            probe = A10DeviceV3(ip_address, username, password)
+            probe.debug = verbose
+            try:
+                probe.signature = probe.authenticate()
+                probe.endSessions()
+                api_version = '3'
+            except (ValueError, urllib2.URLError) as error:
+                print "aXAPI v3 not available ({}), using aXAPI v2.1".format(error)
+                api_version = '2.1'
+    
+    # One tuner shared by all the partitions, as they are uploaded to the same A10 box
+    tuner = None
+    
+    def connect(partition=None):
+        if api_version == '3':
+            thunder = A10DeviceV3(ip_address, username, password)
+        else:
+            thunder = A10Device(ip_address, username, password)
+        thunder.debug = verbose                             # Turn ON/OFF debug messages
+        thunder.partition = partition                       # None for shared partition
+        if parsed_args.session_cache and api_version != '3':
+            thunder.session_cache = SessionCache(parsed_args.session_cache_file, 
+                                                 parsed_args.session_ttl)
+        thunder.openSessions(sessions)                      # GET authentication sessions
+        thunder.tuner = tuner                               # None without --auto-tune
+        return thunder
+    
+    thunders = [connect()]
+    
+    if auto_tune:
+        tuning_cache = TuningCache(parsed_args.tuning_file)
+        # Settings are learned per model, or per A10 box if it doesn't report its model
+        model = thunders[0].deviceModel() or ip_address
+        learned = tuning_cache.get(model) or {}
+        # Elements per request are tuned as CLI chunks or aXAPI v3 lists
+        chunked = cli_deploy or api_version == '3'
+        tuner = AdaptiveTuner(sessions * max(1, len(partitions)), 
+                              learned.get('sessions', 1), 
+                              learned.get('chunk_size', list_size if api_version == '3'
+                                          else chunk_size))
+        thunders[0].tuner = tuner
+        print "Auto-tune: model {}, starting with {} requests in flight{}".format(model,
+               tuner.limit, ' and chunks of {}'.format(tuner.chunk_size) if chunked 
+               else '')
+    
+    result_log_path = parsed_args.result_log or script_dir + '/upload_results.log'
+    result_log = ResultLog(result_log_path)
+    
+    try:
+        upload_partition(thunders[0], objects_dir, result_log, sessions, cli_deploy, 
+                         chunk_size, parsed_args.bundle, None, list_size)
+        if partitions:
+            # Sessions of each partition are opened and used by its own thread
+            def connect_and_upload(partition):
+                thunder = connect(partition)
+                thunders.append(thunder)
+                upload_partition(thunder, objects_dir, result_log, sessions, cli_deploy,
+                                 chunk_size, parsed_args.bundle, partition, list_size)
+            
+            run_concurrently(connect_and_upload, partitions, len(partitions))
+    finally:
+        result_log.close()
+    
+    print "### Upload finished: {} OK, {} FAILED{}. Results stored in {} ###".format(
+           result_log.successes, result_log.failures, ', {} SKIPPED'.format(
+           result_log.skipped) if result_log.skipped else '', result_log_path)
+    print
+    
+    if tuner is not None:
+        settings = tuner.settings()
+        if tuner.learned():
+            tuning_cache.store(model, settings)
+            print "### Auto-tune: {} requests in flight{} learned for model {} ###".format(
+                   settings['sessions'], ' and chunks of {}'.format(settings['chunk_size'])
+                   if chunked else '', model)
+        else:
+            print ("### Auto-tune: settings not learned, most of the elements failed "
+                   "(already uploaded?) ###")
+        for (method, stats) in sorted(settings['methods'].items()):
+            print "{:<45}: {:.4f} s, {:.1f}% errors".format(method, stats['latency'],
+                                                           100 * stats['error_rate'])
+        print
     
-    thunder = A10Device(ip_address, username, password) # Initialize with IP, username and password
-    thunder.debug = verbose                             # Turn ON/OFF debug messages
-    thunder.getSession()                                # GET authentication session
-    
-    for (a_map, file_to_process) in FILE_MAP:
-    
-    	thunder.method = METHOD_MAP[a_map]              # SET Method
-    	
-    	with open(script_dir + file_to_process, 'r') as a_file:   
-        	a_map = json.load(a_file)
-    	a_file.close()
-    
-    	# All the files are dictionaries with only one key that contains a list of the
-    	# elements of a particular type. Value gets the value of the key to use in
-    	# the particular dictionary got from the file.
-    	value = a_map.keys()[0]
-    	
-    	for index, a_object in enumerate(a_map[value]):
-    		postBody = json.dumps(a_object)   # SET Post Body for the chosen method
-    		print "### Uploading {} {} CONFIGURATION ###".format(TEXT_MAP[value], 
-    		                                                     str(index+1))
-        	thunder.genericPostApi(postBody)            # Call API to execute the method 
-        	                                            # with POST body
-    
-    	print
-    
-    thunder.closeSession()                          # Close Session
+    for thunder in thunders:
+        thunder.endSessions()                       # Close (or cache) Sessions
     
     
 
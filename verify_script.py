@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+import sys, json
+from argparse import ArgumentParser
+import os, time
+from object_files import read_object_file, diff_objects
+from upload_script import FILE_MAP, TEXT_MAP
+from snapshot_script import get_objects
+from a10_device import A10Device, SessionCache, SESSION_CACHE_FILE, SESSION_CACHE_TTL
+from a10_device import run_concurrently
+
+
+def verify_objects(thunder, objects_dir, sessions=1):
+    '''
+    Compares the elements of every json_objects file existing in objects_dir with the
+    ones in the A10 box (see diff_objects). All the lists are got concurrently, up to one
+    per session. Returns a list of (list_key, number of local elements, diff), in
+    FILE_MAP order.
+    '''
+    local_lists = []
+    for (a_map, file_to_process) in FILE_MAP:
+        if os.path.exists(objects_dir + file_to_process):
+            value, a_map_objects = read_object_file(objects_dir + file_to_process)
+            # ndjson files are read lazily, while their elements are counted and compared
+            local_lists.append((value, list(a_map_objects)))
+
+    def verify_list(value_and_objects):
+        (value, a_map_objects) = value_and_objects
+        return (value, len(a_map_objects),
+                diff_objects(a_map_objects, get_objects(thunder, value)))
+
+    return run_concurrently(verify_list, local_lists, sessions)
+
+
+def main():
+    '''
+    Checks the A10 box holds the elements stored in the json_objects files after an
+    upload. Elements are matched by name and compared field by field with the ones got
+    from the A10 box, ignoring the fields the A10 box adds with default values. Exits
+    with status 1 if any element is missing, extra or different.
+    '''
+    # Argument parsing
+    parser = ArgumentParser(description=("Script to verify the A10 slb configuration "
+                            "matches the json objects files uploaded"),
+                            prog='python verify_script.py')
+    parser.add_argument('a10_ip_address', action='store', help='A10 management IP')
+    parser.add_argument('a10_admin_user', action='store', help='A10 admin user',
+                        default='admin', nargs='?',) # Optional arg, defaults to 'admin'
+    parser.add_argument('a10_admin_pwd', action='store', help='A10 admin user password',
+                        default='a10', nargs='?',)   # Optional arg, defaults to 'a10'
+    parser.add_argument('-o', '--objects-dir', action='store', default=None,
+                        help=('directory holding the json_objects directory to verify. '
+                        'Defaults to the script directory'), dest='objects_dir')
+    parser.add_argument('-s', '--sessions', action='store', type=int,
+                        default=len(FILE_MAP), help=('number of authenticated sessions '
+                        'opened in the A10 box to get the elements concurrently. '
+                        'Defaults to {}').format(len(FILE_MAP)), dest='sessions')
+    parser.add_argument('--https', action='store_true', help=('use HTTPs to connect '
+                        'to the A10 box'), dest='https')
+    parser.add_argument('--partition', action='store', default=None, help=('verify '
+                        'the given partition instead of the shared one'),
+                        dest='partition')
+    parser.add_argument('--session-cache', action='store_true', help=('reuse the '
+                        'sessions of previous runs stored in --session-cache-file and '
+                        'keep the sessions open at the end for the next runs'),
+                        dest='session_cache')
+    parser.add_argument('--session-cache-file', action='store',
+                        default=SESSION_CACHE_FILE, help=('file storing the sessions '
+                        'reused with --session-cache. Defaults to {}').format(
+                        SESSION_CACHE_FILE), dest='session_cache_file')
+    parser.add_argument('--session-ttl', action='store', type=int,
+                        default=SESSION_CACHE_TTL, help=('seconds a cached session can be '
+                        'reused since its last use. Defaults to {}').format(
+                        SESSION_CACHE_TTL), dest='session_ttl')
+    parser.add_argument('--report-json', action='store', default=None, help=('also '
+                        'store the differences found as JSON in the given file'),
+                        dest='report_json')
+    parser.add_argument('-v', '--verbose', action='store_true', help=('increase output '
+                        'verbosity showing HTTPs POST Requests/Responses in detail'),
+                        dest= 'verbose')
+    parsed_args = parser.parse_args()
+
+    sessions = max(1, parsed_args.sessions)
+
+    # Get the script directory
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    objects_dir = parsed_args.objects_dir or script_dir
+
+    thunder = A10Device(parsed_args.a10_ip_address, parsed_args.a10_admin_user,
+                        parsed_args.a10_admin_pwd)
+    thunder.debug = parsed_args.verbose
+    thunder.use_https = parsed_args.https
+    thunder.partition = parsed_args.partition
+    if parsed_args.session_cache:
+        thunder.session_cache = SessionCache(parsed_args.session_cache_file,
+                                             parsed_args.session_ttl)
+    thunder.openSessions(sessions)                      # GET authentication sessions
+
+    start_time = time.time()
+    try:
+        verified_lists = verify_objects(thunder, objects_dir, sessions)
+    finally:
+        thunder.endSessions()                       # Close (or cache) Sessions
+
+    differences = 0
+    for (value, count, diff) in verified_lists:
+        print
+        print "### {}: {} elements, {} MISSING, {} DIFFERENT, {} EXTRA ###".format(
+               TEXT_MAP[value], count, len(diff['missing']), len(diff['changed']),
+               len(diff['extra']))
+        for name in diff['missing']:
+            print "MISSING   : " + name
+        for name in diff['changed']:
+            print "DIFFERENT : " + name
+            for field in diff['fields'][name]:
+                print "            " + field
+        for name in diff['extra']:
+            print "EXTRA     : " + unicode(name)
+        differences += len(diff['missing']) + len(diff['changed']) + len(diff['extra'])
+    print
+    print "### Verification finished in {:.2f} s: {} differences ###".format(
+           time.time() - start_time, differences)
+    print
+
+    if parsed_args.report_json:
+        with open(parsed_args.report_json, 'w') as report_file:
+            json.dump(dict((value, diff) for (value, count, diff) in verified_lists),
+                      report_file, indent=4)
+
+    if differences:
+        sys.exit(1)
+
+
+
+if __name__ == '__main__':
+    main()